@@ -0,0 +1,280 @@
+"""
+Zátěžový test a měření latence AI Agenta
+Spuštění:
+    python benchmark_agent.py --url http://localhost:8000 --concurrency 16 --duration 30
+    python benchmark_agent.py --in-process --concurrency 4 --duration 10
+    python benchmark_agent.py --url http://localhost:8000 --compare results_old.json
+
+Na rozdíl od test_agent.py (sériové dotazy s pauzou) posílá dotazy souběžně
+po zvolenou dobu a ukládá p50/p95/p99, požadavky za sekundu a chybovost do
+JSON souboru, který jde porovnat mezi commity.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+# Mix otázek: (otázka, váha)
+DEFAULT_MIX = [
+    ("Kolik máme celkem produktů?", 3),
+    ("Jaká je průměrná cena všech produktů?", 2),
+    ("Které produkty máme v kategorii Elektronika?", 2),
+    ("Který produkt je nejdražší?", 2),
+    ("Které produkty mají nízké zásoby?", 2),
+    ("Jaká je celková hodnota skladových zásob?", 1),
+    ("Porovnej kategorii Elektronika a Oblečení", 1),
+    ("Udělej analýzu produktového portfolia", 1)
+]
+
+
+class Colors:
+    GREEN = '\033[92m'
+    CYAN = '\033[96m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    GRAY = '\033[90m'
+    RESET = '\033[0m'
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Percentil metodou nejbližšího pořadí (hodnoty musí být seřazené)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: list, errors: dict, elapsed: float) -> dict:
+    """Souhrnné metriky z latencí (v sekundách) a počtů chyb"""
+    ordered = sorted(latencies)
+    error_count = sum(errors.values())
+    total = len(ordered) + error_count
+    return {
+        'requests': total,
+        'successful': len(ordered),
+        'errors': errors,
+        'error_rate': round(error_count / total, 4) if total else 0.0,
+        'rps': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+            'p50': round(percentile(ordered, 50) * 1000, 3),
+            'p95': round(percentile(ordered, 95) * 1000, 3),
+            'p99': round(percentile(ordered, 99) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3) if ordered else 0.0
+        }
+    }
+
+
+class HTTPClient:
+    """Jedno keep-alive spojení na /ask pro jedno pracovní vlákno"""
+
+    def __init__(self, url: str, timeout: float):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self.conn = None
+
+    def ask(self, question: str) -> str:
+        """Vrátí None při úspěchu, jinak označení chyby"""
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request('GET', f"{self.prefix}/ask?q={urllib.parse.quote(question)}")
+            response = self.conn.getresponse()
+            response.read()
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+            return None if response.status == 200 else f"HTTP {response.status}"
+        except Exception as e:
+            self.close()
+            return type(e).__name__
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class InProcessClient:
+    """Volá AIAgent.process_query přímo, bez HTTP"""
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def ask(self, question: str) -> str:
+        try:
+            self.agent.process_query(question)
+            return None
+        except Exception as e:
+            return type(e).__name__
+
+    def close(self):
+        pass
+
+
+def run_load(make_client, mix: list, concurrency: int, duration: float,
+             warmup: float = 1.0, seed: int = 1) -> dict:
+    """Spustí souběžnou zátěž a vrátí metriky celkem i po otázkách"""
+    questions = [q for q, _ in mix]
+    weights = [w for _, w in mix]
+    lock = threading.Lock()
+    latencies = {q: [] for q in questions}
+    errors = {q: {} for q in questions}
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def worker(worker_id: int):
+        rng = random.Random(seed + worker_id)
+        client = make_client()
+        local_lat = {q: [] for q in questions}
+        local_err = {q: {} for q in questions}
+        try:
+            while True:
+                question = rng.choices(questions, weights)[0]
+                t0 = time.perf_counter()
+                if t0 >= stop_at:
+                    break
+                error = client.ask(question)
+                t1 = time.perf_counter()
+                if t0 < start_at:
+                    continue  # zahřívání se nepočítá
+                if error is None:
+                    local_lat[question].append(t1 - t0)
+                else:
+                    local_err[question][error] = local_err[question].get(error, 0) + 1
+        finally:
+            client.close()
+        with lock:
+            for q in questions:
+                latencies[q].extend(local_lat[q])
+                for err, count in local_err[q].items():
+                    errors[q][err] = errors[q].get(err, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = duration
+
+    all_latencies = [x for q in questions for x in latencies[q]]
+    all_errors = {}
+    for q in questions:
+        for err, count in errors[q].items():
+            all_errors[err] = all_errors.get(err, 0) + count
+
+    return {
+        'overall': summarize(all_latencies, all_errors, elapsed),
+        'per_question': {q: summarize(latencies[q], errors[q], elapsed) for q in questions}
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(results: dict, previous: dict = None):
+    overall = results['overall']
+    lat = overall['latency_ms']
+    print(f"\n{Colors.GREEN}=== Výsledky ({results['target']}) ==={Colors.RESET}")
+    print(f"Požadavků: {overall['requests']}, úspěšných: {overall['successful']}, "
+          f"chybovost: {overall['error_rate']:.2%} {overall['errors'] or ''}")
+    print(f"Propustnost: {Colors.CYAN}{overall['rps']} req/s{Colors.RESET}")
+    print(f"Latence ms: mean {lat['mean']}, p50 {lat['p50']}, p95 {lat['p95']}, "
+          f"p99 {lat['p99']}, max {lat['max']}")
+
+    print(f"\n{Colors.GRAY}{'Otázka':<48} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}{Colors.RESET}")
+    for q, m in results['per_question'].items():
+        ql = m['latency_ms']
+        print(f"{q[:48]:<48} {m['rps']:>8} {ql['p50']:>8} {ql['p95']:>8} {ql['p99']:>8}")
+
+    if previous:
+        prev = previous['overall']
+        print(f"\n{Colors.YELLOW}Porovnání s {previous.get('commit') or '?'} "
+              f"({previous.get('timestamp', '')}):{Colors.RESET}")
+        for label, now, before in [
+            ('req/s', overall['rps'], prev['rps']),
+            ('p50 ms', lat['p50'], prev['latency_ms']['p50']),
+            ('p95 ms', lat['p95'], prev['latency_ms']['p95']),
+            ('p99 ms', lat['p99'], prev['latency_ms']['p99']),
+            ('chybovost', overall['error_rate'], prev['error_rate'])
+        ]:
+            delta = (now - before) / before * 100 if before else 0.0
+            print(f"  {label:<10} {before:>10} -> {now:>10} ({delta:+.1f} %)")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Zátěžový test AI Agenta')
+    parser.add_argument('--url', default='http://localhost:8000', help='adresa serveru s /ask')
+    parser.add_argument('--in-process', action='store_true', help='volat AIAgent.process_query přímo')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='délka měření v sekundách')
+    parser.add_argument('--warmup', type=float, default=1.0, help='zahřívání v sekundách (nepočítá se)')
+    parser.add_argument('--mix', help='JSON soubor se seznamem [otázka, váha]')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='předchozí výsledky pro porovnání')
+    args = parser.parse_args()
+
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix, 'r', encoding='utf-8') as f:
+            mix = [tuple(item) for item in json.load(f)]
+
+    if args.in_process:
+        from python_agent_extended import agent
+        target = 'in-process'
+        make_client = lambda: InProcessClient(agent)
+    else:
+        target = args.url
+        make_client = lambda: HTTPClient(args.url, args.timeout)
+
+    print(f"\n{Colors.GREEN}=== Zátěžový test AI Agenta ==={Colors.RESET}")
+    print(f"{Colors.GRAY}Cíl: {target}, souběžnost: {args.concurrency}, "
+          f"doba: {args.duration}s (+{args.warmup}s zahřívání){Colors.RESET}")
+
+    metrics = run_load(make_client, mix, args.concurrency, args.duration, args.warmup)
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'commit': git_commit(),
+        'target': target,
+        'config': {
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'mix': mix
+        },
+        **metrics
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    print_report(results, previous)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"{Colors.GRAY}Výsledky uloženy do: {args.output}{Colors.RESET}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Porovnání řádkového (seznam Product / slovníků) a sloupcového katalogu
+Spuštění:
+    python benchmark_columnar.py --rows 1000000
+    python benchmark_columnar.py --rows 100000 --repeat 5 --output columnar.json
+
+Změří paměť reprezentací (tracemalloc) a propustnost statistik,
+agregace po kategoriích, nízkých zásob a top-K. Řádky Product se porovnávají
+i s dřívějšími slovníky (paměť na řádek, čtení sloupců). Sloupcový katalog se
+měří s NumPy (pokud je nainstalovaná) i jen s moduly array. Výsledky všech
+variant se porovnávají se StatisticsTool - musí být shodné.
+"""
+
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+from generate_catalog import create_catalog
+from python_agent_extended import ColumnarCatalog, DatabaseTool, StatisticsTool, np
+
+
+class Colors:
+    GREEN = '\033[92m'
+    CYAN = '\033[96m'
+    RED = '\033[91m'
+    GRAY = '\033[90m'
+    RESET = '\033[0m'
+
+
+def measure_memory(build) -> tuple:
+    """Vrátí (objekt, alokovaná paměť v MB) - tracemalloc jen po dobu stavby"""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, round(current / 1024 / 1024, 1)
+
+
+def best_time(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Řádkový vs. sloupcový katalog')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default='./data/scaling', help='adresář pro vygenerované katalogy')
+    parser.add_argument('--output', default='benchmark_columnar.json')
+    args = parser.parse_args()
+
+    path = os.path.join(args.workdir, f"catalog_{args.rows}_{args.seed}.db")
+    if not os.path.exists(path):
+        print(f"{Colors.GRAY}📦 Generuji {args.rows:,} produktů...{Colors.RESET}")
+        create_catalog(path, args.rows, args.seed)
+    db = DatabaseTool(path)
+
+    print(f"\n{Colors.GREEN}=== Řádkový vs. sloupcový katalog ({args.rows:,} produktů) ==={Colors.RESET}")
+
+    variants = {}
+    start = time.perf_counter()
+    products, memory = measure_memory(db.query)
+    variants['rows'] = {'load_seconds': time.perf_counter() - start, 'memory_mb': memory}
+    operations = {
+        'rows': {
+            'get_statistics': db.get_statistics,
+            'calculate_by_category': lambda: StatisticsTool.calculate_by_category(products),
+            'find_low_stock': lambda: StatisticsTool.find_low_stock(products),
+            'find_expensive': lambda: StatisticsTool.find_expensive(products)
+        }
+    }
+
+    for name, use_numpy in (('numpy', True), ('array', False)):
+        if use_numpy and np is None:
+            print(f"{Colors.GRAY}NumPy není nainstalovaná - varianta numpy se přeskočí{Colors.RESET}")
+            continue
+        start = time.perf_counter()
+        catalog, memory = measure_memory(lambda: ColumnarCatalog.load(db, use_numpy=use_numpy))
+        variants[name] = {'load_seconds': time.perf_counter() - start, 'memory_mb': memory}
+        operations[name] = {
+            'get_statistics': catalog.get_statistics,
+            'calculate_by_category': catalog.calculate_by_category,
+            'find_low_stock': catalog.find_low_stock,
+            'find_expensive': catalog.find_expensive
+        }
+
+    # Shoda výsledků se StatisticsTool (statistiky s DatabaseTool.get_statistics)
+    mismatches = []
+    reference = {op: func() for op, func in operations['rows'].items()}
+    for name, ops in operations.items():
+        for op, func in ops.items():
+            if func() != reference[op]:
+                mismatches.append(f"{name}.{op}")
+
+    for name, ops in operations.items():
+        variants[name]['seconds'] = {op: best_time(func, args.repeat) for op, func in ops.items()}
+
+    # Product n-tice vs. dřívější slovník pro každý řádek
+    dicts, dict_memory = measure_memory(lambda: [p.to_dict() for p in db.query()])
+    row_report = {
+        'product_bytes_per_row': round(variants['rows']['memory_mb'] * 1024 * 1024 / max(len(products), 1)),
+        'dict_bytes_per_row': round(dict_memory * 1024 * 1024 / max(len(dicts), 1)),
+        'product_access_ms': best_time(lambda: sum(p.price * p.stock for p in products), args.repeat) * 1000,
+        'dict_access_ms': best_time(lambda: sum(p['price'] * p['stock'] for p in dicts), args.repeat) * 1000
+    }
+    del dicts
+
+    names = list(variants)
+    print(f"\n{Colors.GRAY}{'':<24}" + ''.join(f"{n:>14}" for n in names) + Colors.RESET)
+    print(f"{'Paměť (MB)':<24}" + ''.join(f"{variants[n]['memory_mb']:>14}" for n in names))
+    print(f"{'Načtení (s)':<24}" + ''.join(f"{variants[n]['load_seconds']:>14.2f}" for n in names))
+    for op in reference:
+        print(f"{op + ' (ms)':<24}" + ''.join(
+            f"{variants[n]['seconds'][op] * 1000:>14.2f}" for n in names))
+
+    print(f"\n{Colors.CYAN}Řádek Product: {row_report['product_bytes_per_row']} B, "
+          f"slovník: {row_report['dict_bytes_per_row']} B (včetně hodnot); "
+          f"součet price*stock: {row_report['product_access_ms']:.2f} ms vs. "
+          f"{row_report['dict_access_ms']:.2f} ms{Colors.RESET}")
+
+    if mismatches:
+        print(f"\n{Colors.RED}❌ Rozdílné výsledky: {', '.join(mismatches)}{Colors.RESET}")
+    else:
+        print(f"\n{Colors.GREEN}✓ Všechny varianty vrací stejné výsledky{Colors.RESET}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'rows': args.rows,
+            'seed': args.seed,
+            'variants': variants,
+            'row_types': row_report,
+            'mismatches': mismatches
+        }, f, ensure_ascii=False, indent=2)
+    print(f"{Colors.GRAY}Výsledky uloženy do: {args.output}{Colors.RESET}\n")
+
+    db.close()
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
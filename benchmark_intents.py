@@ -0,0 +1,94 @@
+"""
+Mikro-benchmark rozpoznávání záměru otázky
+Spuštění: python benchmark_intents.py [--rounds 20000]
+
+Porovnává zkompilovaný IntentMatcher (jeden průchod otázkou) s řetězcem
+podmínek `in`, a to pro vestavěnou tabulku záměrů i pro stovky až tisíce
+uměle přidaných záměrů.
+"""
+
+import argparse
+import random
+import string
+import time
+
+from python_agent_extended import INTENTS, IntentMatcher
+
+QUESTIONS = [
+    "Kolik máme celkem produktů?",
+    "Jaká je průměrná cena všech produktů?",
+    "Které produkty máme v kategorii Elektronika?",
+    "Který produkt je nejdražší?",
+    "Které produkty mají nízké zásoby?",
+    "Jaká je celková hodnota skladových zásob?",
+    "Porovnej kategorii Elektronika a Oblečení",
+    "Udělej analýzu produktového portfolia"
+]
+
+
+def synthetic_intents(count: int, seed: int = 42) -> list:
+    """Náhodné záměry se dvěma skupinami klíčových slov"""
+    rng = random.Random(seed)
+
+    def word():
+        return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 9)))
+
+    return [
+        (f"intent_{i}", [[word(), word()], [word()]])
+        for i in range(count)
+    ]
+
+
+def naive_chain(intents: list):
+    """Ekvivalent původního řetězce if/elif s podmínkami `in`"""
+    normalized = [
+        (name, [[IntentMatcher.normalize(k) for k in group] for group in groups])
+        for name, groups in intents
+    ]
+
+    def match(question: str) -> str:
+        text = IntentMatcher.normalize(question)
+        for name, groups in normalized:
+            if all(any(k in text for k in group) for group in groups):
+                return name
+        return 'general'
+
+    return match
+
+
+def measure(match, rounds: int) -> float:
+    """Průměrná cena jednoho rozpoznání v mikrosekundách"""
+    start = time.perf_counter()
+    for i in range(rounds):
+        match(QUESTIONS[i % len(QUESTIONS)])
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rozpoznávání záměru')
+    parser.add_argument('--rounds', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"\n{'Záměrů':>8} | {'Automat µs/otázka':>18} | {'Řetězec `in` µs/otázka':>23}")
+    print('-' * 56)
+
+    for extra in (0, 100, 1000, 5000):
+        # Vestavěné záměry mají přednost, umělé jsou za nimi
+        intents = INTENTS + synthetic_intents(extra)
+        matcher = IntentMatcher(intents)
+        matcher.compile()
+        chain = naive_chain(intents)
+
+        # Obě implementace musí vracet stejné záměry
+        for q in QUESTIONS:
+            assert matcher.match(q) == chain(q), q
+
+        automaton_us = measure(matcher.match, args.rounds)
+        chain_us = measure(chain, max(args.rounds // max(extra // 100, 1), 200))
+        print(f"{len(intents):>8} | {automaton_us:>18.2f} | {chain_us:>23.2f}")
+
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Škálování propustnosti /ask s počtem procesů serveru (SERVER_PROCESSES)
+Spuštění:
+    python benchmark_processes.py                        # 1, 2, 4 ... počet jader
+    python benchmark_processes.py --processes 1 2 4 8 --duration 15 --clients 8
+    python benchmark_processes.py --rows 100000 --output processes.json
+
+Pro každý počet procesů spustí python_agent_extended.py na samostatném portu,
+zatíží /ask souběžnými dotazy z několika klientských procesů (jeden
+klientský proces by sám narazil na GIL) a změří požadavky za sekundu.
+Cache odpovědí je vypnutá, aby každý dotaz prošel plánovačem i simulátorem.
+Zrychlení se počítá proti jednomu procesu; efektivita = zrychlení / procesy.
+Klienti běží na stejném stroji - na počtu jader, který zbude serveru,
+záleží, proto se vypisuje i počet jader.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+from benchmark_agent import DEFAULT_MIX, HTTPClient, run_load
+from generate_catalog import create_catalog
+
+
+class Colors:
+    GREEN = '\033[92m'
+    CYAN = '\033[96m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    GRAY = '\033[90m'
+    RESET = '\033[0m'
+
+
+def default_process_counts() -> list:
+    cores = os.cpu_count() or 1
+    counts, n = [], 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    return counts + [cores]
+
+
+def start_server(processes: int, port: int, database: str, workdir: str):
+    """Spustí agenta v podprocesu a počká, až odpovídá"""
+    env = dict(
+        os.environ,
+        SERVER_PORT=str(port),
+        SERVER_PROCESSES=str(processes),
+        DATABASE_PATH=database,
+        ANSWER_CACHE_SIZE='0',
+        QUERY_LOG_PATH='',
+        LLM_MODE='simulator'
+    )
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_agent_extended.py')
+    proc = subprocess.Popen([sys.executable, script], cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server skončil s kódem {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Server nezačal odpovídat do 60 s")
+
+
+def stop_server(proc):
+    proc.terminate()  # SIGTERM - supervisor ukončí i pracovní procesy
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def client_process(url: str, concurrency: int, duration: float, warmup: float, seed: int) -> dict:
+    """Jeden klientský proces se souběžnými vlákny - souhrn jeho požadavků"""
+    return run_load(lambda: HTTPClient(url, 30.0), DEFAULT_MIX, concurrency, duration, warmup, seed)['overall']
+
+
+def measure(processes: int, args, database: str, workdir: str, port: int) -> dict:
+    proc = start_server(processes, port, database, workdir)
+    try:
+        url = f"http://127.0.0.1:{port}"
+        with multiprocessing.Pool(args.clients) as pool:
+            summaries = pool.starmap(client_process, [
+                (url, args.concurrency, args.duration, args.warmup, i * 1000)
+                for i in range(args.clients)
+            ])
+    finally:
+        stop_server(proc)
+
+    successful = sum(s['successful'] for s in summaries)
+    errors = {}
+    for s in summaries:
+        for name, count in s['errors'].items():
+            errors[name] = errors.get(name, 0) + count
+    return {
+        'processes': processes,
+        'requests': successful + sum(errors.values()),
+        'errors': errors,
+        'rps': round(successful / args.duration, 2),
+        # Percentily klientů se nedají sloučit přesně - nejhorší z klientů
+        'p50_ms': max(s['latency_ms']['p50'] for s in summaries),
+        'p99_ms': max(s['latency_ms']['p99'] for s in summaries)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Škálování /ask s počtem procesů serveru')
+    parser.add_argument('--processes', type=int, nargs='+', default=default_process_counts())
+    parser.add_argument('--clients', type=int, default=os.cpu_count() or 1,
+                        help='počet klientských procesů')
+    parser.add_argument('--concurrency', type=int, default=8, help='vláken v každém klientském procesu')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--rows', type=int, default=0,
+                        help='velikost vygenerovaného katalogu (0 = init_database.sql)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--workdir', default='./data/scaling', help='adresář pro vygenerované katalogy')
+    parser.add_argument('--output', default='benchmark_processes.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.rows:
+            database = os.path.abspath(os.path.join(args.workdir, f"catalog_{args.rows}_{args.seed}.db"))
+            if not os.path.exists(database):
+                print(f"{Colors.GRAY}📦 Generuji {args.rows:,} produktů...{Colors.RESET}")
+                create_catalog(database, args.rows, args.seed)
+        else:
+            # Vlastní kopie malého katalogu - naplní ji první spuštění serveru
+            database = os.path.join(workdir, 'data', 'products.db')
+            source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'init_database.sql')
+            with open(source, 'rb') as src, open(os.path.join(workdir, 'init_database.sql'), 'wb') as dst:
+                dst.write(src.read())
+
+        print(f"\n{Colors.GREEN}=== Škálování /ask s počtem procesů ==={Colors.RESET}")
+        print(f"{Colors.GRAY}Jader: {os.cpu_count()}, klientů: {args.clients} × {args.concurrency} vláken, "
+              f"doba: {args.duration}s, katalog: {f'{args.rows:,}' if args.rows else 'init_database.sql'}"
+              f"{Colors.RESET}")
+
+        results = []
+        for i, processes in enumerate(sorted(set(args.processes))):
+            print(f"{Colors.CYAN}▶ {processes} proces(ů){Colors.RESET}")
+            # Každé měření na jiném portu - předchozí sockety mohou být v TIME_WAIT
+            results.append(measure(processes, args, database, workdir, args.port + i))
+
+    base = results[0]['rps'] or 1
+    print(f"\n{Colors.GRAY}{'Procesy':>8}{'req/s':>12}{'zrychlení':>12}{'efektivita':>12}"
+          f"{'p50 ms':>10}{'p99 ms':>10}  chyby{Colors.RESET}")
+    for r in results:
+        r['speedup'] = round(r['rps'] / base, 2)
+        r['efficiency'] = round(r['speedup'] / (r['processes'] / results[0]['processes']), 2)
+        color = Colors.YELLOW if r['efficiency'] < 0.7 else ''
+        print(f"{color}{r['processes']:>8}{r['rps']:>12}{r['speedup']:>11}x{r['efficiency']:>12}"
+              f"{r['p50_ms']:>10}{r['p99_ms']:>10}  {r['errors'] or ''}{Colors.RESET if color else ''}")
+    if max(r['processes'] for r in results) > (os.cpu_count() or 1):
+        print(f"\n{Colors.YELLOW}⚠️  Víc procesů než jader - další procesy už nemají kde běžet{Colors.RESET}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'cpu_count': os.cpu_count(),
+            'config': {
+                'clients': args.clients,
+                'concurrency': args.concurrency,
+                'duration': args.duration,
+                'rows': args.rows
+            },
+            'results': results
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n{Colors.GRAY}Výsledky uloženy do: {args.output}{Colors.RESET}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Parametrizované dotazy s cache připravených příkazů vs. SQL skládané z textu
+Spuštění:
+    python benchmark_queries.py --rows 100000
+    python benchmark_queries.py --queries 5000 --cache-sizes 0 16 256 --output queries.json
+
+Vygeneruje mix filtrů ProductQuery (kategorie, značka, rozsah ceny a zásob,
+řazení, stránka) a pustí ho na spojeních jen pro čtení s různou velikostí
+cache připravených příkazů (cached_statements). Parametrizovaný dotaz má pro
+každou kombinaci filtrů jeden text SQL, takže se připravený příkaz použije
+znovu; SQL s hodnotami vloženými do textu (jako dřív v n8n) je pokaždé jiné
+a musí se pokaždé znovu připravit. Výsledky všech variant se porovnávají.
+
+Vedle celého dotazu se měří i stejný mix s LIMIT 0 - SQLite dotaz připraví
+a naplánuje, ale nečte řádky, takže rozdíl mezi variantami je čistá cena
+přípravy příkazu.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+from generate_catalog import create_catalog
+from python_agent_extended import ConnectionPool, DatabaseTool, ProductQuery
+
+
+class Colors:
+    GREEN = '\033[92m'
+    CYAN = '\033[96m'
+    RED = '\033[91m'
+    GRAY = '\033[90m'
+    RESET = '\033[0m'
+
+
+def build_mix(db: DatabaseTool, count: int, seed: int, limit: int) -> list:
+    """Náhodné filtry nad skutečnými kategoriemi a značkami katalogu
+    
+    Převažuje stránkování kategorie podle ceny nebo id (jako v n8n a na webu),
+    které obslouží index; řazení podle zásob a názvu je vzácnější.
+    """
+    rng = random.Random(seed)
+    categories = [row['category'] for row in db.query('SELECT DISTINCT category FROM products ORDER BY category')]
+    brands = [row['brand'] for row in db.query(
+        'SELECT brand FROM products GROUP BY brand ORDER BY COUNT(*) DESC LIMIT 20')]
+    queries = []
+    for _ in range(count):
+        filters = {}
+        if rng.random() < 0.7:
+            filters['category'] = rng.choice(categories)
+        if rng.random() < 0.3:
+            filters['brand'] = rng.choice(brands)
+        if rng.random() < 0.4:
+            low = rng.choice((0, 100, 500, 1000, 5000))
+            filters['min_price'] = low
+            if rng.random() < 0.5:
+                filters['max_price'] = low * 10 + 990
+        if rng.random() < 0.2:
+            filters['max_stock'] = rng.choice((5, 10, 20))
+        queries.append(ProductQuery(
+            order=rng.choice(('price', 'price', 'price', 'price', 'id', 'id', 'id', 'stock', 'name')),
+            descending=rng.random() < 0.5,
+            limit=limit,
+            offset=rng.choice((0, 0, 0, limit, limit * 2)),
+            **filters
+        ))
+    return queries
+
+
+def literal(value) -> str:
+    """Hodnota vložená přímo do textu SQL (s ošetřením apostrofů)"""
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+def interpolate(sql: str, params: tuple) -> str:
+    parts = sql.split('?')
+    return parts[0] + ''.join(literal(value) + part for value, part in zip(params, parts[1:]))
+
+
+def run(pool: ConnectionPool, statements: list, repeat: int) -> tuple:
+    """Nejlepší čas z opakování a kontrolní součet vrácených id"""
+    best, checksum = float('inf'), 0
+    with pool.connection() as conn:
+        for _ in range(repeat):
+            checksum = 0
+            start = time.perf_counter()
+            for sql, params in statements:
+                for row in conn.execute(sql, params):
+                    checksum += row[0]
+            best = min(best, time.perf_counter() - start)
+    return best, checksum
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cache připravených příkazů pro dotazy z API')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--queries', type=int, default=2000, help='počet dotazů v mixu')
+    parser.add_argument('--limit', type=int, default=20, help='velikost stránky')
+    parser.add_argument('--cache-sizes', type=int, nargs='+', default=[0, 16, 256],
+                        help='velikosti cached_statements pro parametrizované dotazy')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default='./data/scaling', help='adresář pro vygenerované katalogy')
+    parser.add_argument('--output', default='benchmark_queries.json')
+    args = parser.parse_args()
+
+    path = os.path.join(args.workdir, f"catalog_{args.rows}_{args.seed}.db")
+    if not os.path.exists(path):
+        print(f"{Colors.GRAY}📦 Generuji {args.rows:,} produktů...{Colors.RESET}")
+        create_catalog(path, args.rows, args.seed)
+    db = DatabaseTool(path)
+
+    mix = build_mix(db, args.queries, args.seed, args.limit)
+    statements = [query.to_sql() for query in mix]
+    interpolated = [(interpolate(sql, params), ()) for sql, params in statements]
+    # LIMIT a OFFSET jsou poslední dva parametry
+    prepare_only = [(sql, params[:-2] + (0, 0)) for sql, params in statements]
+    prepare_interpolated = [(interpolate(sql, params), ()) for sql, params in prepare_only]
+    shapes = len({sql for sql, _ in statements})
+
+    print(f"\n{Colors.GREEN}=== Parametrizované dotazy ({args.rows:,} produktů, "
+          f"{len(mix):,} dotazů) ==={Colors.RESET}")
+    print(f"{Colors.GRAY}Různých textů SQL: parametrizovaně {shapes}, "
+          f"s vloženými hodnotami {len({sql for sql, _ in interpolated})}{Colors.RESET}")
+
+    variants = {}
+    checksums = {}
+    largest = max(args.cache_sizes)
+    runs = [(f'cache_{size}', size, True, statements, prepare_only) for size in args.cache_sizes]
+    runs.append(('interpolated', largest, False, interpolated, prepare_interpolated))
+    for name, size, parameterized, full, prepare in runs:
+        pool = ConnectionPool(path, max_size=1, cached_statements=size, read_only=True)
+        seconds, checksums[name] = run(pool, full, args.repeat)
+        prepare_seconds, _ = run(pool, prepare, args.repeat)
+        pool.close()
+        variants[name] = {
+            'cached_statements': size,
+            'parameterized': parameterized,
+            'seconds': seconds,
+            'us_per_query': round(seconds / len(mix) * 1e6, 2),
+            'prepare_us_per_query': round(prepare_seconds / len(mix) * 1e6, 2)
+        }
+
+    baseline = variants[f'cache_{largest}']
+    print(f"\n{Colors.GRAY}{'Varianta':<16}{'cache':>8}{'celkem ms':>12}{'µs/dotaz':>12}"
+          f"{'příprava µs':>14}{'vs. cache':>12}{Colors.RESET}")
+    for name, info in variants.items():
+        info['prepare_relative'] = round(info['prepare_us_per_query'] / baseline['prepare_us_per_query'], 3)
+        print(f"{name:<16}{info['cached_statements']:>8}{info['seconds'] * 1000:>12.1f}"
+              f"{info['us_per_query']:>12.2f}{info['prepare_us_per_query']:>14.2f}{info['prepare_relative']:>11.2f}x")
+
+    saved = variants['interpolated']['prepare_us_per_query'] - baseline['prepare_us_per_query']
+    print(f"\n{Colors.CYAN}Opakované použití připraveného příkazu ušetří {saved:.1f} µs na dotaz "
+          f"({shapes} tvarů dotazu, cache {largest}); čtení řádků zůstává stejné{Colors.RESET}")
+
+    mismatches = [name for name, checksum in checksums.items() if checksum != checksums[f'cache_{largest}']]
+    if mismatches:
+        print(f"\n{Colors.RED}❌ Rozdílné výsledky: {', '.join(mismatches)}{Colors.RESET}")
+    else:
+        print(f"\n{Colors.GREEN}✓ Všechny varianty vrací stejné výsledky{Colors.RESET}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'rows': args.rows,
+            'seed': args.seed,
+            'queries': len(mix),
+            'limit': args.limit,
+            'statement_shapes': shapes,
+            'variants': variants,
+            'mismatches': mismatches
+        }, f, ensure_ascii=False, indent=2)
+    print(f"{Colors.GRAY}Výsledky uloženy do: {args.output}{Colors.RESET}\n")
+
+    db.close()
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
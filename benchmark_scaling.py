@@ -0,0 +1,216 @@
+"""
+Benchmark škálování fází agenta s velikostí katalogu
+Spuštění:
+    python benchmark_scaling.py                       # 10^4 .. 10^6 produktů
+    python benchmark_scaling.py --sizes 10000 100000 1000000 10000000
+    python benchmark_scaling.py --output scaling.json --tolerance 0.25
+
+Pro každou velikost vygeneruje (nebo znovu použije) katalog pomocí
+generate_catalog.py, změří jednotlivé fáze agenta - načtení z databáze,
+statistiky, agregaci po kategoriích, nízké zásoby, top-K a odpověď simulátoru -
+a ze sklonu v log-log měřítku určí, jak čas roste s počtem řádků. Fáze
+rostoucí rychleji než lineárně se označí.
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import resource
+import time
+from datetime import datetime
+
+from generate_catalog import create_catalog
+from python_agent_extended import DatabaseTool, StatisticsTool, LLMSimulator
+
+
+class Colors:
+    GREEN = '\033[92m'
+    CYAN = '\033[96m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    GRAY = '\033[90m'
+    RESET = '\033[0m'
+
+
+def timed(func, repeat: int) -> tuple:
+    """Nejlepší čas z několika opakování (v sekundách) a výsledek posledního běhu"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def catalog_path(workdir: str, rows: int, seed: int) -> str:
+    return os.path.join(workdir, f"catalog_{rows}_{seed}.db")
+
+
+def measure_size(rows: int, args) -> dict:
+    """Změří všechny fáze pro jednu velikost katalogu"""
+    path = catalog_path(args.workdir, rows, args.seed)
+    result = {'rows': rows, 'stages': {}, 'skipped': []}
+
+    if args.regenerate or not os.path.exists(path):
+        print(f"{Colors.GRAY}📦 Generuji {rows:,} produktů...{Colors.RESET}")
+        result['load'] = create_catalog(path, rows, args.seed, force=True)
+
+    # První otevření vytvoří indexy a triggery - u nově vygenerovaného katalogu
+    start = time.perf_counter()
+    db = DatabaseTool(path)
+    result['open_seconds'] = round(time.perf_counter() - start, 4)
+    stages = result['stages']
+    repeat = args.repeat
+
+    try:
+        # Fáze nad SQL (bez načtení celého katalogu do paměti)
+        stages['statistics'], stats = timed(db.get_statistics, repeat)
+        stages['category_aggregation_sql'], category_stats = timed(db.get_category_statistics, repeat)
+        stages['low_stock_sql'], low_stock = timed(db.find_low_stock, repeat)
+        stages['top_k_sql'], expensive = timed(db.find_expensive, repeat)
+
+        # Fáze nad seznamem slovníků - při velkém katalogu by se nevešly do paměti
+        if rows <= args.materialize_limit:
+            stages['db_fetch'], products = timed(db.query, 1)
+            stages['category_aggregation'], _ = timed(
+                lambda: StatisticsTool.calculate_by_category(products), repeat)
+            stages['low_stock'], _ = timed(lambda: StatisticsTool.find_low_stock(products), repeat)
+            stages['top_k'], _ = timed(lambda: StatisticsTool.find_expensive(products), repeat)
+            del products
+        else:
+            result['skipped'] = ['db_fetch', 'category_aggregation', 'low_stock', 'top_k']
+
+        data = {'category_stats': category_stats, 'low_stock': low_stock, 'expensive': expensive}
+        for intent in ('count', 'categories', 'low_stock', 'expensive'):
+            stages[f'llm_{intent}'], _ = timed(
+                lambda: LLMSimulator.generate_response('', data, stats, intent=intent), repeat)
+    finally:
+        db.close()
+        gc.collect()
+
+    result['stages'] = {name: round(seconds, 6) for name, seconds in stages.items()}
+    # ru_maxrss je v KiB (Linux) - maximum za celý běh, ne jen pro tuto velikost
+    result['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def scaling_exponent(points: list) -> float:
+    """Sklon přímky log(čas) ~ log(řádky) metodou nejmenších čtverců (1.0 = lineární)"""
+    points = [(math.log(n), math.log(max(t, 1e-7))) for n, t in points]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+def analyze(results: list, tolerance: float, min_seconds: float) -> dict:
+    """Exponent růstu pro každou fázi; superlineární = nad 1 + tolerance"""
+    stage_names = []
+    for r in results:
+        for name in r['stages']:
+            if name not in stage_names:
+                stage_names.append(name)
+
+    analysis = {}
+    for name in stage_names:
+        # Velmi krátké časy jsou hlavně režie a šum - do sklonu se nepočítají
+        points = [(r['rows'], r['stages'][name]) for r in results
+                  if name in r['stages'] and r['stages'][name] >= min_seconds]
+        exponent = scaling_exponent(points)
+        # Sklon posledního úseku zachytí zlom, který by se v celkovém sklonu ztratil
+        last = scaling_exponent(points[-2:]) if len(points) >= 2 else None
+        worst = max(e for e in (exponent, last) if e is not None) if exponent is not None else None
+        analysis[name] = {
+            'exponent': round(exponent, 3) if exponent is not None else None,
+            'last_segment_exponent': round(last, 3) if last is not None else None,
+            'superlinear': worst is not None and worst > 1 + tolerance
+        }
+    return analysis
+
+
+def print_report(results: list, analysis: dict):
+    sizes = [r['rows'] for r in results]
+    print(f"\n{Colors.GREEN}=== Časy fází (ms) ==={Colors.RESET}")
+    header = f"{'Fáze':<26}" + ''.join(f"{n:>14,}" for n in sizes) + f"{'exponent':>10}"
+    print(f"{Colors.GRAY}{header}{Colors.RESET}")
+    for name, info in analysis.items():
+        cells = ''.join(
+            f"{r['stages'][name] * 1000:>14.3f}" if name in r['stages'] else f"{'-':>14}"
+            for r in results
+        )
+        exponent = info['exponent']
+        exp_text = f"{exponent:>10.2f}" if exponent is not None else f"{'-':>10}"
+        color = Colors.RED if info['superlinear'] else ''
+        print(f"{color}{name:<26}{cells}{exp_text}{Colors.RESET if color else ''}")
+
+    print(f"\n{Colors.GRAY}Otevření (indexy): " + ', '.join(
+        f"{r['rows']:,}: {r['open_seconds']} s" for r in results) + Colors.RESET)
+    for r in results:
+        if 'load' in r:
+            print(f"{Colors.GRAY}Generování {r['rows']:,}: {r['load']['seconds']} s, "
+                  f"{r['load']['rows_per_second']:,} řádků/s{Colors.RESET}")
+
+    flagged = [name for name, info in analysis.items() if info['superlinear']]
+    if flagged:
+        print(f"\n{Colors.RED}⚠️  Superlineární růst: {', '.join(flagged)}{Colors.RESET}")
+    else:
+        print(f"\n{Colors.GREEN}✓ Žádná fáze neroste rychleji než lineárně{Colors.RESET}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark škálování s velikostí katalogu')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3, help='opakování každé fáze (bere se nejlepší)')
+    parser.add_argument('--workdir', default='./data/scaling', help='adresář pro vygenerované katalogy')
+    parser.add_argument('--regenerate', action='store_true', help='vygenerovat katalogy znovu')
+    parser.add_argument('--materialize-limit', type=int, default=2000000,
+                        help='nad tento počet řádků se nenačítá celý katalog do paměti')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='povolená odchylka exponentu nad 1.0')
+    parser.add_argument('--min-ms', type=float, default=0.5,
+                        help='kratší časy se do exponentu nepočítají')
+    parser.add_argument('--output', default='benchmark_scaling.json')
+    args = parser.parse_args()
+
+    print(f"\n{Colors.GREEN}=== Benchmark škálování katalogu ==={Colors.RESET}")
+    print(f"{Colors.GRAY}Velikosti: {', '.join(f'{n:,}' for n in args.sizes)}, "
+          f"seed {args.seed}, opakování {args.repeat}{Colors.RESET}")
+
+    results = []
+    for rows in sorted(args.sizes):
+        print(f"{Colors.CYAN}▶ {rows:,} produktů{Colors.RESET}")
+        results.append(measure_size(rows, args))
+
+    analysis = analyze(results, args.tolerance, args.min_ms / 1000)
+    print_report(results, analysis)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'config': {
+                'sizes': sorted(args.sizes),
+                'seed': args.seed,
+                'repeat': args.repeat,
+                'tolerance': args.tolerance
+            },
+            'results': results,
+            'analysis': analysis
+        }, f, ensure_ascii=False, indent=2)
+    print(f"{Colors.GRAY}Výsledky uloženy do: {args.output}{Colors.RESET}\n")
+
+    if any(info['superlinear'] for info in analysis.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Latence fulltextového vyhledávání (FTS5) proti průchodu tabulkou
+Spuštění:
+    python benchmark_search.py                          # 10^4 .. 10^6 produktů
+    python benchmark_search.py --sizes 100000 1000000 10000000 --scan-limit 1000000
+
+Pro každou velikost vygeneruje (nebo znovu použije) katalog pomocí
+generate_catalog.py, změří stavbu indexu products_fts při prvním otevření,
+latenci DatabaseTool.search_products pro mix dotazů (p50/p95/max) a pro
+srovnání stejné dotazy průchodem tabulky s porovnáním podřetězců - tak, jak
+hledá DatabaseTool bez FTS5.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from generate_catalog import create_catalog
+from python_agent_extended import DatabaseTool
+
+# Dotazy nad slovníkem generátoru - značky, typy, skloňování, bez diakritiky
+QUERIES = [
+    'Apple',
+    'sluchátka Sony',
+    'notebooky',
+    'cokolada Milka',
+    'Pro Max',
+    'powerbanka Xiaomi',
+    'bunda The North Face',
+    'Máme něco od Dysonu?',
+    'kvantový teleport'  # bez výsledku
+]
+
+
+class Colors:
+    GREEN = '\033[92m'
+    CYAN = '\033[96m'
+    GRAY = '\033[90m'
+    RESET = '\033[0m'
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def latencies(search, queries: list, repeat: int) -> tuple:
+    """Časy všech dotazů (s) a počty výsledků z posledního opakování"""
+    times, hits = [], {}
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            found = search(query)
+            times.append(time.perf_counter() - start)
+            hits[query] = len(found)
+    return sorted(times), hits
+
+
+def summary_ms(times: list) -> dict:
+    return {
+        'p50': round(percentile(times, 50) * 1000, 3),
+        'p95': round(percentile(times, 95) * 1000, 3),
+        'max': round(times[-1] * 1000, 3) if times else 0.0
+    }
+
+
+def measure_size(rows: int, args) -> dict:
+    path = os.path.join(args.workdir, f"catalog_{rows}_{args.seed}.db")
+    result = {'rows': rows}
+    if not os.path.exists(path):
+        print(f"{Colors.GRAY}📦 Generuji {rows:,} produktů...{Colors.RESET}")
+        create_catalog(path, rows, args.seed)
+
+    # První otevření postaví indexy i products_fts; další už jen ověří, že existují
+    start = time.perf_counter()
+    db = DatabaseTool(path)
+    result['open_seconds'] = round(time.perf_counter() - start, 3)
+    result['fts'] = db.fts
+
+    try:
+        search = lambda q: db.search_products(q, args.limit, any_term=True)
+        search(QUERIES[0])  # zahřátí cache stránek
+        times, hits = latencies(search, QUERIES, args.repeat)
+        result['fts_ms'] = summary_ms(times)
+        result['hits'] = hits
+
+        if rows <= args.scan_limit:
+            db.fts = False
+            times, _ = latencies(search, QUERIES, 1)
+            db.fts = result['fts']
+            result['scan_ms'] = summary_ms(times)
+    finally:
+        db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latence fulltextového vyhledávání')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help='opakování mixu dotazů')
+    parser.add_argument('--limit', type=int, default=10, help='počet výsledků dotazu')
+    parser.add_argument('--workdir', default='./data/scaling', help='adresář pro vygenerované katalogy')
+    parser.add_argument('--scan-limit', type=int, default=1000000,
+                        help='nad tento počet řádků se průchod tabulkou neměří')
+    parser.add_argument('--output', default='benchmark_search.json')
+    args = parser.parse_args()
+
+    print(f"\n{Colors.GREEN}=== Fulltextové vyhledávání: FTS5 vs. průchod tabulkou ==={Colors.RESET}")
+    results = []
+    for rows in sorted(args.sizes):
+        print(f"{Colors.CYAN}▶ {rows:,} produktů{Colors.RESET}")
+        results.append(measure_size(rows, args))
+
+    print(f"\n{Colors.GRAY}{'Produktů':>12} {'otevření s':>11} {'FTS p50':>9} {'FTS p95':>9} "
+          f"{'FTS max':>9} {'scan p50':>10} {'scan p95':>10} {'zrychlení':>10}{Colors.RESET}")
+    for r in results:
+        fts = r['fts_ms']
+        scan = r.get('scan_ms')
+        scan_text = f"{scan['p50']:>10.1f} {scan['p95']:>10.1f}" if scan else f"{'-':>10} {'-':>10}"
+        speedup = f"{scan['p50'] / max(fts['p50'], 0.001):>9.0f}x" if scan else f"{'-':>10}"
+        print(f"{r['rows']:>12,} {r['open_seconds']:>11} {fts['p50']:>9.2f} {fts['p95']:>9.2f} "
+              f"{fts['max']:>9.2f} {scan_text} {speedup}")
+    print(f"{Colors.GRAY}(časy v ms){Colors.RESET}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'config': {'sizes': sorted(args.sizes), 'seed': args.seed,
+                       'repeat': args.repeat, 'limit': args.limit, 'queries': QUERIES},
+            'results': results
+        }, f, ensure_ascii=False, indent=2)
+    print(f"{Colors.GRAY}Výsledky uloženy do: {args.output}{Colors.RESET}\n")
+
+
+if __name__ == "__main__":
+    main()
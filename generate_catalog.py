@@ -0,0 +1,187 @@
+"""
+Generátor syntetického katalogu produktů pro testy škálování
+Spuštění:
+    python generate_catalog.py --rows 1000000 --output ./data/catalog_1m.db
+    python generate_catalog.py --rows 100000 --seed 7 --output ./data/catalog.db --force
+
+Stejné --rows a --seed dají vždy stejná data. Kategorie, značky, ceny a zásoby
+mají rozložení podobné init_database.sql (ceny log-normálně, značky podle
+Zipfova zákona, potraviny s vyššími zásobami). Vytvoří se jen tabulka
+products - indexy a triggery doplní DatabaseTool při prvním otevření:
+    DATABASE_PATH=./data/catalog_1m.db python python_agent_extended.py
+"""
+
+import argparse
+import bisect
+import itertools
+import math
+import os
+import random
+import sqlite3
+import time
+
+# Kategorie: (váha, medián ceny, rozptyl log-ceny, min, max, průměrná zásoba, značky, typy produktů)
+CATEGORIES = {
+    'Elektronika': (
+        0.33, 8990, 1.0, 290, 149990, 15,
+        ['Apple', 'Samsung', 'Sony', 'Dell', 'LG', 'Logitech', 'Xiaomi', 'Canon', 'ASUS',
+         'Philips', 'JBL', 'Garmin', 'Anker', 'Lenovo', 'HP', 'Acer', 'Bosch', 'Microsoft'],
+        ['Notebook', 'Telefon', 'Tablet', 'Monitor', 'Sluchátka', 'Reproduktor', 'Fotoaparát',
+         'Myš', 'Klávesnice', 'Televize', 'Router', 'Hodinky', 'Powerbanka', 'Disk SSD']
+    ),
+    'Oblečení': (
+        0.20, 1990, 0.8, 199, 39990, 25,
+        ['Nike', 'Adidas', 'Levis', 'Puma', 'Zara', 'H&M', 'The North Face', 'Columbia',
+         'Tommy Hilfiger', 'Calvin Klein', 'Under Armour', 'New Balance', 'Patagonia', 'Vans'],
+        ['Tričko', 'Mikina', 'Bunda', 'Džíny', 'Boty', 'Košile', 'Šaty', 'Kraťasy',
+         'Čepice', 'Ponožky', 'Svetr', 'Kabát']
+    ),
+    'Potraviny': (
+        0.20, 89, 0.6, 9, 999, 180,
+        ['Lavazza', 'Tchibo', 'Nestlé', 'Milka', 'Lindt', 'Haribo', 'Barilla', 'Heinz',
+         'Kofola', 'Mattoni', 'Coca-Cola', 'Twinings', 'Kelloggs', 'Ferrero', 'Pringles'],
+        ['Káva', 'Čaj', 'Čokoláda', 'Sušenky', 'Těstoviny', 'Omáčka', 'Limonáda',
+         'Minerálka', 'Cereálie', 'Bonbony', 'Chipsy', 'Džem']
+    ),
+    'Domácnost': (
+        0.27, 1290, 1.0, 49, 49990, 23,
+        ['Tefal', 'WMF', 'Bosch', 'Philips', 'IKEA', 'Tescoma', 'Fiskars', 'Dyson',
+         'KitchenAid', 'Zwilling', 'Vileda', 'Leifheit', 'Brabantia', 'OXO', 'Kärcher'],
+        ['Pánev', 'Hrnec', 'Nůž', 'Mixér', 'Vysavač', 'Konvice', 'Prkénko', 'Mop',
+         'Koš', 'Sada nádobí', 'Toustovač', 'Žehlička', 'Lampa', 'Dóza']
+    )
+}
+
+VARIANTS = ['Basic', 'Plus', 'Pro', 'Max', 'Mini', 'Lite', 'Classic', 'Premium', 'Eco', 'Sport']
+
+SCHEMA = '''
+    CREATE TABLE products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        price REAL NOT NULL,
+        stock INTEGER NOT NULL,
+        description TEXT,
+        brand TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> list:
+    """Kumulativní váhy - první značky jsou výrazně častější než poslední"""
+    cumulative, total = [], 0.0
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def generate_products(rows: int, seed: int = 42, start_id: int = 1):
+    """Deterministicky generuje n-tice (id, name, category, price, stock, description, brand)"""
+    rng = random.Random(seed)
+    # Kumulativní váhy + bisect - rychlejší než random.choices pro každý řádek
+    names = list(CATEGORIES)
+    category_cum = list(itertools.accumulate(CATEGORIES[c][0] for c in names))
+    profiles = []
+    for category in names:
+        _, median, sigma, low, high, mean_stock, brands, kinds = CATEGORIES[category]
+        brand_cum = zipf_weights(len(brands))
+        profiles.append((category, math.log(median), sigma, low, high, 1 / mean_stock,
+                         brands, brand_cum, kinds))
+
+    random_ = rng.random
+    for product_id in range(start_id, start_id + rows):
+        category, mu, sigma, low, high, stock_rate, brands, brand_cum, kinds = \
+            profiles[bisect.bisect(category_cum, random_() * category_cum[-1])]
+        brand = brands[bisect.bisect(brand_cum, random_() * brand_cum[-1])]
+        kind = kinds[int(random_() * len(kinds))]
+
+        # Log-normální cena zaokrouhlená na "baťovské" ceny (…89 / …990)
+        price = min(max(rng.lognormvariate(mu, sigma), low), high)
+        price = max(round(price, -1) - 1 if price < 1000 else round(price, -2) - 10, 9)
+
+        # Exponenciální zásoby - u dražších kategorií je hodně položek pod prahem 10 kusů
+        stock = int(rng.expovariate(stock_rate))
+
+        name = f"{brand} {kind} {VARIANTS[int(random_() * len(VARIANTS))]} {product_id}"
+        description = f"{kind} značky {brand}, kategorie {category}"
+        yield (product_id, name, category, float(price), stock, description, brand)
+
+
+def create_catalog(path: str, rows: int, seed: int = 42, batch_size: int = 50000,
+                   force: bool = False, progress: bool = True) -> dict:
+    """Vytvoří SQLite soubor s vygenerovaným katalogem a vrátí čas a rychlost načtení"""
+    if os.path.exists(path):
+        if not force:
+            raise FileExistsError(f"{path} už existuje (použijte --force)")
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    # Nastavení jen pro hromadné načtení - soubor se při chybě stejně zahodí
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA locking_mode=EXCLUSIVE')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-262144')
+
+    start = time.perf_counter()
+    conn.execute(SCHEMA)
+    conn.execute('BEGIN')
+    insert = 'INSERT INTO products (id, name, category, price, stock, description, brand) VALUES (?, ?, ?, ?, ?, ?, ?)'
+    loaded = 0
+    batch = []
+    for row in generate_products(rows, seed):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(insert, batch)
+            loaded += len(batch)
+            batch.clear()
+            if progress:
+                rate = loaded / (time.perf_counter() - start)
+                print(f"\r   {loaded:>12,} / {rows:,} řádků ({rate:,.0f} řádků/s)", end='', flush=True)
+    if batch:
+        conn.executemany(insert, batch)
+        loaded += len(batch)
+    conn.execute('COMMIT')
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    if progress:
+        print(f"\r   {loaded:>12,} / {rows:,} řádků ({loaded / elapsed:,.0f} řádků/s)")
+
+    return {
+        'rows': loaded,
+        'seed': seed,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(loaded / elapsed) if elapsed else 0,
+        'size_mb': round(os.path.getsize(path) / 1024 / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generátor syntetického katalogu')
+    parser.add_argument('--rows', type=int, default=100000, help='počet produktů')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='./data/catalog.db', help='cílový SQLite soubor')
+    parser.add_argument('--batch-size', type=int, default=50000, help='řádků na jedno executemany')
+    parser.add_argument('--force', action='store_true', help='přepsat existující soubor')
+    args = parser.parse_args()
+
+    print(f"📦 Generuji {args.rows:,} produktů (seed {args.seed}) do {args.output}")
+    try:
+        result = create_catalog(args.output, args.rows, args.seed, args.batch_size, args.force)
+    except FileExistsError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    print(f"✅ Hotovo za {result['seconds']} s, {result['rows_per_second']:,} řádků/s, "
+          f"{result['size_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Lokální stub OpenAI-kompatibilního API pro testy a benchmarky bez sítě
+Spuštění: python openai_stub_server.py [--port 8100] [--latency 0.2] [--fail-rate 0.1] [--token-delay 0.05]
+
+Agenta proti stubu pustíte takto:
+    LLM_MODE=openai OPENAI_API_KEY=stub OPENAI_BASE_URL=http://localhost:8100/v1 python python_agent_extended.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubState:
+    """Čítače stubu - kolik požadavků opravdu dorazilo"""
+
+    def __init__(self, latency: float, fail_rate: float, token_delay: float = 0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.token_delay = token_delay
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Odpovídá na POST /v1/chat/completions jako OpenAI API"""
+
+    protocol_version = 'HTTP/1.1'
+    state: StubState = None
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, request: dict, answer: str):
+        """Odpověď pro stream=True - SSE s částmi chat.completion.chunk a [DONE]"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(delta: dict, finish_reason=None):
+            payload = json.dumps({
+                'id': f"chatcmpl-stub-{self.state.requests}",
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': request.get('model', 'stub'),
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }, ensure_ascii=False)
+            return f"data: {payload}\n\n"
+
+        def write(text: str):
+            data = text.encode()
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+        write(chunk({'role': 'assistant', 'content': ''}))
+        # Po slovech, jako tokeny skutečného modelu
+        for i, word in enumerate(answer.split(' ')):
+            if self.state.token_delay:
+                time.sleep(self.state.token_delay)
+            write(chunk({'content': word if i == 0 else ' ' + word}))
+        write(chunk({}, 'stop'))
+        write('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.state.lock:
+                self._send_json(200, {
+                    'requests': self.state.requests,
+                    'failures': self.state.failures,
+                    'max_in_flight': self.state.max_in_flight
+                })
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if not self.path.endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            time.sleep(state.latency)
+            if random.random() < state.fail_rate:
+                with state.lock:
+                    state.failures += 1
+                self._send_json(503, {'error': {'message': 'Stub: simulované přetížení', 'type': 'server_error'}})
+                return
+
+            question = request.get('messages', [{}])[-1].get('content', '')
+            answer = f"Stub odpověď na: {question}"
+            if request.get('stream'):
+                self._send_stream(request, answer)
+                return
+            self._send_json(200, {
+                'id': f"chatcmpl-stub-{state.requests}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'stub'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': answer},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+            })
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_stub(port: int = 8100, latency: float = 0.2, fail_rate: float = 0.0,
+             token_delay: float = 0.0) -> ThreadingHTTPServer:
+    """Spustí stub v pozadí a vrátí server (pro použití z benchmarků)"""
+    StubHandler.state = StubState(latency, fail_rate, token_delay)
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub OpenAI API')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=0.2, help='zpoždění odpovědi v sekundách')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='podíl odpovědí 503 (0-1)')
+    parser.add_argument('--token-delay', type=float, default=0.0,
+                        help='zpoždění mezi tokeny při stream=True v sekundách')
+    args = parser.parse_args()
+
+    server = run_stub(args.port, args.latency, args.fail_rate, args.token_delay)
+    print(f"🧪 OpenAI stub běží na http://localhost:{args.port}/v1 "
+          f"(latence {args.latency}s, chybovost {args.fail_rate:.0%})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n👋 Stub ukončen")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,92 +10,260 @@ Tento agent:
 
 import sqlite3
 import json
+import heapq
+import operator
+from collections import namedtuple
 from datetime import datetime
 from typing import Dict, List, Any
+from contextlib import contextmanager
+import threading
+import queue
+import time
+
+
+class ConnectionPool:
+    """Omezený pool SQLite spojení sdílený mezi vlákny"""
+    
+    def __init__(self, db_path: str, max_size: int = 4, timeout: float = 5.0,
+                 cached_statements: int = 128):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._created = 0
+        
+        # Čítače pro diagnostiku poolu
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Otevře nové spojení s vyladěnými pragmami"""
+        # check_same_thread=False - spojení putuje mezi vlákny, ale vždy ho drží jen jedno
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA mmap_size=268435456')
+        conn.execute('PRAGMA cache_size=-16000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Vypůjčí spojení z poolu (případně založí nové nebo počká)"""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+                self.misses += 1
+        
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        # Pool je vyčerpaný - čekáme na vrácení spojení
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Pool SQLite spojení je vyčerpaný (max {self.max_size})")
+        finally:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+        with self._lock:
+            self.hits += 1
+        return conn
+    
+    def release(self, conn: sqlite3.Connection):
+        """Vrátí spojení do poolu"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Context manager: with pool.connection() as conn: ..."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def close(self):
+        """Zavře všechna nevypůjčená spojení"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def stats(self) -> Dict:
+        """Čítače poolu - hit/miss a čekání na volné spojení"""
+        with self._lock:
+            return {
+                'size': self._created,
+                'max_size': self.max_size,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 3)
+            }
+
+
+class Product(tuple):
+    """Řádek tabulky products - n-tice s pojmenovanými sloupci místo slovníku
+    
+    Klíče nejsou v každém řádku znovu, sloupce se čtou atributem (p.price).
+    Kvůli kompatibilitě funguje i p['price'] a to_dict() vrací stejný
+    slovník, jaký dřív vracel DatabaseTool.query().
+    """
+    
+    __slots__ = ()
+    _types = {}  # sloupce -> podtřída s atributy (jedna pro každé schéma)
+    
+    @classmethod
+    def for_columns(cls, columns) -> type:
+        columns = tuple(columns)
+        product_type = cls._types.get(columns)
+        if product_type is None:
+            product_type = type('Product', (namedtuple('Product', columns), cls), {'__slots__': ()})
+            cls._types[columns] = product_type
+        return product_type
+    
+    @classmethod
+    def row_factory(cls, description):
+        """row_factory pro sqlite3 kurzor s daným popisem sloupců"""
+        make = cls.for_columns(desc[0] for desc in description)._make
+        return lambda cursor, row: make(row)
+    
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self._fields else default
+    
+    def to_dict(self) -> Dict:
+        return dict(zip(self._fields, self))
 
 
 class DatabaseTool:
     """Nástroj pro práci s databází"""
     
-    def __init__(self, db_path: str = "products.db"):
+    def __init__(self, db_path: str = "products.db", pool_size: int = 4):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, max_size=pool_size)
         self._init_database()
     
     def _init_database(self):
         """Inicializace databáze s ukázkovými daty"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
         
-        # Vytvoření tabulky
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                price REAL NOT NULL,
-                stock INTEGER NOT NULL,
-                description TEXT
-            )
-        ''')
+            # Vytvoření tabulky
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    stock INTEGER NOT NULL,
+                    description TEXT
+                )
+            ''')
         
-        # Kontrola, zda už jsou data
-        cursor.execute('SELECT COUNT(*) FROM products')
-        if cursor.fetchone()[0] == 0:
-            # Vložení ukázkových dat
-            products = [
-                ('Notebook Dell XPS', 'Elektronika', 29990, 5, 'Výkonný ultrabook'),
-                ('iPhone 15 Pro', 'Elektronika', 34990, 8, 'Nejnovější iPhone'),
-                ('Samsung Galaxy S24', 'Elektronika', 24990, 12, 'Android smartphone'),
-                ('Sony Sluchátka', 'Elektronika', 9990, 15, 'Bezdrátová sluchátka'),
-                ('Zimní bunda', 'Oblečení', 5990, 20, 'Zateplená bunda'),
-                ('Běžecké boty Nike', 'Oblečení', 3490, 25, 'Sportovní obuv'),
-                ('Mikina Adidas', 'Oblečení', 1490, 30, 'Bavlněná mikina'),
-                ('Bio káva', 'Potraviny', 249, 50, 'Zrnková káva 250g'),
-                ('Organický med', 'Potraviny', 189, 40, 'Lesní med 500g'),
-                ('Čokoláda Lindt', 'Potraviny', 59, 100, 'Hořká čokoláda'),
-            ]
-            cursor.executemany(
-                'INSERT INTO products (name, category, price, stock, description) VALUES (?, ?, ?, ?, ?)',
-                products
-            )
-        
-        conn.commit()
-        conn.close()
+            # Kontrola, zda už jsou data
+            cursor.execute('SELECT COUNT(*) FROM products')
+            if cursor.fetchone()[0] == 0:
+                # Vložení ukázkových dat
+                products = [
+                    ('Notebook Dell XPS', 'Elektronika', 29990, 5, 'Výkonný ultrabook'),
+                    ('iPhone 15 Pro', 'Elektronika', 34990, 8, 'Nejnovější iPhone'),
+                    ('Samsung Galaxy S24', 'Elektronika', 24990, 12, 'Android smartphone'),
+                    ('Sony Sluchátka', 'Elektronika', 9990, 15, 'Bezdrátová sluchátka'),
+                    ('Zimní bunda', 'Oblečení', 5990, 20, 'Zateplená bunda'),
+                    ('Běžecké boty Nike', 'Oblečení', 3490, 25, 'Sportovní obuv'),
+                    ('Mikina Adidas', 'Oblečení', 1490, 30, 'Bavlněná mikina'),
+                    ('Bio káva', 'Potraviny', 249, 50, 'Zrnková káva 250g'),
+                    ('Organický med', 'Potraviny', 189, 40, 'Lesní med 500g'),
+                    ('Čokoláda Lindt', 'Potraviny', 59, 100, 'Hořká čokoláda'),
+                ]
+                cursor.executemany(
+                    'INSERT INTO products (name, category, price, stock, description) VALUES (?, ?, ?, ?, ?)',
+                    products
+                )
+            
+            self._create_indexes(cursor)
+            conn.commit()
+    
+    def _create_indexes(self, cursor: sqlite3.Cursor):
+        """Indexy pro top-K a prahové dotazy (cena, zásoby, kategorie + cena)"""
+        # price DESC - shody v ceně pak vycházejí podle id jako u stabilního řazení
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_price ON products(price DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_stock ON products(stock)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_category_price ON products(category, price DESC)')
     
-    def query(self, sql: str = None) -> List[Dict]:
+    def query(self, sql: str = None) -> List[Product]:
         """Spustí SQL dotaz nebo vrátí všechny produkty"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if sql is None:
-            cursor.execute('SELECT * FROM products')
-        else:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            if sql is None:
+                # Katalog jako Product n-tice; vlastní SQL dál jako slovníky
+                cursor.execute('SELECT * FROM products')
+                cursor.row_factory = Product.row_factory(cursor.description)
+                return cursor.fetchall()
+            
             cursor.execute(sql)
+            columns = [desc[0] for desc in cursor.description]
+            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
         
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
         return results
     
     def get_statistics(self) -> Dict:
         """Získá základní statistiky"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as count,
-                AVG(price) as avg_price,
-                MIN(price) as min_price,
-                MAX(price) as max_price,
-                SUM(stock) as total_stock,
-                SUM(price * stock) as total_value
-            FROM products
-        ''')
-        
-        stats = cursor.fetchone()
-        conn.close()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT 
+                    COUNT(*) as count,
+                    AVG(price) as avg_price,
+                    MIN(price) as min_price,
+                    MAX(price) as max_price,
+                    SUM(stock) as total_stock,
+                    SUM(price * stock) as total_value
+                FROM products
+            ''')
+            
+            stats = cursor.fetchone()
         
         return {
             'total_products': stats[0],
@@ -105,48 +273,114 @@ class DatabaseTool:
             'total_stock': stats[4],
             'total_value': round(stats[5], 2) if stats[5] else 0
         }
+    
+    def get_category_statistics(self) -> Dict:
+        """Statistiky podle kategorií spočítané v SQL (GROUP BY)
+        
+        Vrací stejný tvar jako StatisticsTool.calculate_by_category.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT category, COUNT(*), SUM(price * stock), AVG(price), MIN(id) AS first_id
+                FROM products
+                GROUP BY category
+                ORDER BY first_id
+            ''')
+            categories = {
+                cat: {
+                    'count': count,
+                    'total_value': total_value,
+                    'avg_price': round(avg_price, 2),
+                    'products': []
+                }
+                for cat, count, total_value, avg_price, _ in cursor.fetchall()
+            }
+            
+            # Názvy produktů v pořadí podle id - bez stavby slovníků pro řádky
+            cursor.execute('SELECT category, name FROM products ORDER BY id')
+            for cat, name in cursor:
+                categories[cat]['products'].append(name)
+        
+        return categories
+    
+    def _fetch_products(self, sql: str, params: tuple = ()) -> List[Product]:
+        with self.pool.connection() as conn:
+            cursor = conn.execute(sql, params)
+            cursor.row_factory = Product.row_factory(cursor.description)
+            return cursor.fetchall()
+    
+    def find_low_stock(self, threshold: int = 10) -> List[Product]:
+        """Produkty se zásobou pod prahem - přes index na stock"""
+        # Bez ORDER BY id v SQL, jinak planner zvolí průchod celou tabulkou
+        rows = self._fetch_products('SELECT * FROM products WHERE stock < ?', (threshold,))
+        rows.sort(key=operator.attrgetter('id'))
+        return rows
+    
+    def find_expensive(self, limit: int = 5, category: str = None) -> List[Product]:
+        """Top-K nejdražších produktů - přes index na price (category, price)"""
+        if category is None:
+            return self._fetch_products(
+                'SELECT * FROM products ORDER BY price DESC, id LIMIT ?',
+                (limit,)
+            )
+        return self._fetch_products(
+            'SELECT * FROM products WHERE category = ? ORDER BY price DESC, id LIMIT ?',
+            (category, limit)
+        )
+    
+    def pool_stats(self) -> Dict:
+        """Vrátí čítače poolu spojení"""
+        return self.pool.stats()
+    
+    def close(self):
+        """Uzavře spojení v poolu"""
+        self.pool.close()
 
 
 class StatisticsTool:
     """Nástroj pro výpočty a statistiky"""
     
     @staticmethod
-    def calculate_by_category(products: List[Dict]) -> Dict:
-        """Vypočítá statistiky podle kategorií"""
+    def calculate_by_category(products: List[Product]) -> Dict:
+        """Vypočítá statistiky podle kategorií (jedním průchodem přes data)"""
         categories = {}
+        price_sums = {}
         
         for p in products:
-            cat = p['category']
-            if cat not in categories:
-                categories[cat] = {
+            cat = p.category
+            info = categories.get(cat)
+            if info is None:
+                info = categories[cat] = {
                     'count': 0,
                     'total_value': 0,
                     'avg_price': 0,
                     'products': []
                 }
+                price_sums[cat] = 0
             
-            categories[cat]['count'] += 1
-            categories[cat]['total_value'] += p['price'] * p['stock']
-            categories[cat]['products'].append(p['name'])
+            info['count'] += 1
+            info['total_value'] += p.price * p.stock
+            info['products'].append(p.name)
+            price_sums[cat] += p.price
         
-        # Výpočet průměrů
-        for cat in categories:
-            cat_products = [p for p in products if p['category'] == cat]
-            categories[cat]['avg_price'] = round(
-                sum(p['price'] for p in cat_products) / len(cat_products), 2
-            )
+        # Výpočet průměrů z průběžných součtů
+        for cat, info in categories.items():
+            info['avg_price'] = round(price_sums[cat] / info['count'], 2)
         
         return categories
     
     @staticmethod
-    def find_low_stock(products: List[Dict], threshold: int = 10) -> List[Dict]:
+    def find_low_stock(products: List[Product], threshold: int = 10) -> List[Product]:
         """Najde produkty s nízkými zásobami"""
-        return [p for p in products if p['stock'] < threshold]
+        return [p for p in products if p.stock < threshold]
     
     @staticmethod
-    def find_expensive(products: List[Dict], limit: int = 5) -> List[Dict]:
+    def find_expensive(products: List[Product], limit: int = 5) -> List[Product]:
         """Najde nejdražší produkty"""
-        return sorted(products, key=lambda x: x['price'], reverse=True)[:limit]
+        # Částečné řazení haldou - O(n log k) místo řazení celého seznamu
+        return heapq.nlargest(limit, products, key=operator.attrgetter('price'))
 
 
 class LLMSimulator:
@@ -181,15 +415,15 @@ class LLMSimulator:
                 return "Všechny produkty mají dostatek zásob (10+ kusů)."
             response = f"Produkty s nízkými zásobami ({len(low_stock)} ks):\n"
             for p in low_stock[:5]:
-                response += f"- {p['name']}: {p['stock']} ks\n"
+                response += f"- {p.name}: {p.stock} ks\n"
             return response
         
         elif 'nejdražší' in question_lower or 'nejdraž' in question_lower:
             expensive = data.get('expensive', [])
             if expensive:
                 top = expensive[0]
-                return f"Nejdražším produktem je {top['name']} za {top['price']:,.0f} Kč. "\
-                       f"Máme ho {top['stock']} kusů na skladě."
+                return f"Nejdražším produktem je {top.name} za {top.price:,.0f} Kč. "\
+                       f"Máme ho {top.stock} kusů na skladě."
             return "Nenalezeny žádné produkty."
         
         else:
@@ -217,16 +451,18 @@ class AIAgent:
         
         # Krok 1: Získání dat z databáze
         print("📊 Krok 1: Dotazování databáze...")
+        start = time.perf_counter()
         products = self.db_tool.query()
         stats = self.db_tool.get_statistics()
-        print(f"   ✓ Načteno {len(products)} produktů")
+        print(f"   ✓ Načteno {len(products)} produktů ({(time.perf_counter() - start) * 1000:.1f} ms)")
         
         # Krok 2: Výpočty pomocí nástrojů
         print("🔧 Krok 2: Použití výpočetních nástrojů...")
+        start = time.perf_counter()
         category_stats = self.stats_tool.calculate_by_category(products)
         low_stock = self.stats_tool.find_low_stock(products)
         expensive = self.stats_tool.find_expensive(products)
-        print(f"   ✓ Statistiky vypočítány")
+        print(f"   ✓ Statistiky vypočítány ({(time.perf_counter() - start) * 1000:.1f} ms)")
         
         # Krok 3: Příprava dat pro LLM
         print("🧠 Krok 3: Generování odpovědi pomocí LLM...")
@@ -238,8 +474,9 @@ class AIAgent:
         }
         
         # Krok 4: Generování odpovědi
+        start = time.perf_counter()
         response = self.llm.generate_response(question, data, stats)
-        print(f"   ✓ Odpověď vygenerována")
+        print(f"   ✓ Odpověď vygenerována ({(time.perf_counter() - start) * 1000:.1f} ms)")
         
         # Krok 5: Logování
         self.query_log.append({
@@ -7,99 +7,734 @@ Podporuje dva režimy:
 
 import sqlite3
 import json
+import csv
+import io
+import re
+import heapq
+import bisect
+import unicodedata
+import hashlib
+import gzip
+from collections import OrderedDict, deque, namedtuple
+import itertools
+import asyncio
+import random
 from datetime import datetime
 from typing import Dict, List, Any
+from contextlib import contextmanager, ExitStack
+import threading
+import queue
+import time
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import signal
+import selectors
+import socket
+import traceback
 import urllib.parse
+import operator
+import sys
 import os
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # sloupcový katalog pak počítá nad poli z modulu array
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # stránka se pak předkomprimuje jen gzipem
+
+
+class Metrics:
+    """Histogramy časů fází dotazu a čítače - export v textovém formátu Prometheus
+    
+    Měření je jen perf_counter + bisect pod zámkem; METRICS_ENABLED=0 ho vypne úplně.
+    """
+    
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+               0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}  # fáze -> [počty v koších..., +Inf, součet]
+        self._counters = {}    # (název, štítky) -> hodnota
+    
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        idx = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = [0] * (len(self.BUCKETS) + 1) + [0.0]
+            hist[idx] += 1
+            hist[-1] += seconds
+    
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        if not self.enabled:
+            return
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    @staticmethod
+    def _labels(pairs) -> str:
+        return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+    
+    def render(self, gauges: Dict = None) -> str:
+        """Text pro /metrics; gauges - vnořený slovník provozních čítačů"""
+        lines = []
+        with self._lock:
+            histograms = {stage: list(hist) for stage, hist in self._histograms.items()}
+            counters = dict(self._counters)
+        
+        if histograms:
+            lines.append('# HELP agent_stage_duration_seconds Doba fází zpracování dotazu')
+            lines.append('# TYPE agent_stage_duration_seconds histogram')
+            for stage, hist in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS + ('+Inf',), hist[:-1]):
+                    cumulative += count
+                    lines.append(f'agent_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'agent_stage_duration_seconds_sum{{stage="{stage}"}} {hist[-1]:.6f}')
+                lines.append(f'agent_stage_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+        
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{self._labels(labels)} {value}')
+        
+        def walk(prefix: str, node: Dict):
+            for key, value in node.items():
+                name = f'{prefix}_{key}'
+                if isinstance(value, dict):
+                    walk(name, value)
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'# TYPE {name} gauge')
+                    lines.append(f'{name} {value}')
+        walk('agent', gauges or {})
+        
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics(enabled=os.getenv('METRICS_ENABLED', '1') != '0')
+
+
+class ConnectionPool:
+    """Omezený pool SQLite spojení sdílený mezi vlákny
+    
+    S read_only=True se soubor otevírá v režimu mode=ro a s PRAGMA query_only -
+    zápis odmítne už SQLite. cached_statements je velikost cache připravených
+    příkazů každého spojení (klíčem je text SQL).
+    """
+    
+    def __init__(self, db_path: str, max_size: int = 4, timeout: float = 5.0,
+                 cached_statements: int = 128, read_only: bool = False):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.read_only = read_only
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._created = 0
+        
+        # Čítače pro diagnostiku poolu
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Otevře nové spojení s vyladěnými pragmami"""
+        # check_same_thread=False - spojení putuje mezi vlákny, ale vždy ho drží jen jedno
+        if self.read_only:
+            # WAL a synchronous nastavilo zapisovací spojení, režim WAL je uložený v souboru
+            uri = 'file:' + urllib.parse.quote(os.path.abspath(self.db_path)) + '?mode=ro'
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            conn.execute('PRAGMA query_only=1')
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA mmap_size=268435456')
+        conn.execute('PRAGMA cache_size=-16000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Vypůjčí spojení z poolu (případně založí nové nebo počká)"""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+                self.misses += 1
+        
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        # Pool je vyčerpaný - čekáme na vrácení spojení
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Pool SQLite spojení je vyčerpaný (max {self.max_size})")
+        finally:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+        with self._lock:
+            self.hits += 1
+        return conn
+    
+    def release(self, conn: sqlite3.Connection):
+        """Vrátí spojení do poolu"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Context manager: with pool.connection() as conn: ..."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def close(self):
+        """Zavře všechna nevypůjčená spojení"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def stats(self) -> Dict:
+        """Čítače poolu - hit/miss a čekání na volné spojení"""
+        with self._lock:
+            return {
+                'size': self._created,
+                'max_size': self.max_size,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 3)
+            }
+
+
+class Product(tuple):
+    """Řádek tabulky products - n-tice s pojmenovanými sloupci místo slovníku
+    
+    Klíče nejsou v každém řádku znovu, sloupce se čtou atributem (p.price).
+    Kvůli kompatibilitě funguje i p['price'] a to_dict() vrací stejný
+    slovník, jaký dřív vracel DatabaseTool.query().
+    """
+    
+    __slots__ = ()
+    _types = {}  # sloupce -> podtřída s atributy (jedna pro každé schéma)
+    
+    @classmethod
+    def for_columns(cls, columns) -> type:
+        columns = tuple(columns)
+        product_type = cls._types.get(columns)
+        if product_type is None:
+            product_type = type('Product', (namedtuple('Product', columns), cls), {'__slots__': ()})
+            cls._types[columns] = product_type
+        return product_type
+    
+    @classmethod
+    def row_factory(cls, description):
+        """row_factory pro sqlite3 kurzor s daným popisem sloupců"""
+        make = cls.for_columns(desc[0] for desc in description)._make
+        return lambda cursor, row: make(row)
+    
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self._fields else default
+    
+    def to_dict(self) -> Dict:
+        return dict(zip(self._fields, self))
+
+
+class ProductQuery:
+    """Typovaný filtr katalogu - z něj vzniká vždy parametrizovaný SELECT
+
+    Hodnoty filtrů jdou do SQL jen jako parametry (?), sloupec řazení jen
+    z pevného seznamu. Stejná kombinace filtrů dá stejný text dotazu, takže
+    spojení znovu použije připravený příkaz ze své cache.
+
+    Při řazení podle id nebo price se stránkuje kurzorem (after = poslední
+    řádek předchozí stránky) - další stránka je rozsah v indexu, ne OFFSET,
+    který musí předchozí řádky znovu přečíst.
+    """
+
+    ORDER_COLUMNS = ('id', 'name', 'category', 'brand', 'price', 'stock')
+    KEYSET_ORDERS = ('id', 'price')
+    MAX_LIMIT = 1000
+    MAX_INTEGER = 2 ** 63 - 1  # rozsah INTEGER v SQLite - větší číslo nejde navázat
+    # Filtr: (typ hodnoty, podmínka)
+    FILTERS = {
+        'category': (str, 'category = ?'),
+        'brand': (str, 'brand = ?'),
+        'min_price': (float, 'price >= ?'),
+        'max_price': (float, 'price <= ?'),
+        'min_stock': (int, 'stock >= ?'),
+        'max_stock': (int, 'stock <= ?')
+    }
+
+    def __init__(self, order: str = 'id', descending: bool = False, limit: int = 100,
+                 offset: int = 0, after=None, **filters):
+        """limit=None - bez omezení (jen pro export po dávkách, viz DatabaseTool.stream_products)"""
+        unknown = set(filters) - set(self.FILTERS)
+        if unknown:
+            raise ValueError(f"Neznámý filtr: {', '.join(sorted(unknown))}")
+        if order not in self.ORDER_COLUMNS:
+            raise ValueError(f"Řadit lze jen podle: {', '.join(self.ORDER_COLUMNS)}")
+        if limit is not None and not 1 <= limit <= self.MAX_LIMIT:
+            raise ValueError(f"limit musí být 1-{self.MAX_LIMIT}")
+        if offset < 0:
+            raise ValueError("offset nesmí být záporný")
+        if offset > self.MAX_INTEGER:
+            raise ValueError("offset je mimo rozsah")
+
+        self.filters = {}
+        for name, value in filters.items():
+            if value is None:
+                continue
+            kind = self.FILTERS[name][0]
+            try:
+                self.filters[name] = kind(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name}: očekáváno {'číslo' if kind is not str else 'text'}")
+            if kind is int and abs(self.filters[name]) > self.MAX_INTEGER:
+                raise ValueError(f"{name}: číslo je mimo rozsah")
+        self.order = order
+        self.descending = bool(descending)
+        self.limit = None if limit is None else int(limit)
+        self.offset = int(offset)
+        self.after = None if after is None else self._parse_after(after)
+
+    def _parse_after(self, after) -> tuple:
+        """Kurzor 'id' nebo 'cena,id' (podle řazení) jako n-tice hodnot"""
+        if self.order not in self.KEYSET_ORDERS:
+            raise ValueError(f"after jde použít jen při řazení podle: {', '.join(self.KEYSET_ORDERS)}")
+        if self.offset:
+            raise ValueError("after a offset nelze kombinovat")
+        parts = after.split(',') if isinstance(after, str) else list(after)
+        try:
+            if self.order == 'id' and len(parts) == 1:
+                cursor = (int(parts[0]),)
+            elif self.order == 'price' and len(parts) == 2:
+                cursor = (float(parts[0]), int(parts[1]))
+            else:
+                cursor = None
+            if cursor is not None and abs(cursor[-1]) <= self.MAX_INTEGER:
+                return cursor
+        except ValueError:
+            pass
+        raise ValueError("after: očekáváno 'id'" if self.order == 'id' else "after: očekáváno 'cena,id'")
+
+    @classmethod
+    def from_params(cls, params: Dict, unbounded: bool = False) -> 'ProductQuery':
+        """Z parametrů požadavku (hodnoty jako řetězce): category, brand,
+        min_price, max_price, min_stock, max_stock, order, direction (asc/desc),
+        limit, offset, after. S unbounded=True je limit volitelný (export).
+        Chybný vstup vyvolá ValueError."""
+        params = {k: v for k, v in params.items() if v not in (None, '')}
+        direction = str(params.pop('direction', 'asc')).lower()
+        if direction not in ('asc', 'desc'):
+            raise ValueError("direction musí být asc nebo desc")
+        try:
+            limit = params.pop('limit', None if unbounded else 100)
+            limit = None if limit is None else int(limit)
+            offset = int(params.pop('offset', 0))
+        except ValueError:
+            raise ValueError("limit a offset musí být celá čísla")
+        return cls(order=params.pop('order', 'id'), descending=direction == 'desc',
+                   limit=limit, offset=offset, **params)
+
+    def to_sql(self) -> tuple:
+        """(sql, parametry) - podmínky v pevném pořadí FILTERS, id dorovnává řazení
+        
+        Bez limitu se posílá LIMIT -1, text dotazu (a připravený příkaz) je stejný.
+        """
+        where = [self.FILTERS[name][1] for name in self.FILTERS if name in self.filters]
+        params = [self.filters[name] for name in self.FILTERS if name in self.filters]
+        if self.after is not None:
+            if self.order == 'id':
+                where.append('id < ?' if self.descending else 'id > ?')
+                params.append(self.after[0])
+            else:
+                # (price, id) za kurzorem; shody v ceně vždy podle id vzestupně.
+                # První podmínka je rozsah v indexu, druhá dořeší řádky se stejnou cenou
+                price, last_id = self.after
+                where.append('price <= ? AND (price < ? OR id > ?)' if self.descending
+                             else 'price >= ? AND (price > ? OR id > ?)')
+                params.extend((price, price, last_id))
+        sql = 'SELECT * FROM products'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        direction = 'DESC' if self.descending else 'ASC'
+        sql += f' ORDER BY {self.order} {direction}'
+        if self.order != 'id':
+            sql += ', id'
+        limit = -1 if self.limit is None else self.limit
+        return sql + ' LIMIT ? OFFSET ?', tuple(params) + (limit, self.offset)
+
+    def cursor(self, product) -> str:
+        """Hodnota after pro stránku za daným řádkem (None bez kurzorového řazení)"""
+        if self.order == 'id':
+            return str(product['id'])
+        if self.order == 'price':
+            return f"{product['price']!r},{product['id']}"
+        return None
+
+    def to_dict(self) -> Dict:
+        result = {
+            **self.filters,
+            'order': self.order,
+            'direction': 'desc' if self.descending else 'asc',
+            'limit': self.limit,
+            'offset': self.offset
+        }
+        if self.after is not None:
+            result['after'] = ','.join(repr(v) if isinstance(v, float) else str(v) for v in self.after)
+        return result
 
 
 class DatabaseTool:
     """Nástroj pro práci s databází"""
     
-    def __init__(self, db_path: str = "./data/products.db"):
+    # Sloupce fulltextového indexu a jejich váhy pro bm25 (název je nejdůležitější)
+    SEARCH_COLUMNS = ('name', 'brand', 'category', 'description')
+    SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+    # Nad tolik shod se neřadí podle BM25, ale podle id (viz search_products)
+    SEARCH_RANK_LIMIT = 5000
+    # Výplňová slova otázek (bez diakritiky) - do hledání se nepřidávají
+    SEARCH_STOPWORDS = frozenset('''
+        a i o k s v z u na do od po pro za ze se ve ke je jsou ma mame mate maji nebo ani
+        co kde jak jake jaky jaka jakou ktere ktery ktera kterou nejake nejaky neco
+        vsechny vsechno nam mi me prosim chci bych by jsme mit tam tady
+        produkt produkty produktu produktech zbozi najdi najit hledam hledej vyhledej ukaz
+        znacka znacky znacce znackou typ typu
+    '''.split())
+    
+    def __init__(self, db_path: str = "./data/products.db", pool_size: int = 4,
+                 statement_cache: int = 256, read_only: bool = False):
         self.db_path = db_path
+        self.fts = False  # je k dispozici FTS5 index products_fts
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        if read_only:
+            # Databázi připravil jiný proces (supervisor v režimu více procesů),
+            # tady se jen čte - jeden pool spojení jen pro čtení, bez inicializace
+            self.pool = self.read_pool = ConnectionPool(
+                db_path, max_size=pool_size, cached_statements=statement_cache, read_only=True)
+            with self.pool.connection() as conn:
+                self.fts = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'"
+                ).fetchone() is not None
+            return
+        self.pool = ConnectionPool(db_path, max_size=pool_size)
         self._init_database()
+        # Dotazy z API (ProductQuery, vlastní SQL) jen pro čtení; cache pokryje
+        # běžné kombinace filtrů a řazení ProductQuery
+        self.read_pool = ConnectionPool(db_path, max_size=pool_size,
+                                        cached_statements=statement_cache, read_only=True)
     
     def _init_database(self):
-        """Inicializace databáze z SQL souboru"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Zkontrolovat jestli už existují data
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='products'
-        """)
-        table_exists = cursor.fetchone()
-        
-        if table_exists:
-            cursor.execute('SELECT COUNT(*) FROM products')
-            has_data = cursor.fetchone()[0] > 0
-        else:
-            has_data = False
-        
-        # Pokud databáze neexistuje nebo je prázdná, načíst SQL soubor
-        if not has_data:
-            sql_file = 'init_database.sql'
-            if os.path.exists(sql_file):
-                print(f"📥 Načítám databázi z {sql_file}...")
-                with open(sql_file, 'r', encoding='utf-8') as f:
-                    sql_script = f.read()
-                    cursor.executescript(sql_script)
-                print(f"✅ Databáze inicializována")
+        """Inicializace databáze - prázdný katalog se naplní hromadným importem
+        
+        Zdroj je INIT_DATA_PATH (výchozí init_database.sql), může to být i CSV nebo JSONL.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+        
+            # Zkontrolovat jestli už existují data
+            cursor.execute("""
+                SELECT name FROM sqlite_master 
+                WHERE type='table' AND name='products'
+            """)
+            table_exists = cursor.fetchone()
+        
+            if table_exists:
+                cursor.execute('SELECT 1 FROM products LIMIT 1')
+                has_data = cursor.fetchone() is not None
             else:
-                print(f"⚠️  Soubor {sql_file} nenalezen, používám základní data")
-                # Fallback - základní struktura
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS products (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT NOT NULL,
-                        category TEXT NOT NULL,
-                        price REAL NOT NULL,
-                        stock INTEGER NOT NULL,
-                        description TEXT,
-                        brand TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                has_data = False
+        
+            # Pokud databáze neexistuje nebo je prázdná, načíst datový soubor
+            if not has_data:
+                data_file = os.getenv('INIT_DATA_PATH', 'init_database.sql')
+                if os.path.exists(data_file):
+                    print(f"📥 Načítám databázi z {data_file}...")
+                    result = BulkImporter(self).import_file(conn, data_file)
+                    print(f"✅ Databáze inicializována: {result['rows']:,} produktů za {result['seconds']} s "
+                          f"({result['rows_per_second']:,} řádků/s, indexy {result['index_seconds']} s)")
+                else:
+                    print(f"⚠️  Soubor {data_file} nenalezen, používám základní data")
+                    # Fallback - základní struktura
+                    cursor.execute(BulkImporter.SCHEMA)
+            
+            self._create_indexes(cursor)
+            self._install_change_tracking(cursor)
+            self.fts = self._install_search_index(cursor)
+            conn.commit()
+    
+    def bulk_import(self, path: str, fmt: str = None, chunk_size: int = 50000) -> Dict:
+        """Přidá produkty ze SQL/CSV/JSONL souboru (viz BulkImporter)"""
+        with self.pool.connection() as conn:
+            return BulkImporter(self, chunk_size=chunk_size).import_file(conn, path, fmt)
+    
+    def _create_indexes(self, cursor: sqlite3.Cursor):
+        """Indexy pro top-K a prahové dotazy (cena, zásoby, kategorie + cena)
+        a pro stránkování kategorie podle id (index obsahuje i rowid)"""
+        # price DESC - shody v ceně pak vycházejí podle id jako u stabilního řazení
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_price ON products(price DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_stock ON products(stock)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_category_price ON products(category, price DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)')
+    
+    def _install_change_tracking(self, cursor: sqlite3.Cursor):
+        """Počítadlo změn katalogu udržované triggery (pro invalidaci cache)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        # Počáteční verze = čas založení v ms, aby nově vytvořená databáze
+        # nezačínala od nuly a nesdílela klíče s trvalou cache odpovědí
+        cursor.execute('''
+            INSERT OR IGNORE INTO catalog_version (id, version)
+            VALUES (1, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))
+        ''')
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS products_version_{event.lower()}
+                AFTER {event} ON products
+                BEGIN
+                    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                END
+            ''')
+    
+    def _install_search_index(self, cursor: sqlite3.Cursor, rebuild: bool = False) -> bool:
+        """Fulltextový index FTS5 nad názvem, značkou, kategorií a popisem
+        
+        Tokenizer unicode61 s remove_diacritics 2 - 'cokolada' najde 'čokoláda'.
+        Obsah drží tabulka products (external content), index udržují triggery.
+        Vrací False, když SQLite nemá FTS5 - vyhledávání pak prochází tabulku.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'")
+        exists = cursor.fetchone() is not None
+        columns = ', '.join(self.SEARCH_COLUMNS)
+        new_columns = ', '.join(f'new.{c}' for c in self.SEARCH_COLUMNS)
+        old_columns = ', '.join(f'old.{c}' for c in self.SEARCH_COLUMNS)
+        if not exists:
+            try:
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE products_fts USING fts5(
+                        {columns},
+                        content='products', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
                     )
                 ''')
+            except sqlite3.OperationalError as e:
+                print(f"⚠️  FTS5 není k dispozici ({e}), vyhledávání prochází tabulku")
+                return False
         
-        conn.commit()
-        conn.close()
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products
+            BEGIN
+                INSERT INTO products_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products
+            BEGIN
+                INSERT INTO products_fts (products_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+            END
+        ''')
+        # Změna zásob nebo ceny index nemění - trigger jen pro indexované sloupce
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF {columns} ON products
+            BEGIN
+                INSERT INTO products_fts (products_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+                INSERT INTO products_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+            END
+        ''')
+        
+        if rebuild or not exists:
+            # Existující řádky (starší databáze, hromadný import bez triggerů)
+            cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+        return True
     
-    def query(self, sql: str = None) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @classmethod
+    def search_terms(cls, text: str) -> List[str]:
+        """Hledaná slova bez diakritiky a výplňových slov; delší slova zkrácená na kmen
         
-        if sql is None:
-            cursor.execute('SELECT * FROM products')
-        else:
-            cursor.execute(sql)
+        Kmen se hledá jako prefix - 'notebooky' najde 'notebook', 'sluchátek' 'sluchátka'.
+        Krátká slova (4K, TV) se hledají přesně a vrací se bez hvězdičky.
+        """
+        terms = []
+        for word in re.findall(r'\w+', IntentMatcher.normalize(text)):
+            if word in cls.SEARCH_STOPWORDS:
+                continue
+            term = word if len(word) < 4 else word[:max(4, len(word) - 2)] + '*'
+            if term not in terms:
+                terms.append(term)
+        return terms
+    
+    def search_products(self, text: str, limit: int = 10, any_term: bool = False) -> List[Product]:
+        """Fulltextové vyhledávání produktů seřazené podle relevance (BM25)
         
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        Nejdřív musí sedět všechna slova; s any_term=True se při prázdném
+        výsledku zkusí i kterékoli z nich. Nad SEARCH_RANK_LIMIT shod se
+        vrací prvních limit produktů podle id.
+        """
+        terms = self.search_terms(text)
+        if not terms:
+            return []
+        if not self.fts:
+            return self._scan_products(terms, limit, any_term)
         
-        conn.close()
-        return results
+        patterns = [f'"{term[:-1]}"*' if term.endswith('*') else f'"{term}"' for term in terms]
+        queries = [' AND '.join(patterns)]
+        if any_term and len(terms) > 1:
+            queries.append(' OR '.join(patterns))
+        
+        with self.pool.connection() as conn:
+            for match in queries:
+                # Shody v pořadí rowid - FTS5 skončí po limitu, bez čtení celého seznamu
+                ids = [row[0] for row in conn.execute(
+                    'SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY rowid LIMIT ?',
+                    (match, self.SEARCH_RANK_LIMIT + 1)
+                )]
+                if ids:
+                    break
+        if not ids:
+            return []
+        
+        if len(ids) > self.SEARCH_RANK_LIMIT:
+            # Velmi častý výraz (značka, "Max") - BM25 by musel ohodnotit všechny
+            # shody a skóre se stejně liší jen délkou textu; stačí prvních pár podle id
+            ids = ids[:limit]
+            return self._fetch_products(
+                f'SELECT * FROM products WHERE id IN ({", ".join("?" * len(ids))}) ORDER BY id', tuple(ids))
+        
+        # Pořadí podle BM25 jen nad FTS tabulkou, řádky products se čtou až pro výsledek
+        weights = ', '.join(str(w) for w in self.SEARCH_WEIGHTS)
+        return self._fetch_products(f'''
+            SELECT products.* FROM (
+                SELECT rowid, bm25(products_fts, {weights}) AS score FROM products_fts
+                WHERE products_fts MATCH ? ORDER BY score, rowid LIMIT ?
+            ) AS hits
+            JOIN products ON products.id = hits.rowid
+            ORDER BY hits.score, hits.rowid
+        ''', (match, limit))
     
-    def get_statistics(self) -> Dict:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _scan_products(self, terms: List[str], limit: int, any_term: bool) -> List[Product]:
+        """Náhrada bez FTS5 - průchod tabulkou (bez řazení podle relevance)"""
+        matches = [[], []]  # všechna slova, kterékoli slovo
+        with self.pool.connection() as conn:
+            cursor = conn.execute('SELECT * FROM products ORDER BY id')
+            cursor.row_factory = Product.row_factory(cursor.description)
+            for product in cursor:
+                text = IntentMatcher.normalize(' '.join(
+                    str(product[c] or '') for c in self.SEARCH_COLUMNS))
+                found = [re.search(r'\b' + term.rstrip('*') + ('' if term.endswith('*') else r'\b'), text) is not None
+                         for term in terms]
+                if all(found):
+                    matches[0].append(product)
+                    if len(matches[0]) >= limit:
+                        break
+                elif any_term and any(found) and len(matches[1]) < limit:
+                    matches[1].append(product)
+        return matches[0] or matches[1]
+    
+    def data_version(self) -> int:
+        """Aktuální verze dat katalogu - mění se s každou změnou tabulky products"""
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()[0]
+    
+    def query(self, sql: str = None, params: tuple = ()) -> List[Product]:
+        """Celý katalog jako Product n-tice, vlastní SQL jako slovníky
         
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as count,
-                AVG(price) as avg_price,
-                MIN(price) as min_price,
-                MAX(price) as max_price,
-                SUM(stock) as total_stock,
-                SUM(price * stock) as total_value
-            FROM products
-        ''')
+        Vlastní SQL běží na spojení jen pro čtení - hodnoty patří do params,
+        ne do textu dotazu (viz ProductQuery).
+        """
+        with self.read_pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            if sql is None:
+                cursor.execute('SELECT * FROM products')
+                cursor.row_factory = Product.row_factory(cursor.description)
+                return cursor.fetchall()
+            
+            cursor.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description]
+            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
         
-        stats = cursor.fetchone()
-        conn.close()
+        return results
+    
+    def get_statistics(self) -> Dict:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT 
+                    COUNT(*) as count,
+                    AVG(price) as avg_price,
+                    MIN(price) as min_price,
+                    MAX(price) as max_price,
+                    SUM(stock) as total_stock,
+                    SUM(price * stock) as total_value
+                FROM products
+            ''')
+            
+            stats = cursor.fetchone()
         
         return {
             'total_products': stats[0],
@@ -109,61 +744,1168 @@ class DatabaseTool:
             'total_stock': stats[4],
             'total_value': round(stats[5], 2) if stats[5] else 0
         }
+    
+    def get_category_statistics(self) -> Dict:
+        """Statistiky podle kategorií spočítané v SQL (GROUP BY)
+        
+        Vrací stejný tvar jako StatisticsTool.calculate_by_category.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT category, COUNT(*), SUM(price * stock), AVG(price), MIN(id) AS first_id
+                FROM products
+                GROUP BY category
+                ORDER BY first_id
+            ''')
+            categories = {
+                cat: {
+                    'count': count,
+                    'total_value': total_value,
+                    'avg_price': round(avg_price, 2),
+                    'products': []
+                }
+                for cat, count, total_value, avg_price, _ in cursor.fetchall()
+            }
+            
+            # Názvy produktů v pořadí podle id - bez stavby slovníků pro řádky
+            cursor.execute('SELECT category, name FROM products ORDER BY id')
+            for cat, name in cursor:
+                categories[cat]['products'].append(name)
+        
+        return categories
+    
+    def _fetch_products(self, sql: str, params: tuple = (), pool: ConnectionPool = None) -> List[Product]:
+        with (pool or self.pool).connection() as conn:
+            cursor = conn.execute(sql, params)
+            cursor.row_factory = Product.row_factory(cursor.description)
+            return cursor.fetchall()
+    
+    def find_products(self, query: ProductQuery) -> List[Product]:
+        """Produkty podle filtru ProductQuery - parametrizovaně, jen pro čtení"""
+        sql, params = query.to_sql()
+        return self._fetch_products(sql, params, pool=self.read_pool)
+    
+    @contextmanager
+    def stream_products(self, query: ProductQuery, batch_size: int = 1000):
+        """Výsledek ProductQuery po dávkách přímo z kurzoru (fetchmany)
+        
+        with db.stream_products(q) as (columns, batches): ... - v paměti je
+        vždy jen jedna dávka n-tic, ať má katalog 150 nebo 10 milionů řádků.
+        Spojení z poolu jen pro čtení je vypůjčené, dokud blok neskončí -
+        počet souběžných exportů omezuje AgentHTTPHandler.max_exports.
+        """
+        sql, params = query.to_sql()
+        with self.read_pool.connection() as conn:
+            cursor = conn.execute(sql, params)
+            
+            def batches():
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+            
+            try:
+                yield [desc[0] for desc in cursor.description], batches()
+            finally:
+                cursor.close()
+    
+    def find_low_stock(self, threshold: int = 10) -> List[Product]:
+        """Produkty se zásobou pod prahem - přes index na stock"""
+        # Bez ORDER BY id v SQL, jinak planner zvolí průchod celou tabulkou
+        rows = self._fetch_products('SELECT * FROM products WHERE stock < ?', (threshold,))
+        rows.sort(key=operator.attrgetter('id'))
+        return rows
+    
+    def find_expensive(self, limit: int = 5, category: str = None) -> List[Product]:
+        """Top-K nejdražších produktů - přes index na price (category, price)"""
+        if category is None:
+            return self._fetch_products(
+                'SELECT * FROM products ORDER BY price DESC, id LIMIT ?',
+                (limit,)
+            )
+        return self._fetch_products(
+            'SELECT * FROM products WHERE category = ? ORDER BY price DESC, id LIMIT ?',
+            (category, limit)
+        )
+    
+    def pool_stats(self) -> Dict:
+        """Vrátí čítače poolu spojení (read_only = pool pro dotazy z API)"""
+        if self.read_pool is self.pool:
+            return {**self.pool.stats(), 'read_only': True}
+        return {**self.pool.stats(), 'read_only': self.read_pool.stats()}
+    
+    def close(self):
+        """Uzavře spojení v obou poolech"""
+        self.pool.close()
+        if self.read_pool is not self.pool:
+            self.read_pool.close()
+
+
+class BulkImporter:
+    """Hromadný import produktů ze SQL, CSV nebo JSONL souboru
+    
+    Soubor se čte po blocích a řádky se vkládají po dávkách přes executemany
+    v jedné transakci, takže paměť nezávisí na velikosti souboru. Indexy
+    a triggery změn se zakládají až po načtení dat.
+    """
+    
+    COLUMNS = ('id', 'name', 'category', 'price', 'stock', 'description', 'brand')
+    CONVERTERS = {'id': int, 'price': float, 'stock': int}
+    FORMATS = {'.sql': 'sql', '.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+    VALUES_PER_STATEMENT = 500
+    
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            stock INTEGER NOT NULL,
+            description TEXT,
+            brand TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+    
+    # Víceřádkový INSERT do products se čte po jednotlivých n-ticích
+    INSERT_RE = re.compile(
+        r'INSERT\s+(?:OR\s+(\w+)\s+)?INTO\s+["`\[]?products["`\]]?\s*\(([^)]*)\)\s*VALUES\s*',
+        re.IGNORECASE
+    )
+    TUPLE_RE = re.compile(r"\s*(\((?:[^'()]++|'(?:[^']++|'')*+')*+\))\s*([,;])")
+    SKIP_RE = re.compile(r'(?:\s+|--[^\n]*(?:\n|\Z)|/\*.*?\*/)*', re.DOTALL)
+    # Před koncem souboru jen celé komentáře - useknutý na konci bufferu se dočte
+    SKIP_OPEN_RE = re.compile(r'(?:\s+|--[^\n]*\n|/\*.*?\*/)*', re.DOTALL)
+    
+    def __init__(self, db_tool: 'DatabaseTool', chunk_size: int = 50000, block_size: int = 1 << 20):
+        self.db_tool = db_tool
+        self.chunk_size = chunk_size
+        self.block_size = block_size
+    
+    @classmethod
+    def detect_format(cls, path: str) -> str:
+        fmt = cls.FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise ValueError(f"Neznámý formát souboru {path} (podporováno: .sql, .csv, .jsonl)")
+        return fmt
+    
+    @classmethod
+    def _insert_sql(cls, columns: List[str], conflict: str = None, values: bool = True) -> str:
+        """INSERT s parametry (values=False - jen začátek příkazu končící VALUES)"""
+        unknown = [c for c in columns if c not in cls.COLUMNS + ('created_at',)]
+        if unknown:
+            raise ValueError(f"Neznámé sloupce: {', '.join(unknown)}")
+        verb = f"INSERT OR {conflict.upper()}" if conflict else "INSERT"
+        sql = f"{verb} INTO products ({', '.join(columns)}) VALUES "
+        return sql + f"({', '.join('?' * len(columns))})" if values else sql
+    
+    def read_sql(self, path: str):
+        """Prochází SQL dump - vrací ('values', insert, počet řádků) nebo ('sql', příkaz)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            buf, pos, eof = '', 0, False
+            insert, tuples = None, []
+            
+            while True:
+                # Vždy mít v bufferu rezervu, aby se hlavička ani n-tice neutnula
+                if not eof and len(buf) - pos < self.block_size // 4:
+                    chunk = f.read(self.block_size)
+                    eof = not chunk
+                    buf, pos = buf[pos:] + chunk, 0
+                
+                if insert is not None:
+                    m = self.TUPLE_RE.match(buf, pos)
+                    if m is None:
+                        if eof:
+                            raise ValueError(f"{path}: nepodporovaný zápis hodnot u '{buf[pos:pos + 60].strip()}'")
+                        buf, pos = buf[pos:] + f.read(self.block_size), 0
+                        continue
+                    # Hodnoty parsuje SQLite - n-tice se jen spojí do INSERT po VALUES_PER_STATEMENT
+                    tuples.append(m.group(1))
+                    pos = m.end()
+                    if m.group(2) == ';' or len(tuples) >= self.VALUES_PER_STATEMENT:
+                        yield 'values', insert + ', '.join(tuples), len(tuples)
+                        tuples = []
+                        if m.group(2) == ';':
+                            insert = None
+                    continue
+                
+                pos = (self.SKIP_RE if eof else self.SKIP_OPEN_RE).match(buf, pos).end()
+                if pos >= len(buf):
+                    if eof:
+                        return
+                    continue
+                if not eof and buf.startswith(('--', '/*'), pos):
+                    buf, pos = buf[pos:] + f.read(self.block_size), 0
+                    continue
+                
+                m = self.INSERT_RE.match(buf, pos)
+                if m:
+                    columns = [c.strip().strip('"`[]') for c in m.group(2).split(',')]
+                    insert = self._insert_sql(columns, m.group(1), values=False)
+                    pos = m.end()
+                    continue
+                
+                # Ostatní příkazy celé - konec hledá sqlite3.complete_statement (triggery mají ; uvnitř)
+                end = buf.find(';', pos)
+                while end != -1 and not sqlite3.complete_statement(buf[pos:end + 1]):
+                    end = buf.find(';', end + 1)
+                if end == -1:
+                    if eof:
+                        raise ValueError(f"{path}: neukončený příkaz '{buf[pos:pos + 60].strip()}'")
+                    buf, pos = buf[pos:] + f.read(self.block_size), 0
+                    continue
+                yield 'sql', buf[pos:end + 1]
+                pos = end + 1
+    
+    def _read_records(self, path: str, columns: List[str], records):
+        """Dávky z již rozparsovaných záznamů (CSV/JSONL) ve stejném pořadí sloupců
+        
+        Záznam s jiným počtem hodnot nebo s nečíselnou hodnotou v číselném
+        sloupci import zastaví (ValueError s pořadím záznamu), nepřeskočí se.
+        """
+        insert = self._insert_sql(columns)
+        converters = [(i, self.CONVERTERS[c]) for i, c in enumerate(columns) if c in self.CONVERTERS]
+        rows = []
+        for number, row in enumerate(records, 1):
+            if len(row) != len(columns):
+                raise ValueError(f"{path}: záznam {number} má {len(row)} hodnot, očekáváno {len(columns)}")
+            for i, convert in converters:
+                value = row[i]
+                if value is not None:
+                    try:
+                        row[i] = convert(value) if value != '' else None
+                    except (TypeError, ValueError):
+                        raise ValueError(f"{path}: záznam {number}: {columns[i]} = {value!r} není číslo") from None
+            rows.append(row)
+            if len(rows) >= self.chunk_size:
+                yield 'rows', insert, rows
+                rows = []
+        if rows:
+            yield 'rows', insert, rows
+    
+    def read_csv(self, path: str):
+        """CSV s hlavičkou - názvy sloupců jako v tabulce products"""
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            columns = [c.strip() for c in next(reader)]
+            records = ([value if value != '' else None for value in row] for row in reader if row)
+            yield from self._read_records(path, columns, records)
+    
+    def read_jsonl(self, path: str):
+        """JSON objekt na řádek - chybějící klíče jsou NULL (id se pak přidělí samo)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            columns = list(self.COLUMNS)
+            yield from self._read_records(path, columns, self._json_records(path, f, columns))
+    
+    @staticmethod
+    def _json_records(path: str, lines, columns: List[str]):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}: řádek {number}: neplatný JSON ({e})") from None
+            if not isinstance(obj, dict):
+                raise ValueError(f"{path}: řádek {number}: očekáván JSON objekt")
+            yield [obj.get(c) for c in columns]
+    
+    def import_file(self, conn: sqlite3.Connection, path: str, fmt: str = None) -> Dict:
+        """Načte soubor v jedné transakci a vrátí počty a rychlost"""
+        fmt = fmt or self.detect_format(path)
+        reader = {'sql': self.read_sql, 'csv': self.read_csv, 'jsonl': self.read_jsonl}[fmt]
+        
+        # Po dobu importu bez fsync a s větší cache stránek
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('PRAGMA cache_size=-65536')
+        start = time.perf_counter()
+        rows = 0
+        deferred = []
+        try:
+            conn.execute('BEGIN')
+            if fmt != 'sql':
+                conn.execute(self.SCHEMA)
+            # Indexy a triggery změn by zpomalovaly každý vložený řádek
+            for name in ('idx_products_price', 'idx_products_stock', 'idx_products_category_price',
+                         'idx_products_category'):
+                conn.execute(f'DROP INDEX IF EXISTS {name}')
+            for event in ('insert', 'update', 'delete'):
+                conn.execute(f'DROP TRIGGER IF EXISTS products_version_{event}')
+                conn.execute(f'DROP TRIGGER IF EXISTS products_fts_{event}')
+            
+            for item in reader(path):
+                if item[0] == 'rows':
+                    conn.executemany(item[1], item[2])
+                    rows += len(item[2])
+                elif item[0] == 'values':
+                    conn.execute(item[1])
+                    rows += item[2]
+                elif re.match(r'\s*CREATE\s+(UNIQUE\s+)?INDEX', item[1], re.IGNORECASE):
+                    deferred.append(item[1])
+                else:
+                    conn.execute(item[1])
+            load_seconds = time.perf_counter() - start
+            
+            cursor = conn.cursor()
+            for statement in deferred:
+                cursor.execute(statement)
+            self.db_tool._create_indexes(cursor)
+            self.db_tool._install_change_tracking(cursor)
+            # Fulltextový index se postaví znovu najednou - rychlejší než po řádcích
+            self.db_tool.fts = self.db_tool._install_search_index(cursor, rebuild=True)
+            # Triggery při importu neběžely - verzi dat posunout jednou za celý import
+            cursor.execute('UPDATE catalog_version SET version = version + 1 WHERE id = 1')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA cache_size=-16000')
+        
+        seconds = time.perf_counter() - start
+        return {
+            'path': path,
+            'format': fmt,
+            'rows': rows,
+            'seconds': round(seconds, 3),
+            'load_seconds': round(load_seconds, 3),
+            'index_seconds': round(seconds - load_seconds, 3),
+            'rows_per_second': round(rows / load_seconds) if load_seconds else 0
+        }
 
 
 class StatisticsTool:
     """Nástroj pro výpočty"""
     
     @staticmethod
-    def calculate_by_category(products: List[Dict]) -> Dict:
+    def calculate_by_category(products: List[Product]) -> Dict:
+        # Jeden průchod - průměry z průběžných součtů, ne přefiltrováním seznamu
         categories = {}
+        price_sums = {}
+        
         for p in products:
-            cat = p['category']
-            if cat not in categories:
-                categories[cat] = {
+            cat = p.category
+            info = categories.get(cat)
+            if info is None:
+                info = categories[cat] = {
                     'count': 0,
                     'total_value': 0,
                     'avg_price': 0,
                     'products': []
                 }
-            categories[cat]['count'] += 1
-            categories[cat]['total_value'] += p['price'] * p['stock']
-            categories[cat]['products'].append(p['name'])
-        
-        for cat in categories:
-            cat_products = [p for p in products if p['category'] == cat]
-            categories[cat]['avg_price'] = round(
-                sum(p['price'] for p in cat_products) / len(cat_products), 2
-            )
+                price_sums[cat] = 0
+            
+            info['count'] += 1
+            info['total_value'] += p.price * p.stock
+            info['products'].append(p.name)
+            price_sums[cat] += p.price
+        
+        for cat, info in categories.items():
+            info['avg_price'] = round(price_sums[cat] / info['count'], 2)
         
         return categories
     
     @staticmethod
-    def find_low_stock(products: List[Dict], threshold: int = 10) -> List[Dict]:
-        return [p for p in products if p['stock'] < threshold]
+    def find_low_stock(products: List[Product], threshold: int = 10) -> List[Product]:
+        return [p for p in products if p.stock < threshold]
     
     @staticmethod
-    def find_expensive(products: List[Dict], limit: int = 5) -> List[Dict]:
-        return sorted(products, key=lambda x: x['price'], reverse=True)[:limit]
+    def find_expensive(products: List[Product], limit: int = 5) -> List[Product]:
+        # Částečné řazení haldou - O(n log k) místo řazení celého seznamu
+        return heapq.nlargest(limit, products, key=operator.attrgetter('price'))
+
+
+class ColumnarCatalog:
+    """Katalog uložený po sloupcích - ceny a zásoby v polích, kategorie a značky jako kódy
+    
+    Načte se jednou pro verzi dat. S NumPy jsou agregace vektorové, bez ní se
+    počítá nad poli z modulu array. Sčítá se ve stejném pořadí jako
+    StatisticsTool a SQLite, takže výsledky jsou shodné do posledního bitu.
+    """
+    
+    ENCODED = ('category', 'brand')
+    
+    def __init__(self, columns: List[str], values: Dict[str, list], use_numpy: bool = None):
+        self.columns = columns
+        self.use_numpy = np is not None if use_numpy is None else use_numpy and np is not None
+        self.size = len(values['id'])
+        
+        # Hodnoty float/int se musí vrátit ve stejném typu jako z databáze
+        if not all(type(v) is float for v in values['price']):
+            raise ValueError("Sloupec price neobsahuje jen REAL hodnoty")
+        if not all(type(v) is int for v in values['stock']):
+            raise ValueError("Sloupec stock neobsahuje jen INTEGER hodnoty")
+        
+        self.price = array('d', values['price'])
+        self.stock = array('q', values['stock'])
+        self.ids = array('q', values['id'])
+        
+        # Slovníkové kódování - kódy podle prvního výskytu (= pořadí kategorií ve výsledku)
+        self.dictionaries = {}
+        self.codes = {}
+        for column in self.ENCODED:
+            if column not in values:
+                continue
+            lookup = {}
+            self.codes[column] = array('i', [lookup.setdefault(v, len(lookup)) for v in values[column]])
+            self.dictionaries[column] = list(lookup)
+        
+        # Ostatní sloupce (name, description, created_at) zůstávají jako seznamy
+        self.other = {c: values[c] for c in columns
+                      if c not in ('id', 'price', 'stock') and c not in self.codes}
+        
+        self.numeric = {'id': self.ids, 'price': self.price, 'stock': self.stock}
+        if self.use_numpy:
+            # Pohledy NumPy nad stejnou pamětí polí, bez kopie
+            self._ids = np.frombuffer(self.ids, dtype=np.int64)
+            self._price = np.frombuffer(self.price, dtype=np.float64)
+            self._stock = np.frombuffer(self.stock, dtype=np.int64)
+            self._category = np.frombuffer(self.codes['category'], dtype=np.int32)
+            self.numeric = {'id': self._ids, 'price': self._price, 'stock': self._stock}
+    
+    @classmethod
+    def load(cls, db_tool: DatabaseTool, use_numpy: bool = None, chunk_size: int = 10000) -> 'ColumnarCatalog':
+        """Načte tabulku products po dávkách rovnou do sloupců (bez slovníků pro řádky)"""
+        with db_tool.pool.connection() as conn:
+            cursor = conn.execute('SELECT * FROM products')
+            columns = [desc[0] for desc in cursor.description]
+            values = {c: [] for c in columns}
+            lists = [values[c] for c in columns]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for target, column in zip(lists, zip(*rows)):
+                    target.extend(column)
+        return cls(columns, values, use_numpy)
+    
+    def _take(self, column: str, indexes: List[int]) -> list:
+        """Hodnoty jednoho sloupce pro vybrané řádky"""
+        if column in self.codes:
+            dictionary, codes = self.dictionaries[column], self.codes[column]
+            return [dictionary[codes[i]] for i in indexes]
+        if column in self.numeric and self.use_numpy:
+            # tolist vrací Python int/float - stejné typy jako z databáze
+            return self.numeric[column][indexes].tolist()
+        values = self.numeric[column] if column in self.numeric else self.other[column]
+        return [values[i] for i in indexes]
+    
+    def rows(self, indexes: List[int]) -> List[Product]:
+        """Vybrané řádky jako Product - stejný tvar jako DatabaseTool.query()"""
+        columns = [self._take(c, indexes) for c in self.columns]
+        return list(map(Product.for_columns(self.columns)._make, zip(*columns)))
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    @staticmethod
+    def _sequential_sum(values) -> float:
+        """Součet zleva doprava jako v SQLite i ve smyčce StatisticsTool"""
+        total = 0.0
+        for value in values:
+            total += value
+        return total
+    
+    def get_statistics(self) -> Dict:
+        """Stejné agregace jako DatabaseTool.get_statistics"""
+        if not self.size:
+            return {'total_products': 0, 'avg_price': 0, 'min_price': None,
+                    'max_price': None, 'total_stock': None, 'total_value': 0}
+        
+        if self.use_numpy:
+            # cumsum sčítá postupně (np.sum by sčítal po párech a lišil se v posledních bitech)
+            price_sum = float(np.cumsum(self._price)[-1])
+            total_value = float(np.cumsum(self._price * self._stock)[-1])
+            min_price, max_price = float(self._price.min()), float(self._price.max())
+            total_stock = int(self._stock.sum())
+        else:
+            price_sum = self._sequential_sum(self.price)
+            total_value = self._sequential_sum(map(operator.mul, self.price, self.stock))
+            min_price, max_price = min(self.price), max(self.price)
+            total_stock = sum(self.stock)
+        
+        return {
+            'total_products': self.size,
+            'avg_price': round(price_sum / self.size, 2) if price_sum else 0,
+            'min_price': min_price,
+            'max_price': max_price,
+            'total_stock': total_stock,
+            'total_value': round(total_value, 2) if total_value else 0
+        }
+    
+    def calculate_by_category(self) -> Dict:
+        """Stejný výsledek jako StatisticsTool.calculate_by_category"""
+        categories = self.dictionaries['category']
+        names = self.other['name']
+        
+        if self.use_numpy:
+            codes = self._category
+            buckets = len(categories)
+            # bincount přičítá váhy postupně v pořadí řádků - stejně jako smyčka nad slovníky
+            counts = np.bincount(codes, minlength=buckets).tolist()
+            totals = np.bincount(codes, weights=self._price * self._stock, minlength=buckets).tolist()
+            price_sums = np.bincount(codes, weights=self._price, minlength=buckets).tolist()
+            order = np.argsort(codes, kind='stable').tolist()
+            grouped, start = [], 0
+            for count in counts:
+                grouped.append([names[i] for i in order[start:start + count]])
+                start += count
+        else:
+            buckets = len(categories)
+            counts, totals, price_sums = [0] * buckets, [0.0] * buckets, [0.0] * buckets
+            grouped = [[] for _ in range(buckets)]
+            for code, price, stock, name in zip(self.codes['category'], self.price, self.stock, names):
+                counts[code] += 1
+                totals[code] += price * stock
+                price_sums[code] += price
+                grouped[code].append(name)
+        
+        return {
+            cat: {
+                'count': counts[code],
+                'total_value': totals[code],
+                'avg_price': round(price_sums[code] / counts[code], 2),
+                'products': grouped[code]
+            }
+            for code, cat in enumerate(categories)
+        }
+    
+    def find_low_stock(self, threshold: int = 10) -> List[Product]:
+        if self.use_numpy:
+            indexes = np.flatnonzero(self._stock < threshold).tolist()
+        else:
+            indexes = [i for i, stock in enumerate(self.stock) if stock < threshold]
+        return self.rows(indexes)
+    
+    def find_expensive(self, limit: int = 5) -> List[Product]:
+        """Top-K podle ceny; shody v ceně v pořadí řádků jako heapq.nlargest"""
+        k = min(limit, self.size)
+        if k <= 0:
+            return []
+        if self.use_numpy:
+            # Kandidáti nad k-tou nejvyšší cenou, pak stabilní řazení jen jich
+            kth = np.partition(self._price, self.size - k)[self.size - k]
+            candidates = np.flatnonzero(self._price >= kth)
+            order = candidates[np.argsort(-self._price[candidates], kind='stable')][:k].tolist()
+        else:
+            order = heapq.nlargest(k, range(self.size), key=self.price.__getitem__)
+        return self.rows(order)
+    
+    def memory_bytes(self) -> int:
+        """Přibližná velikost sloupců v paměti (pole + seznamy, bez sdílených řetězců)"""
+        total = sum(a.itemsize * len(a) for a in (self.price, self.stock, self.ids))
+        total += sum(a.itemsize * len(a) for a in self.codes.values())
+        total += sum(sys.getsizeof(values) for values in self.other.values())
+        return total
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """Analýza nedoběhla - vypršel limit, procesy jsou vytížené nebo proces spadl"""
+    
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason  # 'timeout', 'busy' nebo 'failed'
+
+
+class SharedColumns:
+    """Číselné sloupce katalogu v jednom bloku sdílené paměti pro procesy analýz
+    
+    Ceny, zásoby a kódy kategorií a značek se do bloku zapíšou jednou pro
+    verzi dat - z načteného sloupcového katalogu přímo v hlavním procesu,
+    jinak je z databáze načte proces analýz (build), aby čtení neběželo ve
+    vláknech serveru. Úloze se posílá jen popis rozložení (jméno bloku, počet
+    řádků, posuny sloupců) - proces si blok připojí a čte ho bez kopie, žádné
+    seznamy řádků se neserializují. Slovníky kódů zůstávají v hlavním
+    procesu, který do výsledku doplní jména.
+    """
+    
+    COLUMNS = (('price', 'd'), ('stock', 'q'), ('category', 'i'), ('brand', 'i'))
+    
+    def __init__(self, version: int, layout: Dict, dictionaries: Dict[str, list]):
+        self.version = version
+        self.layout = layout
+        self.dictionaries = dictionaries
+        self.size = layout['size']
+        # Vlastní připojení - hlavní proces blok drží a při změně verze odstraní
+        self.shm = shared_memory.SharedMemory(name=layout['name'])
+    
+    @classmethod
+    def create(cls, columns: Dict[str, array], dictionaries: Dict[str, list]) -> Dict:
+        """Zapíše sloupce do nového bloku a vrátí jeho popis; blok zůstává, dokud ho někdo neodstraní"""
+        rows = len(columns['price'])
+        offsets, offset = {}, 0
+        for name, typecode in cls.COLUMNS:
+            offsets[name] = (typecode, offset)
+            # Zarovnání na 8 bajtů - pole NumPy nad blokem jsou zarovnaná
+            offset += -(-rows * columns[name].itemsize // 8) * 8
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, (typecode, start) in offsets.items():
+            data = memoryview(columns[name]).cast('B')
+            shm.buf[start:start + len(data)] = data
+        shm.close()
+        return {
+            'name': shm.name,
+            'size': offset,
+            'rows': rows,
+            'columns': offsets,
+            'buckets': {name: len(values) for name, values in dictionaries.items()}
+        }
+    
+    @staticmethod
+    def from_catalog(catalog: ColumnarCatalog) -> tuple:
+        """Popis bloku a slovníky ze sloupcového katalogu - pole se jen zkopírují"""
+        columns = {'price': catalog.price, 'stock': catalog.stock, **catalog.codes}
+        return SharedColumns.create(columns, catalog.dictionaries), catalog.dictionaries
+    
+    @staticmethod
+    def build(db_path: str, deadline: float, chunk_size: int = 10000) -> tuple:
+        """Načte čtyři sloupce z databáze a zapíše je do bloku - úloha pro proces analýz"""
+        columns = {name: array(typecode) for name, typecode in SharedColumns.COLUMNS}
+        lookups = {'category': {}, 'brand': {}}
+        pool = ConnectionPool(db_path, max_size=1, read_only=True)
+        try:
+            with pool.connection() as conn:
+                cursor = conn.execute('SELECT price, stock, category, brand FROM products')
+                while True:
+                    if time.time() > deadline:
+                        raise TimeoutError("Načtení sloupců nestihlo limit")
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    prices, stocks, categories, brands = zip(*rows)
+                    columns['price'].extend(prices)
+                    columns['stock'].extend(stocks)
+                    for name, values in (('category', categories), ('brand', brands)):
+                        lookup = lookups[name]
+                        columns[name].extend([lookup.setdefault(v, len(lookup)) for v in values])
+        finally:
+            pool.close()
+        dictionaries = {name: list(lookup) for name, lookup in lookups.items()}
+        return SharedColumns.create(columns, dictionaries), dictionaries
+    
+    @staticmethod
+    def discard(built: tuple):
+        """Odstraní blok z build, na jehož výsledek už nikdo nečekal"""
+        shm = shared_memory.SharedMemory(name=built[0]['name'])
+        shm.close()
+        shm.unlink()
+    
+    @staticmethod
+    @contextmanager
+    def attach(layout: Dict):
+        """Připojí blok podle popisu - slovník pohledů memoryview na jednotlivé sloupce
+        
+        Pole NumPy nad pohledy musí zaniknout dřív, než blok skončí, jinak
+        pohledy nejde uvolnit.
+        """
+        shm = shared_memory.SharedMemory(name=layout['name'])
+        views = {}
+        try:
+            for name, (typecode, offset) in layout['columns'].items():
+                size = layout['rows'] * array(typecode).itemsize
+                views[name] = shm.buf[offset:offset + size].cast(typecode)
+            yield views
+        finally:
+            for view in views.values():
+                view.release()
+            shm.close()
+    
+    def unlink(self):
+        """Odstraní blok - procesy, které ho mají připojený, ho dočtou"""
+        self.shm.close()
+        self.shm.unlink()
+
+
+class PortfolioAnalysis:
+    """Analýza produktového portfolia nad sdílenými sloupci - běží v procesu analýz
+    
+    Pro každou kategorii počet, hodnota skladu a její podíl, kvartily ceny,
+    produkty bez zásob a s nízkými zásobami, nejsilnější značka podle hodnoty
+    a koncentrace značek (Herfindahlův index, 0-10 000). Pro celý katalog
+    podíl produktů, které drží 80 % hodnoty skladu. Výsledek obsahuje kódy
+    kategorií a značek, ne jména. Výpočet průběžně kontroluje termín a po
+    něm se vzdá - tak se uvolní proces i pro úlohu, na kterou už nikdo nečeká.
+    """
+    
+    PARETO = 0.8
+    CHECK_EVERY = 1 << 16  # po kolika řádcích se kontroluje termín (bez NumPy)
+    
+    @staticmethod
+    def run(layout: Dict, low_stock_threshold: int, deadline: float) -> Dict:
+        """Vstupní bod úlohy; deadline je čas time.time(), po kterém se výpočet vzdá"""
+        if time.time() > deadline:
+            raise TimeoutError("Úloha čekala ve frontě déle než její limit")
+        with SharedColumns.attach(layout) as columns:
+            analyze = PortfolioAnalysis._analyze_numpy if np is not None else PortfolioAnalysis._analyze
+            result = analyze(columns, layout, low_stock_threshold, deadline)
+        if result is None:
+            raise TimeoutError("Analýza nestihla limit")
+        return result
+    
+    @staticmethod
+    def _quantile(values: list, q: float) -> float:
+        """Kvantil seřazeného seznamu s lineární interpolací (jako np.percentile)"""
+        position = (len(values) - 1) * q
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (position - low)
+    
+    @staticmethod
+    def _category(code: int, count: int, value: float, quartiles: list, out_of_stock: int,
+                  low_stock: int, brand_values: Dict[int, float]) -> Dict:
+        # Při shodě hodnoty vyhrává nižší kód - stejně s NumPy i bez ní
+        top, top_value = max(brand_values.items(), key=lambda item: (item[1], -item[0]),
+                             default=(None, 0.0))
+        hhi = sum((v / value * 100) ** 2 for v in brand_values.values()) if value else 0
+        return {
+            'category': code,
+            'count': count,
+            'value': round(value, 2),
+            'price_quartiles': [round(q, 2) for q in quartiles],
+            'out_of_stock': out_of_stock,
+            'low_stock': low_stock,
+            'top_brand': top if top_value else None,
+            'top_brand_share': round(top_value / value * 100, 1) if value else 0,
+            'brand_hhi': round(hhi)
+        }
+    
+    @staticmethod
+    def _summary(rows: int, total: float, pareto_rows: int, categories: List[Dict]) -> Dict:
+        categories.sort(key=lambda info: (-info['value'], info['category']))
+        for info in categories:
+            info['value_share'] = round(info['value'] / total * 100, 1) if total else 0
+        return {
+            'rows': rows,
+            'total_value': round(total, 2),
+            'pareto_share': round(pareto_rows / rows * 100, 1) if rows else 0,
+            'categories': categories
+        }
+    
+    @staticmethod
+    def _analyze(columns: Dict, layout: Dict, threshold: int, deadline: float) -> Dict:
+        """Jeden průchod sloupci v čistém Pythonu"""
+        buckets = layout['buckets']['category']
+        counts, values = [0] * buckets, [0.0] * buckets
+        out_of_stock, low_stock = [0] * buckets, [0] * buckets
+        prices = [[] for _ in range(buckets)]
+        brand_values = [{} for _ in range(buckets)]
+        item_values = []
+        rows = zip(columns['price'], columns['stock'], columns['category'], columns['brand'])
+        for i, (price, stock, code, brand) in enumerate(rows):
+            if not i % PortfolioAnalysis.CHECK_EVERY and time.time() > deadline:
+                return None
+            value = price * stock
+            counts[code] += 1
+            values[code] += value
+            prices[code].append(price)
+            item_values.append(value)
+            out_of_stock[code] += stock == 0
+            low_stock[code] += stock < threshold
+            by_brand = brand_values[code]
+            by_brand[brand] = by_brand.get(brand, 0.0) + value
+        
+        categories = []
+        for code in range(buckets):
+            if time.time() > deadline:
+                return None
+            if not counts[code]:
+                continue
+            ordered = sorted(prices[code])
+            quartiles = [PortfolioAnalysis._quantile(ordered, q) for q in (0.25, 0.5, 0.75)]
+            categories.append(PortfolioAnalysis._category(
+                code, counts[code], values[code], quartiles,
+                out_of_stock[code], low_stock[code], brand_values[code]
+            ))
+        
+        total = sum(values)
+        pareto_rows, cumulative = 0, 0.0
+        if total:
+            for value in sorted(item_values, reverse=True):
+                cumulative += value
+                pareto_rows += 1
+                if cumulative >= PortfolioAnalysis.PARETO * total:
+                    break
+        return PortfolioAnalysis._summary(len(item_values), total, pareto_rows, categories)
+    
+    @staticmethod
+    def _analyze_numpy(columns: Dict, layout: Dict, threshold: int, deadline: float) -> Dict:
+        """Vektorově - pole NumPy přímo nad sdílenou pamětí, bez kopie"""
+        price = np.frombuffer(columns['price'], dtype=np.float64)
+        stock = np.frombuffer(columns['stock'], dtype=np.int64)
+        codes = np.frombuffer(columns['category'], dtype=np.int32)
+        brands = np.frombuffer(columns['brand'], dtype=np.int32)
+        buckets = layout['buckets']['category']
+        
+        value = price * stock
+        counts = np.bincount(codes, minlength=buckets).tolist()
+        values = np.bincount(codes, weights=value, minlength=buckets).tolist()
+        out_of_stock = np.bincount(codes[stock == 0], minlength=buckets).tolist()
+        low_stock = np.bincount(codes[stock < threshold], minlength=buckets).tolist()
+        order = np.argsort(codes, kind='stable')
+        
+        categories, start = [], 0
+        for code in range(buckets):
+            if time.time() > deadline:
+                return None
+            if not counts[code]:
+                continue
+            rows = order[start:start + counts[code]]
+            start += counts[code]
+            quartiles = np.percentile(price[rows], (25, 50, 75)).tolist()
+            by_brand = np.bincount(brands[rows], weights=value[rows])
+            present = np.flatnonzero(by_brand)
+            categories.append(PortfolioAnalysis._category(
+                code, counts[code], values[code], quartiles, out_of_stock[code], low_stock[code],
+                dict(zip(present.tolist(), by_brand[present].tolist()))
+            ))
+        
+        if time.time() > deadline:
+            return None
+        total = sum(values)
+        pareto_rows = 0
+        if total:
+            cumulative = np.cumsum(np.sort(value)[::-1])
+            pareto_rows = int(np.searchsorted(cumulative, PortfolioAnalysis.PARETO * total)) + 1
+        return PortfolioAnalysis._summary(len(price), total, pareto_rows, categories)
+
+
+class AnalyticsExecutor:
+    """Těžší analýzy v samostatných procesech - neblokují vlákna, která obsluhují /ask
+    
+    Procesy vzniknou forkem ve start(), který volá server před prvním
+    požadavkem - ne při importu modulu (benchmarky, testy) a ne později
+    z vlákna běžícího serveru, kde by fork mohl zdědit zamčené zámky. Data
+    dostanou přes SharedColumns, úloha nese jen popis bloku. Každá úloha má
+    limit: po něm se čekání vzdá, úlohu, která ještě nezačala, zruší a běžící
+    úloha skončí sama při další kontrole termínu. Nad max_pending
+    rozpracovaných úloh se další hned odmítne, takže se analýzy nehromadí.
+    Bez forku (Windows), s processes=0, před start() a po pádu procesu
+    analýz běží analýza ve vlákně požadavku se stejným limitem.
+    """
+    
+    def __init__(self, processes: int = 2, timeout: float = 10.0, max_pending: int = None):
+        self.timeout = timeout
+        self.processes = processes if 'fork' in multiprocessing.get_all_start_methods() else 0
+        self.max_pending = max_pending or max(self.processes, 1) * 2
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._share_lock = threading.Lock()
+        self._shared = None
+        self._pool = None
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.failed = 0
+        self.broken = False
+    
+    @staticmethod
+    def _init_worker():
+        # Ctrl+C dostane celá skupina procesů - procesy analýz ukončí hlavní proces
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    def start(self):
+        """Spustí procesy analýz - jednou, dokud proces ještě neobsluhuje požadavky"""
+        if not self.processes or self._pool is not None or self.broken:
+            return
+        # Sledovač sdílené paměti musí běžet před forkem - jinak by si každý
+        # proces spustil vlastní a ten by při konci procesu bloky odstranil
+        resource_tracker.ensure_running()
+        pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('fork'),
+                                   initializer=self._init_worker)
+        # S forkem se při prvním submit spustí všechny procesy najednou
+        pool.submit(os.getpid).result()
+        self._pool = pool
+    
+    def _disable(self, broken: ProcessPoolExecutor):
+        """Rozbitý pool (proces analýz zabil např. OOM killer) se nahradí výpočtem ve vlákně
+        
+        Nový fork z vlákna běžícího serveru by mohl zdědit zamčené zámky,
+        proto se pool znovu nespouští.
+        """
+        with self._lock:
+            if self._pool is not broken:
+                return  # už vyřídilo jiné vlákno
+            self._pool = None
+            self.broken = True
+        broken.shutdown(wait=False, cancel_futures=True)
+        print("⚠️  Proces analýz neočekávaně skončil, analýzy poběží ve vláknech požadavků")
+    
+    def _count(self, counter: str, result: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        METRICS.inc('analytics_tasks_total', (('result', result),))
+    
+    def _release(self, future):
+        self._slots.release()
+    
+    def run(self, func, *args, timeout: float = None, on_late=None):
+        """Zavolá func(*args, deadline) v procesu analýz a počká nejvýš timeout sekund
+        
+        Vyhodí AnalyticsUnavailable, pokud úloha nestihne limit, všechna místa
+        jsou obsazená nebo proces analýz spadl. on_late dostane výsledek úlohy,
+        která doběhla až po limitu (úklid prostředků, které vytvořila).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected', 'busy')
+            raise AnalyticsUnavailable('busy', "Všechny procesy analýz jsou vytížené")
+        
+        start = time.perf_counter()
+        deadline = time.time() + timeout
+        pool, future = self._pool, None
+        try:
+            if pool is None:
+                result = func(*args, deadline)
+            else:
+                future = pool.submit(func, *args, deadline)
+                # Místo se uvolní, až úloha opravdu skončí - ne když se na ni přestane čekat
+                future.add_done_callback(self._release)
+                result = future.result(timeout)
+        except TimeoutError:
+            # Úlohu, která ještě nezačala, zruší; běžící skončí při kontrole termínu
+            if future is not None and not future.cancel() and on_late is not None:
+                future.add_done_callback(
+                    lambda f: not f.cancelled() and f.exception() is None and on_late(f.result()))
+            self._count('timeouts', 'timeout')
+            raise AnalyticsUnavailable('timeout', f"Analýza nestihla limit {timeout:g} s") from None
+        except BrokenProcessPool:
+            self._count('failed', 'failed')
+            self._disable(pool)
+            raise AnalyticsUnavailable('failed', "Proces analýz neočekávaně skončil") from None
+        except Exception as e:
+            self._count('failed', 'failed')
+            print(f"⚠️  Analýza selhala: {e}")
+            raise AnalyticsUnavailable('failed', f"Analýza selhala: {e}") from e
+        finally:
+            if future is None:
+                self._slots.release()
+        
+        self._count('completed', 'ok')
+        METRICS.observe('analytics', time.perf_counter() - start)
+        return result
+    
+    def share(self, version: int, db_tool: DatabaseTool, catalog: ColumnarCatalog = None) -> SharedColumns:
+        """Sloupce verze dat ve sdílené paměti - blok předchozí verze se odstraní"""
+        with self._share_lock:
+            shared = self._shared
+            if shared is None or shared.version != version:
+                start = time.perf_counter()
+                if catalog is not None:
+                    layout, dictionaries = SharedColumns.from_catalog(catalog)
+                else:
+                    layout, dictionaries = self.run(SharedColumns.build, db_tool.db_path,
+                                                    on_late=SharedColumns.discard)
+                shared = SharedColumns(version, layout, dictionaries)
+                METRICS.observe('analytics_share', time.perf_counter() - start)
+                if self._shared is not None:
+                    self._shared.unlink()
+                self._shared = shared
+            return shared
+    
+    def portfolio(self, version: int, db_tool: DatabaseTool, catalog: ColumnarCatalog = None,
+                  low_stock_threshold: int = 10) -> Dict:
+        """PortfolioAnalysis nad verzí dat, s názvy kategorií a značek"""
+        shared = self.share(version, db_tool, catalog)
+        result = self.run(PortfolioAnalysis.run, shared.layout, low_stock_threshold)
+        categories, brands = shared.dictionaries['category'], shared.dictionaries['brand']
+        for info in result['categories']:
+            info['category'] = categories[info['category']]
+            if info['top_brand'] is not None:
+                info['top_brand'] = brands[info['top_brand']]
+        return result
+    
+    def stats(self) -> Dict:
+        shared = self._shared
+        with self._lock:
+            return {
+                'processes': self.processes,
+                'timeout': self.timeout,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'running': self._pool is not None,
+                'broken': self.broken,
+                'shared_version': shared.version if shared else None,
+                'shared_bytes': shared.size if shared else 0
+            }
+    
+    def close(self):
+        """Zruší čekající úlohy, počká na běžící (skončí nejpozději s limitem) a odstraní sdílený blok"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        with self._share_lock:
+            if self._shared is not None:
+                self._shared.unlink()
+                self._shared = None
+
+
+class IntentMatcher:
+    """Tabulka záměrů zkompilovaná do jednoho Aho-Corasick automatu
+    
+    Otázka se projde jednou (bez diakritiky, malými písmeny) a cena nezávisí
+    na počtu registrovaných záměrů, jen na délce otázky a počtu nálezů.
+    Záměr platí, když z každé jeho skupiny klíčových slov padne aspoň jedno;
+    při shodě více záměrů vyhrává dřív registrovaný.
+    """
+    
+    def __init__(self, intents: List = None, default: str = 'general'):
+        self.default = default
+        self._intents = []   # (název, počet skupin) v pořadí priority
+        self._keywords = {}  # klíčové slovo -> [(index záměru, index skupiny)]
+        self._compiled = False
+        for name, groups in intents or []:
+            self.register(name, groups)
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = unicodedata.normalize('NFKD', text.lower())
+        return ''.join(c for c in text if not unicodedata.combining(c))
+    
+    def register(self, name: str, groups: List[List[str]]):
+        """Přidá záměr - groups: seznam skupin alternativních klíčových slov"""
+        intent_idx = len(self._intents)
+        self._intents.append((name, len(groups)))
+        for group_idx, keywords in enumerate(groups):
+            for keyword in keywords:
+                self._keywords.setdefault(self.normalize(keyword), []).append((intent_idx, group_idx))
+        self._compiled = False
+    
+    def compile(self):
+        """Postaví trie klíčových slov a doplní failure odkazy (BFS)"""
+        goto = [{}]
+        outputs = [[]]
+        for keyword, targets in self._keywords.items():
+            state = 0
+            for char in keyword:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].extend(targets)
+        
+        fail = [0] * len(goto)
+        pending = list(goto[0].values())
+        while pending:
+            next_level = []
+            for state in pending:
+                for char, nxt in goto[state].items():
+                    f = fail[state]
+                    while f and char not in goto[f]:
+                        f = fail[f]
+                    fail[nxt] = goto[f].get(char, 0)
+                    outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+                    next_level.append(nxt)
+            pending = next_level
+        
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+        self._compiled = True
+    
+    def match(self, text: str) -> str:
+        """Vrátí název záměru s nejvyšší prioritou, jinak výchozí"""
+        if not self._compiled:
+            self.compile()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        
+        satisfied = {}  # index záměru -> množina splněných skupin
+        state = 0
+        for char in self.normalize(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for intent_idx, group_idx in outputs[state]:
+                satisfied.setdefault(intent_idx, set()).add(group_idx)
+        
+        best = None
+        for intent_idx, groups in satisfied.items():
+            if len(groups) == self._intents[intent_idx][1] and (best is None or intent_idx < best):
+                best = intent_idx
+        return self._intents[best][0] if best is not None else self.default
+
+
+# Záměry v pořadí priority: (název, skupiny klíčových slov)
+# Z každé skupiny musí v otázce padnout aspoň jedno slovo; diakritika nehraje roli
+INTENTS = [
+    ('count', [['kolik'], ['produkt', 'celkem']]),
+    ('average', [['průměr']]),
+    ('categories', [['kategorie']]),
+    ('low_stock', [['nízk'], ['zásob']]),
+    ('expensive', [['nejdražší']]),
+    ('portfolio', [['analýz', 'portfolio']]),
+    ('search', [['najdi', 'najít', 'hledám', 'hledej', 'vyhledej', 'něco s', 'něco na', 'značky']])
+]
+
+INTENT_MATCHER = IntentMatcher(INTENTS)
+
+
+class QueryPlanner:
+    """Určí záměr dotazu a data, která pro odpověď opravdu stačí"""
+    
+    # Záměr -> klíče v datech, které odpověď simulátoru čte
+    INTENT_DATA = {
+        'count': ['stats'],
+        'average': ['stats'],
+        'categories': ['stats', 'category_stats'],
+        'low_stock': ['stats', 'low_stock'],
+        'expensive': ['stats', 'expensive'],
+        'search': ['stats', 'search'],
+        # Analýza portfolia běží v procesu analýz (AnalyticsExecutor)
+        'portfolio': ['stats', 'portfolio'],
+        # Obecná otázka může zmínit značku nebo typ produktu ("Jaké máme Apple?")
+        'general': ['stats', 'search']
+    }
+    
+    # Kontext pro OpenAI obsahuje všechny agregace bez ohledu na záměr;
+    # drahé analýzy se přidají, jen když se na ně otázka ptá
+    PROMPT_DATA = ['stats', 'search', 'low_stock', 'expensive', 'category_stats']
+    
+    def __init__(self, mode: str = "simulator"):
+        self.mode = mode
+    
+    @staticmethod
+    def classify(question: str) -> str:
+        return INTENT_MATCHER.match(question)
+    
+    def plan(self, question: str) -> Dict:
+        intent = self.classify(question)
+        if self.mode == "openai":
+            required = self.PROMPT_DATA + [key for key in self.INTENT_DATA.get(intent, [])
+                                           if key not in self.PROMPT_DATA]
+        else:
+            required = self.INTENT_DATA.get(intent, ['stats'])
+        return {'intent': intent, 'data': required}
 
 
 class LLMSimulator:
     """Simulace LLM - ZDARMA, žádné API"""
     
     @staticmethod
-    def generate_response(question: str, data: Dict, stats: Dict) -> str:
-        question_lower = question.lower()
+    def generate_response(question: str, data: Dict, stats: Dict, intent: str = None) -> str:
+        if intent is None:
+            intent = QueryPlanner.classify(question)
         
-        if 'kolik' in question_lower and ('produkt' in question_lower or 'celkem' in question_lower):
+        if intent == 'count':
             return f"V databázi máme celkem {stats['total_products']} produktů. "\
                    f"Celková hodnota skladu je {stats['total_value']:,.0f} Kč."
         
-        elif 'průměr' in question_lower or 'průměrná cena' in question_lower:
+        elif intent == 'average':
             return f"Průměrná cena produktů je {stats['avg_price']:,.0f} Kč. "\
                    f"Nejlevnější produkt stojí {stats['min_price']:,.0f} Kč a "\
                    f"nejdražší {stats['max_price']:,.0f} Kč."
         
-        elif 'kategorie' in question_lower:
+        elif intent == 'categories':
             category_stats = data.get('category_stats', {})
             response = "Produkty podle kategorií:\n"
             for cat, info in category_stats.items():
@@ -171,101 +1913,998 @@ class LLMSimulator:
                            f"průměrná cena {info['avg_price']:,.0f} Kč\n"
             return response
         
-        elif 'nízk' in question_lower and 'zásob' in question_lower:
+        elif intent == 'low_stock':
             low_stock = data.get('low_stock', [])
             if not low_stock:
-                return "Všechny produkty mají dostatek zásob (10+ kusů)."
+                threshold = data.get('low_stock_threshold', 10)
+                return f"Všechny produkty mají dostatek zásob ({threshold}+ kusů)."
             response = f"Produkty s nízkými zásobami ({len(low_stock)} ks):\n"
             for p in low_stock[:5]:
-                response += f"- {p['name']}: {p['stock']} ks\n"
+                response += f"- {p.name}: {p.stock} ks\n"
             return response
         
-        elif 'nejdražší' in question_lower:
+        elif intent == 'expensive':
             expensive = data.get('expensive', [])
             if expensive:
                 top = expensive[0]
-                return f"Nejdražším produktem je {top['name']} za {top['price']:,.0f} Kč. "\
-                       f"Máme ho {top['stock']} kusů na skladě."
+                return f"Nejdražším produktem je {top.name} za {top.price:,.0f} Kč. "\
+                       f"Máme ho {top.stock} kusů na skladě."
             return "Nenalezeny žádné produkty."
         
+        elif intent == 'portfolio':
+            portfolio = data.get('portfolio') or {}
+            if 'error' in portfolio:
+                return f"Analýzu portfolia se teď nepodařilo dokončit ({portfolio['error']}). "\
+                       f"Zkuste to prosím za chvíli znovu."
+            response = f"Analýza portfolia ({portfolio['rows']} produktů, "\
+                       f"hodnota skladu {portfolio['total_value']:,.0f} Kč):\n"
+            for info in portfolio['categories']:
+                q1, median, q3 = info['price_quartiles']
+                response += f"- {info['category']}: {info['value_share']} % hodnoty skladu, "\
+                           f"medián ceny {median:,.0f} Kč ({q1:,.0f}-{q3:,.0f} Kč), "\
+                           f"bez zásob {info['out_of_stock']}, nízké zásoby {info['low_stock']}"
+                if info['top_brand'] is not None:
+                    response += f", nejsilnější značka {info['top_brand']} ({info['top_brand_share']} %)"
+                response += "\n"
+            response += f"80 % hodnoty skladu drží {portfolio['pareto_share']} % produktů."
+            return response
+        
+        found = data.get('search', [])
+        if found:
+            response = f"Nalezené produkty ({len(found)}):\n"
+            for p in found:
+                response += f"- {p.name} ({p.brand}, {p.price:,.0f} Kč, {p.stock} ks)\n"
+            return response
+        elif intent == 'search':
+            return "Žádný produkt neodpovídá hledání. Zkuste jiný název, značku nebo typ produktu."
+        
         else:
             return f"Mám k dispozici informace o {stats['total_products']} produktech. "\
                    f"Průměrná cena je {stats['avg_price']:,.0f} Kč, "\
                    f"celková hodnota skladu {stats['total_value']:,.0f} Kč. "\
                    f"Můžete se zeptat na kategorie, ceny, zásoby nebo konkrétní produkty."
+    
+    @staticmethod
+    def stream_response(question: str, data: Dict, stats: Dict, intent: str = None):
+        """Simulátor odpověď negeneruje po tokenech - celá přijde jako jedna část"""
+        yield LLMSimulator.generate_response(question, data, stats, intent=intent)
+    
+    @staticmethod
+    def generate_batch(questions: List[str], datas: List[Dict], stats: Dict,
+                       intents: List[str] = None) -> List[tuple]:
+        """Stejné rozhraní jako OpenAILLM.generate_batch - odpovědi postupně, bez promptu"""
+        results = []
+        for question, data, intent in zip(questions, datas, intents or [None] * len(questions)):
+            start = time.perf_counter()
+            answer = LLMSimulator.generate_response(question, data, stats, intent=intent)
+            results.append((answer, time.perf_counter() - start, None))
+        return results
+
+
+class PromptBuilder:
+    """Kompaktní kontext pro LLM s rozpočtem tokenů
+    
+    Sekce kontextu (souhrn kategorií bez seznamů názvů, nejdražší produkty,
+    nízké zásoby, produkty zmíněné kategorie) se serializují jednou pro verzi
+    dat a drží v malé LRU cache. Pro dotaz se jen seřadí podle relevance
+    k otázce a přidávají po řádcích, dokud se vejdou do rozpočtu. Tokeny se
+    odhadují z délky v bajtech UTF-8 (zhruba 4 bajty na token).
+    """
+    
+    HEADER = "Jsi AI asistent pracující s databází produktů."
+    FOOTER = "Odpověz na otázku uživatele v češtině, konkrétně a na základě těchto dat."
+    # Kolik řádků sekce se vůbec připraví - zbytek ořízne rozpočet
+    LIMITS = {'low_stock': 20, 'expensive': 10, 'category': 30}
+    DEFAULT_ORDER = ['categories', 'expensive', 'low_stock']
+    # Záměr -> sekce, která jde do kontextu hned za produkty zmíněných kategorií
+    INTENT_SECTIONS = {'categories': 'categories', 'low_stock': 'low_stock', 'expensive': 'expensive',
+                       'portfolio': 'portfolio'}
+    
+    def __init__(self, budget: int = 800, max_versions: int = 4):
+        self.budget = budget
+        self.max_versions = max_versions
+        self._cache = OrderedDict()  # verze dat -> {sekce: (nadpis, tokeny nadpisu, [(řádek, tokeny)])}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prompts = 0
+        self.tokens_total = 0
+        self.truncated = 0
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return len(text.encode('utf-8')) // 4 + 1
+    
+    @staticmethod
+    def _stem(text: str) -> str:
+        """Kmen bez diakritiky - 'Elektronika' najde i 'elektroniku'"""
+        norm = IntentMatcher.normalize(text)
+        return norm[:max(4, len(norm) - 2)]
+    
+    def _render(self, name: str, data: Dict) -> tuple:
+        if name == 'categories':
+            title = "Kategorie (počet produktů, průměrná cena, hodnota skladu):"
+            lines = [
+                f"- {cat}: {info['count']}, {info['avg_price']} Kč, {info['total_value']:.0f} Kč"
+                for cat, info in data.get('category_stats', {}).items()
+            ]
+        elif name == 'expensive':
+            title = "Nejdražší produkty:"
+            lines = [f"- {p.name} ({p.price} Kč, {p.stock} ks)"
+                     for p in data.get('expensive', [])[:self.LIMITS['expensive']]]
+        elif name == 'search':
+            title = "Produkty odpovídající otázce (fulltext):"
+            lines = [f"- {p.name} ({p.brand}, {p.category}, {p.price} Kč, {p.stock} ks)"
+                     for p in data.get('search', [])]
+        elif name == 'portfolio':
+            portfolio = data.get('portfolio') or {}
+            title = "Analýza portfolia (podíl na hodnotě skladu, kvartily ceny, bez zásob, hlavní značka, HHI značek):"
+            lines = [
+                f"- {info['category']}: {info['value_share']} %, "
+                f"{'/'.join(str(q) for q in info['price_quartiles'])} Kč, {info['out_of_stock']}, "
+                f"{info['top_brand']} ({info['top_brand_share']} %), {info['brand_hhi']}"
+                for info in portfolio.get('categories', [])
+            ]
+            if lines:
+                lines.append(f"- 80 % hodnoty skladu drží {portfolio['pareto_share']} % produktů")
+        elif name == 'low_stock':
+            low_stock = data.get('low_stock', [])
+            title = f"Produkty s nízkými zásobami ({len(low_stock)} celkem):"
+            lines = [f"- {p.name} ({p.stock} ks)" for p in low_stock[:self.LIMITS['low_stock']]]
+        else:
+            category = name.split(':', 1)[1]
+            info = data.get('category_stats', {}).get(category, {})
+            title = f"Produkty v kategorii {category} ({info.get('count', 0)} celkem):"
+            lines = [f"- {n}" for n in info.get('products', [])[:self.LIMITS['category']]]
+        estimate = self.estimate_tokens
+        return title, estimate(title), [(line, estimate(line)) for line in lines]
+    
+    def _section(self, name: str, data: Dict) -> tuple:
+        """Vykreslená sekce - z cache pro verzi dat, pokud dotaz nemá vlastní K / práh"""
+        snapshot = getattr(data, 'snapshot', None)
+        # Nedokončená analýza se do cache sekcí nesmí dostat
+        if snapshot is None or name in getattr(data, 'overrides', {}) or getattr(data, 'partial', False):
+            return self._render(name, data)
+        with self._lock:
+            sections = self._cache.get(snapshot.version)
+            if sections is None:
+                sections = self._cache[snapshot.version] = {}
+                while len(self._cache) > self.max_versions:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(snapshot.version)
+            section = sections.get(name)
+            if section is not None:
+                self.hits += 1
+                return section
+            self.misses += 1
+        # Vykreslení mimo zámek - dva souběžné dotazy ho nanejvýš spočítají dvakrát
+        section = self._render(name, data)
+        with self._lock:
+            sections[name] = section
+        return section
+    
+    def order(self, question: str, data: Dict, intent: str = None) -> List[str]:
+        """Sekce podle relevance: nalezené produkty, zmíněné kategorie, sekce záměru, ostatní"""
+        normalized = IntentMatcher.normalize(question)
+        order = ['search'] + [f"category:{cat}" for cat in data.get('category_stats', {})
+                              if self._stem(cat) in normalized]
+        first = self.INTENT_SECTIONS.get(intent)
+        if first:
+            order.append(first)
+        order.extend(name for name in self.DEFAULT_ORDER if name != first)
+        return order
+    
+    def build(self, question: str, data: Dict, stats: Dict, intent: str = None) -> tuple:
+        """Vrátí (kontext, velikost) - velikost: tokeny, znaky, rozpočet, použité sekce"""
+        header = f"""{self.HEADER}
+
+Statistiky databáze:
+- Celkem produktů: {stats['total_products']}
+- Průměrná cena: {stats['avg_price']} Kč
+- Cenové rozpětí: {stats['min_price']} - {stats['max_price']} Kč
+- Celková hodnota skladu: {stats['total_value']} Kč"""
+        parts = [header]
+        used = self.estimate_tokens(header) + self.estimate_tokens(self.FOOTER)
+        included = []
+        dropped = 0
+        
+        for name in self.order(question, data, intent):
+            title, cost, lines = self._section(name, data)
+            chosen = []
+            for line, tokens in lines:
+                if used + cost + tokens > self.budget:
+                    break
+                chosen.append(line)
+                cost += tokens
+            dropped += len(lines) - len(chosen)
+            if chosen:
+                parts.append(title + '\n' + '\n'.join(chosen))
+                included.append(name)
+                used += cost
+        
+        parts.append(self.FOOTER)
+        context = '\n\n'.join(parts)
+        size = {
+            'tokens': self.estimate_tokens(context),
+            'chars': len(context),
+            'budget': self.budget,
+            'sections': included,
+            'truncated_lines': dropped
+        }
+        with self._lock:
+            self.prompts += 1
+            self.tokens_total += size['tokens']
+            self.truncated += dropped > 0
+        return context, size
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'budget': self.budget,
+                'prompts': self.prompts,
+                'tokens_total': self.tokens_total,
+                'avg_tokens': round(self.tokens_total / self.prompts, 1) if self.prompts else 0,
+                'truncated': self.truncated,
+                'section_hits': self.hits,
+                'section_misses': self.misses,
+                'cached_versions': len(self._cache)
+            }
 
 
 class OpenAILLM:
-    """Skutečné OpenAI API - vyžaduje klíč"""
+    """Skutečné OpenAI API - vyžaduje klíč
+    
+    Volání běží asynchronně na jedné sdílené smyčce (vlastní vlákno) s jedním
+    klientem a poolem spojení. Souběžnost je omezená, stejné rozpracované
+    dotazy se slučují a chyby sítě se opakují s exponenciálním čekáním.
+    Přes base_url jde agenta pustit proti lokálnímu stubu (openai_stub_server.py).
+    """
+    
+    ERROR_PREFIX = "Chyba OpenAI API"
+    
+    def __init__(self, api_key: str, base_url: str = None, model: str = "gpt-3.5-turbo",
+                 max_concurrency: int = 8, timeout: float = 30.0, max_retries: int = 3,
+                 prompt_budget: int = 800):
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.available = False
+        self.prompts = PromptBuilder(prompt_budget)
+        
+        self._inflight = {}  # (otázka, kontext) -> rozpracovaná úloha; jen ve smyčce
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.errors = 0
+        
+        try:
+            import openai
+            self.client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=0  # opakování řídíme sami
+            )
+            self._retryable = (openai.APIConnectionError, openai.RateLimitError,
+                               openai.InternalServerError, asyncio.TimeoutError)
+            
+            self._loop = asyncio.new_event_loop()
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+            self._thread = threading.Thread(target=self._loop.run_forever, name='openai-loop', daemon=True)
+            self._thread.start()
+            self.available = True
+            print("✅ OpenAI API připojeno" + (f" ({base_url})" if base_url else ""))
+        except ImportError:
+            print("⚠️  OpenAI knihovna není nainstalovaná. Spusťte: pip install openai")
+        except Exception as e:
+            print(f"⚠️  OpenAI API chyba: {e}")
+    
+    def build_context(self, question: str, data: Dict, stats: Dict, intent: str = None) -> str:
+        """Kontext pro GPT z PromptBuilder; velikost promptu se uloží k datům dotazu"""
+        context, size = self.prompts.build(question, data, stats, intent)
+        if isinstance(data, LazyData):
+            data.prompt = size
+        return context
+    
+    def _count(self, counter: str):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    async def _complete(self, question: str, context: str) -> str:
+        """Jedno volání API s timeoutem a opakováním (exponenciální čekání + jitter)"""
+        delay = 0.5
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self._count('requests')
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(
+                            model=self.model,
+                            messages=[
+                                {"role": "system", "content": context},
+                                {"role": "user", "content": question}
+                            ],
+                            temperature=0.7,
+                            max_tokens=300
+                        ),
+                        self.timeout
+                    )
+                return response.choices[0].message.content.strip()
+            except self._retryable:
+                if attempt == self.max_retries:
+                    raise
+                self._count('retries')
+                await asyncio.sleep(delay * (1 + random.random()))
+                delay *= 2
+    
+    async def agenerate(self, question: str, context: str) -> str:
+        """Asynchronní odpověď; stejný rozpracovaný dotaz se nevolá dvakrát"""
+        key = (question.strip(), context)
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count('coalesced')
+        else:
+            task = asyncio.ensure_future(self._complete(question, context))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield - zrušení jednoho čekatele nesmí zrušit sdílené volání
+        return await asyncio.shield(task)
+    
+    async def _stream(self, question: str, context: str, push):
+        """Streamované volání API (stream=True) - každou část textu předá funkci push
+        
+        Opakuje se jen do prvního tokenu; potom už klient část odpovědi viděl.
+        """
+        delay = 0.5
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async with self._semaphore:
+                    self._count('requests')
+                    stream = await asyncio.wait_for(
+                        self.client.chat.completions.create(
+                            model=self.model,
+                            messages=[
+                                {"role": "system", "content": context},
+                                {"role": "user", "content": question}
+                            ],
+                            temperature=0.7,
+                            max_tokens=300,
+                            stream=True
+                        ),
+                        self.timeout
+                    )
+                    try:
+                        async for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                started = True
+                                push(chunk.choices[0].delta.content)
+                    finally:
+                        # Při zrušení (klient se odpojil) zavřít i spojení na API
+                        await stream.close()
+                return
+            except self._retryable:
+                if started or attempt == self.max_retries:
+                    raise
+                self._count('retries')
+                await asyncio.sleep(delay * (1 + random.random()))
+                delay *= 2
+    
+    def _run(self, coro):
+        """Spustí korutinu na sdílené smyčce a počká na výsledek"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    def generate_response(self, question: str, data: Dict, stats: Dict, intent: str = None) -> str:
+        if not self.available:
+            return "OpenAI API není dostupné. Použijte SIMULATOR režim."
+        
+        try:
+            context = self.build_context(question, data, stats, intent)
+            return self._run(self.agenerate(question, context))
+        except Exception as e:
+            self._count('errors')
+            return f"{self.ERROR_PREFIX}: {str(e)}. Zkuste SIMULATOR režim."
     
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.available = False
+    def stream_response(self, question: str, data: Dict, stats: Dict, intent: str = None):
+        """Odpověď po částech, jak je posílá API - generátor textových částí
+        
+        Chyba se vrátí jako samostatná část začínající ERROR_PREFIX. Zavření
+        generátoru (odpojený klient) zruší rozpracované volání API.
+        """
+        if not self.available:
+            yield "OpenAI API není dostupné. Použijte SIMULATOR režim."
+            return
         
+        context = self.build_context(question, data, stats, intent)
+        parts = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._stream(question, context, parts.put), self._loop)
+        future.add_done_callback(lambda _: parts.put(None))
         try:
-            from openai import OpenAI
-            self.client = OpenAI(api_key=api_key)
-            self.available = True
-            print("✅ OpenAI API připojeno")
-        except ImportError:
-            print("⚠️  OpenAI knihovna není nainstalovaná. Spusťte: pip install openai")
+            while True:
+                part = parts.get()
+                if part is None:
+                    break
+                yield part
+            future.result()
         except Exception as e:
-            print(f"⚠️  OpenAI API chyba: {e}")
+            self._count('errors')
+            yield f"{self.ERROR_PREFIX}: {str(e)}. Zkuste SIMULATOR režim."
+        finally:
+            future.cancel()
     
-    def generate_response(self, question: str, data: Dict, stats: Dict) -> str:
+    def generate_batch(self, questions: List[str], datas: List[Dict], stats: Dict,
+                       intents: List[str] = None) -> List[tuple]:
+        """Odpoví na více otázek najednou - souběžně nad daty každé otázky
+        
+        datas - data pro každou otázku (sdílené agregace, vlastní fulltext).
+        Vrací pro každou otázku (odpověď, doba v sekundách, velikost promptu).
+        """
         if not self.available:
-            return "OpenAI API není dostupné. Použijte SIMULATOR režim."
+            return [("OpenAI API není dostupné. Použijte SIMULATOR režim.", 0.0, None)] * len(questions)
+        
+        intents = intents or [QueryPlanner.classify(q) for q in questions]
+        # Každá otázka má vlastní výběr sekcí; vykreslené sekce jsou sdílené z cache
+        prompts = [self.prompts.build(q, data, stats, intent)
+                   for q, data, intent in zip(questions, datas, intents)]
         
+        async def timed(question: str, context: str) -> tuple:
+            start = time.perf_counter()
+            try:
+                return await self.agenerate(question, context), time.perf_counter() - start
+            except Exception as e:
+                self._count('errors')
+                return f"{self.ERROR_PREFIX}: {str(e)}. Zkuste SIMULATOR režim.", time.perf_counter() - start
+        
+        async def run_batch():
+            return await asyncio.gather(*(timed(q, c) for q, (c, _) in zip(questions, prompts)))
+        
+        return [(answer, seconds, size) for (answer, seconds), (_, size) in zip(self._run(run_batch()), prompts)]
+    
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                'requests': self.requests,
+                'coalesced': self.coalesced,
+                'retries': self.retries,
+                'errors': self.errors,
+                'max_concurrency': self.max_concurrency,
+                'prompt': self.prompts.stats()
+            }
+    
+    def close(self):
+        """Zavře klienta a zastaví smyčku"""
+        if not self.available:
+            return
+        self._run(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self.available = False
+
+
+class CatalogSnapshot:
+    """Agregace katalogu pro jednu verzi dat - počítají se líně, nejvýš jednou"""
+    
+    # Klíč v datech -> fáze v metrikách
+    STAGES = {
+        'products': 'db_fetch',
+        'stats': 'statistics',
+        'category_stats': 'category_aggregation',
+        'low_stock': 'low_stock',
+        'expensive': 'top_k',
+        'search': 'search',
+        'portfolio': 'portfolio_analysis'
+    }
+    
+    def __init__(self, version: int, db_tool: DatabaseTool, stats_tool: StatisticsTool,
+                 columnar: bool = False, analytics: AnalyticsExecutor = None):
+        self.version = version
+        self.db_tool = db_tool
+        self.stats_tool = stats_tool
+        self.columnar = columnar
+        self.analytics = analytics
+        self._catalog = None
+        self._values = {}
+        self._lock = threading.Lock()
+        # Zámek pro každý klíč - dlouhá analýza nezdrží ostatní agregace
+        self._locks = {}
+        self._catalog_lock = threading.Lock()
+    
+    def columns(self) -> ColumnarCatalog:
+        """Sloupcový katalog této verze dat - načte se při prvním použití"""
+        with self._catalog_lock:
+            if self._catalog is None and self.columnar:
+                start = time.perf_counter()
+                try:
+                    self._catalog = ColumnarCatalog.load(self.db_tool)
+                except ValueError as e:
+                    print(f"⚠️  Sloupcový katalog nelze použít ({e}), počítám po řádcích")
+                    self.columnar = False
+                    return None
+                METRICS.observe('columnar_load', time.perf_counter() - start)
+            return self._catalog
+    
+    def _compute(self, key: str) -> tuple:
+        """Spočítá hodnotu klíče - vrací (nástroj, hodnota)"""
+        if key == 'portfolio':
+            # Sloupcový katalog se použije, jen pokud už je načtený
+            return 'AnalyticsExecutor.portfolio', self.analytics.portfolio(
+                self.version, self.db_tool, self._catalog)
+        
+        if self.columnar and key != 'products':
+            catalog = self.columns()
+            if catalog is not None:
+                method = 'calculate_by_category' if key == 'category_stats' else {
+                    'stats': 'get_statistics',
+                    'low_stock': 'find_low_stock',
+                    'expensive': 'find_expensive'
+                }[key]
+                return f'ColumnarCatalog.{method}', getattr(catalog, method)()
+        
+        # Když už jsou produkty v paměti, počítá se v Pythonu; jinak dotazem přes indexy
+        products = self._values.get('products')
+        
+        if key == 'products':
+            return 'DatabaseTool.query', self.db_tool.query()
+        if key == 'stats':
+            return 'DatabaseTool.get_statistics', self.db_tool.get_statistics()
+        if key == 'category_stats':
+            if products is not None:
+                return 'StatisticsTool.calculate_by_category', self.stats_tool.calculate_by_category(products)
+            return 'DatabaseTool.get_category_statistics', self.db_tool.get_category_statistics()
+        if key == 'low_stock':
+            if products is not None:
+                return 'StatisticsTool.find_low_stock', self.stats_tool.find_low_stock(products)
+            return 'DatabaseTool.find_low_stock', self.db_tool.find_low_stock()
+        if key == 'expensive':
+            if products is not None:
+                return 'StatisticsTool.find_expensive', self.stats_tool.find_expensive(products)
+            return 'DatabaseTool.find_expensive', self.db_tool.find_expensive()
+        raise KeyError(key)
+    
+    def resolve(self, key: str) -> tuple:
+        """Vrátí (hodnota, nástroj); nástroj je None, pokud už byla hodnota spočítaná"""
+        if key in self._values:
+            return self._values[key], None
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key in self._values:
+                return self._values[key], None
+            start = time.perf_counter()
+            tool, value = self._compute(key)
+            METRICS.observe(self.STAGES[key], time.perf_counter() - start)
+            self._values[key] = value
+            return value, tool
+
+
+class LazyData(dict):
+    """Data pro LLM jednoho dotazu - hodnota se spočítá až při prvním přístupu"""
+    
+    def __init__(self, snapshot: CatalogSnapshot, overrides: Dict = None):
+        super().__init__()
+        self.snapshot = snapshot
+        self.overrides = overrides or {}  # klíč -> (nástroj, funkce) pro tento dotaz
+        self.tools_used = []
+        self.prompt = None  # velikost promptu pro LLM (jen režim OpenAI)
+        self.partial = False  # některá analýza nedoběhla - odpověď se nemá cachovat
+    
+    def __missing__(self, key):
+        if key not in self.overrides and key not in CatalogSnapshot.STAGES:
+            raise KeyError(key)  # např. low_stock_threshold bez zadaného prahu
+        if key in self.overrides:
+            tool, thunk = self.overrides[key]
+            start = time.perf_counter()
+            value = thunk()
+            METRICS.observe(CatalogSnapshot.STAGES[key], time.perf_counter() - start)
+        else:
+            try:
+                value, tool = self.snapshot.resolve(key)
+            except AnalyticsUnavailable as e:
+                # Jen pro tento dotaz - snímek si výsledek nezapamatuje a příště se zkusí znovu
+                value, tool = {'error': e.reason, 'message': str(e)}, None
+                self.partial = True
+        if tool:
+            self.tools_used.append(tool)
+        self[key] = value
+        return value
+    
+    def get(self, key, default=None):
         try:
-            # Připrava kontextu pro GPT
-            context = f"""Jsi AI asistent pracující s databází produktů.
+            return self[key]
+        except KeyError:
+            return default
+    
+    def prefetch(self, keys: List[str]):
+        for key in keys:
+            self[key]
+    
+    def fork(self, overrides: Dict) -> 'LazyData':
+        """Kopie pro jinou otázku - spočítané hodnoty se sdílí, overrides se doplní"""
+        data = LazyData(self.snapshot, {**self.overrides, **overrides})
+        data.partial = self.partial
+        data.update((key, value) for key, value in self.items() if key not in overrides)
+        return data
 
-Statistiky databáze:
-- Celkem produktů: {stats['total_products']}
-- Průměrná cena: {stats['avg_price']} Kč
-- Cenové rozpětí: {stats['min_price']} - {stats['max_price']} Kč
-- Celková hodnota skladu: {stats['total_value']} Kč
 
-Produkty s nízkými zásobami:
-{json.dumps([p['name'] + f" ({p['stock']} ks)" for p in data.get('low_stock', [])[:5]], ensure_ascii=False)}
+class SnapshotCache:
+    """Snímek agregací katalogu, invalidovaný verzí dat"""
+    
+    def __init__(self, db_tool: DatabaseTool, stats_tool: StatisticsTool, columnar: bool = False,
+                 analytics: AnalyticsExecutor = None):
+        self.db_tool = db_tool
+        self.stats_tool = stats_tool
+        self.columnar = columnar
+        self.analytics = analytics
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.hits = 0
+        self.rebuilds = 0
+    
+    def get(self) -> CatalogSnapshot:
+        """Vrátí snímek pro aktuální verzi dat, při změně založí nový"""
+        version = self.db_tool.data_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            with self._lock:
+                self.hits += 1
+            return snapshot
+        
+        with self._lock:
+            # Jiné vlákno mohlo snímek mezitím vyměnit
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                self.hits += 1
+                return snapshot
+            snapshot = CatalogSnapshot(version, self.db_tool, self.stats_tool, self.columnar, self.analytics)
+            self._snapshot = snapshot
+            self.rebuilds += 1
+            return snapshot
+    
+    def invalidate(self):
+        """Zahodí snímek - další dotaz ho přepočítá"""
+        self._snapshot = None
+    
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version if snapshot else None,
+            'hits': self.hits,
+            'rebuilds': self.rebuilds,
+            'columnar': self.columnar,
+            'columnar_rows': len(snapshot._catalog) if snapshot and snapshot._catalog else 0
+        }
 
-Top nejdražší produkty:
-{json.dumps([p['name'] + f" ({p['price']} Kč)" for p in data.get('expensive', [])[:3]], ensure_ascii=False)}
 
-Kategorie:
-{json.dumps(data.get('category_stats', {}), ensure_ascii=False)}
+class AnswerCache:
+    """LRU/TTL cache odpovědí klíčovaná normalizovanou otázkou a verzí dat
+    
+    Volitelně se zapisuje i do SQLite souboru, takže přežije restart serveru.
+    Zápis dělá vlákno na pozadí po dávkách (jako QueryLog) a čtení souboru
+    běží mimo zámek cache - disk tak nezdrží zásahy v paměti. Když je fronta
+    zápisů plná, odpověď zůstane jen v paměti (započítá se do dropped).
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0, db_path: str = None,
+                 batch_size: int = 100, flush_interval: float = 0.5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()  # klíč -> (platnost do, odpověď)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.written = 0
+        self.dropped = 0
+        
+        self._db = None
+        self._thread = None
+        if db_path:
+            db = self._connect()
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    key TEXT PRIMARY KEY,
+                    answer TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            db.execute('DELETE FROM answer_cache WHERE expires_at < ?', (time.time(),))
+            db.commit()
+            # Spojení pro čtení (get) má vlastní zámek; zapisuje jen vlákno na pozadí
+            self._db = db
+            self._db_lock = threading.Lock()
+            self._queue = queue.Queue(maxsize=max(max_size, 1) * 4)
+            self._thread = threading.Thread(target=self._writer, name='answer-cache-writer', daemon=True)
+            self._thread.start()
+    
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        # Cache se dá kdykoli spočítat znovu - stačí fsync při checkpointu
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+    
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Malá písmena, bez diakritiky, jednoduché mezery"""
+        text = unicodedata.normalize('NFKD', question.lower())
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        return ' '.join(text.split())
+    
+    def make_key(self, question: str, data_version: int, *params) -> str:
+        return json.dumps([self.normalize(question), data_version, *params], ensure_ascii=False)
+    
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None or self._db is None:
+                return self._lookup(key, entry, now)
+        
+        # Čtení souboru mimo zámek cache - ostatní vlákna mezitím berou z paměti
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT expires_at, answer FROM answer_cache WHERE key = ?', (key,)
+            ).fetchone()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and row is not None:
+                entry = row
+                self._store(key, entry)
+            return self._lookup(key, entry, now)
+    
+    def _lookup(self, key: str, entry: tuple, now: float):
+        """Odpověď platného záznamu, jinak None (volá se pod zámkem)"""
+        if entry is None or entry[0] < now:
+            if entry is not None:
+                self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def put(self, key: str, answer: str):
+        entry = (time.time() + self.ttl, answer)
+        with self._lock:
+            self._store(key, entry)
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait((key, answer, entry[0]))
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+    
+    def _writer(self):
+        db = self._connect()
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            if None in batch:
+                running = False
+                batch = [row for row in batch if row is not None]
+            if batch:
+                try:
+                    db.executemany(
+                        'INSERT OR REPLACE INTO answer_cache (key, answer, expires_at) VALUES (?, ?, ?)',
+                        batch
+                    )
+                    db.commit()
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    db.rollback()
+                    with self._lock:
+                        self.dropped += len(batch)
+                    print(f"⚠️  Zápis cache odpovědí selhal: {e}")
+        db.close()
+    
+    def close(self):
+        """Zapíše zbytek fronty a zavře soubor cache"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            result = {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'persistent': self._db is not None
+            }
+            if self._db is not None:
+                result.update(pending=self._queue.qsize(), written=self.written, dropped=self.dropped)
+            return result
 
-Odpověz na otázku uživatele v češtině, konkrétně a na základě těchto dat."""
 
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": context},
-                    {"role": "user", "content": question}
-                ],
-                temperature=0.7,
-                max_tokens=300
-            )
+class QueryLog:
+    """Ohraničený log dotazů - kruhový buffer v paměti + JSONL soubor
+    
+    Zápis na disk dělá vlákno na pozadí po dávkách, požadavek jen vloží
+    záznam do fronty. Když je fronta plná, záznam se na disk nezapíše
+    (započítá se do dropped), v paměti ale zůstane.
+    """
+    
+    def __init__(self, path: str = None, capacity: int = 1000, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_bytes: int = 10 * 1024 * 1024,
+                 rotate_interval: float = 24 * 3600, backups: int = 5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        
+        self._recent = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=capacity * 10)
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        
+        self._thread = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._writer, name='query-log-writer', daemon=True)
+            self._thread.start()
+    
+    def append(self, entry: Dict):
+        with self._lock:
+            self._recent.append(entry)
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+    
+    def tail(self, n: int = 50) -> List[Dict]:
+        """Posledních n záznamů (nejnovější na konci)"""
+        with self._lock:
+            if n >= len(self._recent):
+                return list(self._recent)
+            return list(itertools.islice(self._recent, len(self._recent) - n, None))
+    
+    def __len__(self) -> int:
+        return len(self._recent)
+    
+    def _open(self):
+        f = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+        return f
+    
+    def _rotate(self, f):
+        """Přejmenuje log na .1 (starší posune na .2 ...) a otevře nový"""
+        f.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        return self._open()
+    
+    def _writer(self):
+        f = self._open()
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
             
-            return response.choices[0].message.content.strip()
+            if None in batch:
+                running = False
+                batch = [entry for entry in batch if entry is not None]
+            if batch:
+                f.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in batch))
+                f.flush()
+                self.written += len(batch)
             
-        except Exception as e:
-            return f"Chyba OpenAI API: {str(e)}. Zkuste SIMULATOR režim."
+            if f.tell() >= self.max_bytes or time.time() - self._opened_at >= self.rotate_interval:
+                if f.tell() > 0:
+                    f = self._rotate(f)
+        f.close()
+    
+    def close(self):
+        """Zapíše zbytek fronty a ukončí zapisovací vlákno"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_memory': len(self._recent),
+                'capacity': self._recent.maxlen,
+                'pending': self._queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'rotations': self.rotations,
+                'path': self.path
+            }
 
 
 class AIAgent:
     """Hlavní AI Agent s podporou obou režimů"""
     
-    def __init__(self, mode: str = "simulator"):
-        self.db_tool = DatabaseTool()
+    def __init__(self, mode: str = "simulator", worker: int = None):
+        """worker - pořadí pracovního procesu v režimu více procesů (viz Supervisor);
+        databázi pak jen čte a log dotazů píše do vlastního souboru"""
+        self.worker = worker
+        # Procesy analýz spustí až server (_serve) - import modulu nic neforkuje
+        self.analytics = AnalyticsExecutor(
+            processes=int(os.getenv('ANALYTICS_PROCESSES', '2')),
+            timeout=float(os.getenv('ANALYTICS_TIMEOUT', '10'))
+        )
+        self.db_tool = DatabaseTool(
+            os.getenv('DATABASE_PATH', './data/products.db'),
+            statement_cache=int(os.getenv('STATEMENT_CACHE_SIZE', '256')),
+            read_only=worker is not None
+        )
         self.stats_tool = StatisticsTool()
+        self.snapshot_cache = SnapshotCache(
+            self.db_tool, self.stats_tool,
+            columnar=os.getenv('COLUMNAR_STORE', '0') == '1',
+            analytics=self.analytics
+        )
         self.mode = mode.lower()
         
         # Inicializace LLM podle režimu
         if self.mode == "openai":
             api_key = os.getenv('OPENAI_API_KEY')
             if api_key:
-                self.llm = OpenAILLM(api_key)
+                self.llm = OpenAILLM(
+                    api_key,
+                    base_url=os.getenv('OPENAI_BASE_URL') or None,
+                    model=os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
+                    max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', '8')),
+                    timeout=float(os.getenv('OPENAI_TIMEOUT', '30')),
+                    prompt_budget=int(os.getenv('PROMPT_TOKEN_BUDGET', '800'))
+                )
                 if not self.llm.available:
                     print("⚠️  OpenAI nedostupné, přepínám na SIMULATOR")
                     self.llm = LLMSimulator()
@@ -278,41 +2917,287 @@ class AIAgent:
             self.llm = LLMSimulator()
             self.mode = "simulator"
         
-        self.query_log = []
+        self.planner = QueryPlanner(self.mode)
+        self.answer_cache = AnswerCache(
+            max_size=int(os.getenv('ANSWER_CACHE_SIZE', '1024')),
+            ttl=float(os.getenv('ANSWER_CACHE_TTL', '3600')),
+            db_path=os.getenv('ANSWER_CACHE_DB') or None
+        )
+        log_path = os.getenv('QUERY_LOG_PATH', './data/query_log.jsonl') or None
+        if log_path and worker is not None:
+            # Rotace jednoho souboru by se mezi procesy přetahovala - každý má svůj
+            root, ext = os.path.splitext(log_path)
+            log_path = f"{root}.{worker}{ext}"
+        self.query_log = QueryLog(
+            path=log_path,
+            capacity=int(os.getenv('QUERY_LOG_CAPACITY', '1000'))
+        )
         print(f"🤖 AI Agent režim: {self.mode.upper()}")
     
-    def process_query(self, question: str) -> Dict:
-        products = self.db_tool.query()
-        stats = self.db_tool.get_statistics()
-        
-        category_stats = self.stats_tool.calculate_by_category(products)
-        low_stock = self.stats_tool.find_low_stock(products)
-        expensive = self.stats_tool.find_expensive(products)
+    def _overrides(self, top_k: int = None, low_stock_threshold: int = None,
+                   question: str = None, intent: str = None) -> Dict:
+        """Data jen pro tento požadavek - nestandardní K / práh, fulltext podle otázky"""
+        overrides = {}
+        if question is not None:
+            overrides['search'] = (
+                'DatabaseTool.search_products',
+                lambda: self.db_tool.search_products(question, any_term=intent == 'search')
+            )
+        if top_k is not None:
+            overrides['expensive'] = (
+                'DatabaseTool.find_expensive',
+                lambda: self.db_tool.find_expensive(top_k)
+            )
+        if low_stock_threshold is not None:
+            overrides['low_stock'] = (
+                'DatabaseTool.find_low_stock',
+                lambda: self.db_tool.find_low_stock(low_stock_threshold)
+            )
+        return overrides
+    
+    def _prepare(self, question: str, top_k: int, low_stock_threshold: int) -> tuple:
+        """Plán, snímek dat, líná data a odpověď z cache (None = volat LLM)"""
+        # Záměr se určí jednou; spočítá se jen to, co záměr potřebuje
+        plan = self.planner.plan(question)
+        snapshot = self.snapshot_cache.get()
         
-        data = {
-            'products': products,
-            'category_stats': category_stats,
-            'low_stock': low_stock,
-            'expensive': expensive
-        }
+        data = LazyData(snapshot, self._overrides(top_k, low_stock_threshold, question, plan['intent']))
+        if low_stock_threshold is not None:
+            data['low_stock_threshold'] = low_stock_threshold
         
-        response = self.llm.generate_response(question, data, stats)
+        # Stejná otázka nad stejnou verzí dat - odpověď z cache bez volání LLM
+        cache_key = self.answer_cache.make_key(
+            question, snapshot.version, self.mode, top_k, low_stock_threshold
+        )
+        response = self.answer_cache.get(cache_key)
         
+        if response is None:
+            data.prefetch(plan['data'])
+        return plan, snapshot, data, cache_key, response
+    
+    def _finish(self, question: str, response: str, plan: Dict, snapshot, data,
+                cached: bool, request_start: float) -> Dict:
+        """Zápis do logu, metriky a výsledný slovník odpovědi"""
+        start = time.perf_counter()
         log_entry = {
             'timestamp': datetime.now().isoformat(),
             'question': question,
             'response': response,
             'mode': self.mode
         }
+        if data.prompt is not None:
+            log_entry['prompt_tokens'] = data.prompt['tokens']
         self.query_log.append(log_entry)
         
+        end = time.perf_counter()
+        METRICS.observe('logging', end - start)
+        METRICS.observe('total', end - request_start)
+        METRICS.inc('agent_requests_total', (('intent', plan['intent']), ('cached', str(cached).lower())))
+        
         return {
             'question': question,
             'answer': response,
             'timestamp': log_entry['timestamp'],
+            'stats': data['stats'],
+            'data_version': snapshot.version,
+            'intent': plan['intent'],
+            'tools_used': data.tools_used,
+            'cached': cached,
+            'prompt': data.prompt,
+            'mode': self.mode
+        }
+    
+    def process_query(self, question: str, top_k: int = None,
+                      low_stock_threshold: int = None) -> Dict:
+        request_start = time.perf_counter()
+        plan, snapshot, data, cache_key, response = self._prepare(question, top_k, low_stock_threshold)
+        cached = response is not None
+        stats = data['stats']
+        
+        if not cached:
+            start = time.perf_counter()
+            response = self.llm.generate_response(question, data, stats, intent=plan['intent'])
+            METRICS.observe('llm', time.perf_counter() - start)
+            if not response.startswith(OpenAILLM.ERROR_PREFIX) and not data.partial:
+                self.answer_cache.put(cache_key, response)
+        
+        return self._finish(question, response, plan, snapshot, data, cached, request_start)
+    
+    def process_query_stream(self, question: str, top_k: int = None,
+                             low_stock_threshold: int = None):
+        """Jako process_query, ale po částech - generátor dvojic (událost, obsah)
+        
+        ('meta', statistiky a záměr) hned po přípravě dat, potom ('token', text)
+        pro každou část odpovědi LLM a nakonec ('done', stejný slovník jako
+        process_query). Do cache se ukládá až celá odpověď bez chyby a jen
+        s doběhlými analýzami.
+        """
+        request_start = time.perf_counter()
+        plan, snapshot, data, cache_key, response = self._prepare(question, top_k, low_stock_threshold)
+        cached = response is not None
+        stats = data['stats']
+        
+        yield 'meta', {
+            'question': question,
             'stats': stats,
+            'data_version': snapshot.version,
+            'intent': plan['intent'],
+            'cached': cached,
             'mode': self.mode
         }
+        
+        if cached:
+            METRICS.observe('ttft', time.perf_counter() - request_start)
+            yield 'token', response
+        else:
+            start = time.perf_counter()
+            parts = []
+            failed = False
+            for part in self.llm.stream_response(question, data, stats, intent=plan['intent']):
+                if not parts:
+                    METRICS.observe('ttft', time.perf_counter() - request_start)
+                failed = failed or part.startswith(OpenAILLM.ERROR_PREFIX)
+                parts.append(part)
+                yield 'token', part
+            METRICS.observe('llm', time.perf_counter() - start)
+            response = ''.join(parts)
+            if not failed and not data.partial:
+                self.answer_cache.put(cache_key, response)
+        
+        yield 'done', self._finish(question, response, plan, snapshot, data, cached, request_start)
+    
+    def process_batch(self, questions: List[str], top_k: int = None,
+                      low_stock_threshold: int = None) -> Dict:
+        """Více otázek nad jedním snímkem dat - agregace se počítají jednou
+        
+        Otázky bez odpovědi v cache jdou do LLM jednou dávkou (v režimu OpenAI
+        souběžně). Výsledky jsou ve stejném pořadí jako otázky, s časem každé.
+        """
+        request_start = time.perf_counter()
+        snapshot = self.snapshot_cache.get()
+        data = LazyData(snapshot, self._overrides(top_k, low_stock_threshold))
+        if low_stock_threshold is not None:
+            data['low_stock_threshold'] = low_stock_threshold
+        
+        items = []
+        pending = []  # indexy otázek, které musí odpovědět LLM
+        plans = {}
+        required = []
+        for question in questions:
+            start = time.perf_counter()
+            plan = self.planner.plan(question)
+            cache_key = self.answer_cache.make_key(
+                question, snapshot.version, self.mode, top_k, low_stock_threshold
+            )
+            answer = self.answer_cache.get(cache_key)
+            if answer is None:
+                plans[len(items)] = plan
+                pending.append(len(items))
+                # Fulltext závisí na otázce - hledá se zvlášť pro každou
+                required.extend(key for key in plan['data'] if key not in required and key != 'search')
+            items.append({
+                'question': question,
+                'answer': answer,
+                'intent': plan['intent'],
+                'cached': answer is not None,
+                'seconds': time.perf_counter() - start,
+                'cache_key': cache_key
+            })
+        
+        # Sjednocená data všech otázek - každá agregace nejvýš jednou
+        data.prefetch(required)
+        stats = data['stats']
+        
+        datas = []
+        tools_used = list(data.tools_used)
+        for i in pending:
+            item = items[i]
+            start = time.perf_counter()
+            item_data = data.fork(self._overrides(question=item['question'], intent=item['intent']))
+            if 'search' in plans[i]['data']:
+                item_data.prefetch(['search'])
+            item['seconds'] += time.perf_counter() - start
+            tools_used.extend(t for t in item_data.tools_used if t not in tools_used)
+            datas.append(item_data)
+        prepared = time.perf_counter()
+        
+        if pending:
+            answers = self.llm.generate_batch(
+                [items[i]['question'] for i in pending], datas, stats,
+                intents=[items[i]['intent'] for i in pending]
+            )
+            for i, item_data, (answer, seconds, prompt) in zip(pending, datas, answers):
+                item = items[i]
+                item['answer'] = answer
+                item['seconds'] += seconds
+                if prompt is not None:
+                    item['prompt'] = prompt
+                if not answer.startswith(OpenAILLM.ERROR_PREFIX) and not item_data.partial:
+                    self.answer_cache.put(item['cache_key'], answer)
+        llm_done = time.perf_counter()
+        if pending:
+            METRICS.observe('llm', llm_done - prepared)
+        
+        timestamp = datetime.now().isoformat()
+        for item in items:
+            del item['cache_key']
+            item['seconds'] = round(item['seconds'], 6)
+            log_entry = {
+                'timestamp': timestamp,
+                'question': item['question'],
+                'response': item['answer'],
+                'mode': self.mode
+            }
+            if 'prompt' in item:
+                log_entry['prompt_tokens'] = item['prompt']['tokens']
+            self.query_log.append(log_entry)
+            METRICS.inc('agent_requests_total', (('intent', item['intent']), ('cached', str(item['cached']).lower())))
+        
+        end = time.perf_counter()
+        METRICS.observe('logging', end - llm_done)
+        METRICS.observe('batch', end - request_start)
+        
+        return {
+            'results': items,
+            'timestamp': timestamp,
+            'stats': stats,
+            'data_version': snapshot.version,
+            'tools_used': tools_used,
+            'mode': self.mode,
+            'timings': {
+                'prepare': round(prepared - request_start, 6),
+                'llm': round(llm_done - prepared, 6),
+                'total': round(end - request_start, 6)
+            }
+        }
+    
+    def runtime_stats(self, server=None) -> Dict:
+        """Provozní čítače - cache, snímky, pool spojení, server"""
+        result = {
+            'mode': self.mode,
+            'answer_cache': self.answer_cache.stats(),
+            'snapshot_cache': self.snapshot_cache.stats(),
+            'db_pool': self.db_tool.pool_stats(),
+            'query_log': self.query_log.stats(),
+            'analytics': self.analytics.stats()
+        }
+        if self.worker is not None:
+            # Čítače jsou za jeden pracovní proces, ne za celý server
+            result['process'] = {'worker': self.worker, 'pid': os.getpid()}
+        if isinstance(self.llm, OpenAILLM):
+            result['openai'] = self.llm.stats()
+        if server is not None:
+            result['server'] = server.stats()
+        return result
+    
+    def close(self):
+        """Uzavře procesy analýz, spojení do databáze, cache odpovědí, log dotazů a klienta OpenAI"""
+        self.analytics.close()
+        self.db_tool.close()
+        self.answer_cache.close()
+        self.query_log.close()
+        if isinstance(self.llm, OpenAILLM):
+            self.llm.close()
 
 
 # Globální instance agenta
@@ -320,144 +3205,933 @@ mode = os.getenv('LLM_MODE', 'simulator')
 agent = AIAgent(mode=mode)
 
 
-class AgentHTTPHandler(BaseHTTPRequestHandler):
-    """HTTP handler pro web API"""
+def render_index(mode: str) -> str:
+    """HTML úvodní stránky pro režim agenta"""
+    mode_badge = "🆓 ZDARMA (Simulátor)" if mode == "simulator" else "🤖 OpenAI GPT"
+    mode_color = "#27ae60" if mode == "simulator" else "#3498db"
     
-    def do_GET(self):
-        if self.path == '/' or self.path == '/index.html':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>AI Agent s Databází</title>
+        <meta charset="utf-8">
+        <style>
+            body {{ font-family: Arial; max-width: 900px; margin: 50px auto; padding: 20px; }}
+            h1 {{ color: #2c3e50; }}
+            .mode-badge {{ background: {mode_color}; color: white; padding: 5px 15px; border-radius: 20px; font-size: 14px; }}
+            .container {{ background: #f8f9fa; padding: 20px; border-radius: 10px; }}
+            input[type="text"] {{ width: 70%; padding: 10px; font-size: 16px; }}
+            button {{ padding: 10px 20px; font-size: 16px; background: #3498db; color: white; border: none; cursor: pointer; border-radius: 5px; }}
+            button:hover {{ background: #2980b9; }}
+            .response {{ margin-top: 20px; padding: 15px; background: white; border-left: 4px solid #3498db; }}
+            .examples {{ margin: 20px 0; }}
+            .examples button {{ margin: 5px; background: #95a5a6; padding: 8px 15px; font-size: 14px; }}
+            .stats {{ display: grid; grid-template-columns: 1fr 1fr; gap: 10px; margin: 20px 0; }}
+            .stat-box {{ background: white; padding: 15px; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
+            .info {{ background: #e8f4f8; padding: 10px; border-radius: 5px; margin: 10px 0; }}
+        </style>
+    </head>
+    <body>
+        <h1>🤖 AI Agent s Databází a LLM <span class="mode-badge">{mode_badge}</span></h1>
+        
+        <div class="info">
+            <strong>ℹ️ Režim:</strong> {mode.upper()}<br>
+            <strong>📊 Databáze:</strong> SQLite s produkty<br>
+            <strong>🔧 Nástroje:</strong> Výpočetní funkce, statistiky, agregace
+        </div>
+        
+        <div class="container">
+            <h3>Položte otázku agentovi:</h3>
+            <input type="text" id="question" placeholder="Např: Kolik máme celkem produktů?">
+            <button onclick="askAgent()">Zeptat se</button>
             
-            mode_badge = "🆓 ZDARMA (Simulátor)" if agent.mode == "simulator" else "🤖 OpenAI GPT"
-            mode_color = "#27ae60" if agent.mode == "simulator" else "#3498db"
+            <div class="examples">
+                <h4>Příklady otázek:</h4>
+                <button onclick="askExample('Kolik máme celkem produktů?')">Počet produktů</button>
+                <button onclick="askExample('Jaká je průměrná cena?')">Průměrná cena</button>
+                <button onclick="askExample('Které produkty mají nízké zásoby?')">Nízké zásoby</button>
+                <button onclick="askExample('Který produkt je nejdražší?')">Nejdražší</button>
+                <button onclick="askExample('Ukaž kategorie')">Kategorie</button>
+            </div>
             
-            html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>AI Agent s Databází</title>
-                <meta charset="utf-8">
-                <style>
-                    body {{ font-family: Arial; max-width: 900px; margin: 50px auto; padding: 20px; }}
-                    h1 {{ color: #2c3e50; }}
-                    .mode-badge {{ background: {mode_color}; color: white; padding: 5px 15px; border-radius: 20px; font-size: 14px; }}
-                    .container {{ background: #f8f9fa; padding: 20px; border-radius: 10px; }}
-                    input[type="text"] {{ width: 70%; padding: 10px; font-size: 16px; }}
-                    button {{ padding: 10px 20px; font-size: 16px; background: #3498db; color: white; border: none; cursor: pointer; border-radius: 5px; }}
-                    button:hover {{ background: #2980b9; }}
-                    .response {{ margin-top: 20px; padding: 15px; background: white; border-left: 4px solid #3498db; }}
-                    .examples {{ margin: 20px 0; }}
-                    .examples button {{ margin: 5px; background: #95a5a6; padding: 8px 15px; font-size: 14px; }}
-                    .stats {{ display: grid; grid-template-columns: 1fr 1fr; gap: 10px; margin: 20px 0; }}
-                    .stat-box {{ background: white; padding: 15px; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-                    .info {{ background: #e8f4f8; padding: 10px; border-radius: 5px; margin: 10px 0; }}
-                </style>
-            </head>
-            <body>
-                <h1>🤖 AI Agent s Databází a LLM <span class="mode-badge">{mode_badge}</span></h1>
-                
-                <div class="info">
-                    <strong>ℹ️ Režim:</strong> {agent.mode.upper()}<br>
-                    <strong>📊 Databáze:</strong> SQLite s produkty<br>
-                    <strong>🔧 Nástroje:</strong> Výpočetní funkce, statistiky, agregace
-                </div>
+            <div id="response" class="response" style="display: none;">
+                <h4>Odpověď:</h4>
+                <p id="answer"></p>
+                <div class="stats" id="stats"></div>
+            </div>
+        </div>
+        
+        <script>
+            function showStats(stats) {{
+                document.getElementById('stats').innerHTML = `
+                    <div class="stat-box">📦 Produktů: ${{stats.total_products}}</div>
+                    <div class="stat-box">💰 Průměr: ${{stats.avg_price}} Kč</div>
+                    <div class="stat-box">📊 Na skladě: ${{stats.total_stock}}</div>
+                    <div class="stat-box">💎 Hodnota: ${{stats.total_value}} Kč</div>
+                `;
+            }}
+            
+            function handleEvent(frame, answer) {{
+                let event = 'message', data = '';
+                for (const line of frame.split('\\n')) {{
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }}
+                if (!data) return;
+                const payload = JSON.parse(data);
+                if (event === 'meta') showStats(payload.stats);
+                else if (event === 'done') answer.innerText = payload.answer;
+                else if (event === 'error') answer.innerText += '\\n⚠️ ' + payload.error;
+                else answer.innerText += payload.token;
+            }}
+            
+            // Odpověď přes /ask/stream (Server-Sent Events) - tokeny se vypisují průběžně
+            async function askAgent() {{
+                const question = document.getElementById('question').value;
+                if (!question) return;
                 
-                <div class="container">
-                    <h3>Položte otázku agentovi:</h3>
-                    <input type="text" id="question" placeholder="Např: Kolik máme celkem produktů?">
-                    <button onclick="askAgent()">Zeptat se</button>
-                    
-                    <div class="examples">
-                        <h4>Příklady otázek:</h4>
-                        <button onclick="askExample('Kolik máme celkem produktů?')">Počet produktů</button>
-                        <button onclick="askExample('Jaká je průměrná cena?')">Průměrná cena</button>
-                        <button onclick="askExample('Které produkty mají nízké zásoby?')">Nízké zásoby</button>
-                        <button onclick="askExample('Který produkt je nejdražší?')">Nejdražší</button>
-                        <button onclick="askExample('Ukaž kategorie')">Kategorie</button>
-                    </div>
-                    
-                    <div id="response" class="response" style="display: none;">
-                        <h4>Odpověď:</h4>
-                        <p id="answer"></p>
-                        <div class="stats" id="stats"></div>
-                    </div>
-                </div>
+                const answer = document.getElementById('answer');
+                answer.innerText = '';
+                document.getElementById('stats').innerHTML = '';
+                document.getElementById('response').style.display = 'block';
                 
-                <script>
-                    function askAgent() {{
-                        const question = document.getElementById('question').value;
-                        if (!question) return;
-                        
-                        fetch('/ask?q=' + encodeURIComponent(question))
-                            .then(r => r.json())
-                            .then(data => {{
-                                document.getElementById('answer').innerText = data.answer;
-                                document.getElementById('response').style.display = 'block';
-                                
-                                const stats = data.stats;
-                                document.getElementById('stats').innerHTML = `
-                                    <div class="stat-box">📦 Produktů: ${{stats.total_products}}</div>
-                                    <div class="stat-box">💰 Průměr: ${{stats.avg_price}} Kč</div>
-                                    <div class="stat-box">📊 Na skladě: ${{stats.total_stock}}</div>
-                                    <div class="stat-box">💎 Hodnota: ${{stats.total_value}} Kč</div>
-                                `;
-                            }})
-                            .catch(err => {{
-                                alert('Chyba: ' + err);
-                            }});
+                try {{
+                    const r = await fetch('/ask/stream?q=' + encodeURIComponent(question));
+                    if (!r.ok) {{
+                        answer.innerText = '⚠️ ' + (await r.json()).error;
+                        return;
                     }}
-                    
-                    function askExample(q) {{
-                        document.getElementById('question').value = q;
-                        askAgent();
+                    const reader = r.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    while (true) {{
+                        const {{ done, value }} = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, {{ stream: true }});
+                        let end;
+                        while ((end = buffer.indexOf('\\n\\n')) >= 0) {{
+                            handleEvent(buffer.slice(0, end), answer);
+                            buffer = buffer.slice(end + 2);
+                        }}
                     }}
-                    
-                    document.getElementById('question').addEventListener('keypress', function(e) {{
-                        if (e.key === 'Enter') askAgent();
-                    }});
-                </script>
-            </body>
-            </html>
-            """
-            self.wfile.write(html.encode())
-        
-        elif self.path.startswith('/ask'):
-            query_components = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
-            question = query_components.get('q', [''])[0]
+                }} catch (err) {{
+                    alert('Chyba: ' + err);
+                }}
+            }}
             
-            result = agent.process_query(question)
+            function askExample(q) {{
+                document.getElementById('question').value = q;
+                askAgent();
+            }}
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(result, ensure_ascii=False).encode())
+            document.getElementById('question').addEventListener('keypress', function(e) {{
+                if (e.key === 'Enter') askAgent();
+            }});
+        </script>
+    </body>
+    </html>
+    """
+
+
+class StaticPage:
+    """Předem připravená odpověď - zakódované tělo, ETag a komprimované varianty
+    
+    Vše se spočítá jednou při vytvoření; požadavek jen vybere variantu podle
+    Accept-Encoding, případně vrátí 304, když má klient aktuální verzi.
+    """
+    
+    def __init__(self, body: bytes, content_type: str = 'text/html; charset=utf-8'):
+        self.content_type = content_type
+        tag = hashlib.sha256(body).hexdigest()[:20]
+        self.variants = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = data
+        # Každá varianta má vlastní silný ETag - jiné bajty, jiná reprezentace
+        self.etags = {
+            encoding: f'"{tag}"' if encoding == 'identity' else f'"{tag}-{encoding}"'
+            for encoding in self.variants
+        }
+    
+    def negotiate(self, accept_encoding: str) -> str:
+        """Nejlepší dostupné kódování podle Accept-Encoding (br > gzip > identity)"""
+        accepted = {}
+        for item in (accept_encoding or '').split(','):
+            name, _, params = item.partition(';')
+            name, params = name.strip().lower(), params.strip()
+            if not name:
+                continue
+            try:
+                accepted[name] = float(params[2:]) if params.startswith('q=') else 1.0
+            except ValueError:
+                accepted[name] = 0.0
+        wildcard = accepted.get('*', 0.0)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return 'identity'
+    
+    def not_modified(self, if_none_match: str) -> bool:
+        """Klient má některou z variant stránky (If-None-Match)"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or not tags.isdisjoint(self.etags.values())
+
+
+class AgentHTTPHandler(BaseHTTPRequestHandler):
+    """HTTP handler pro web API"""
+    
+    # HTTP/1.1 - spojení zůstává otevřené pro další požadavky (keep-alive)
+    protocol_version = 'HTTP/1.1'
+    # Pomalý klient - čtení začatého požadavku a zápis odpovědi
+    # (nečinné keep-alive spojení hlídá AgentHTTPServer mimo pracovní vlákna)
+    timeout = 5
+    # Hlavička a tělo jdou dvěma zápisy - bez TCP_NODELAY by keep-alive
+    # spojení čekalo ~40 ms na zpožděné ACK (Nagle)
+    disable_nagle_algorithm = True
+    # Limity pro POST /ask/batch
+    max_batch = int(os.getenv('BATCH_MAX_QUESTIONS', '50'))
+    max_body = 64 * 1024
+    max_threshold = 1000000  # práh nízkých zásob pro /ask a /ask/batch
+    # Export /products drží spojení z poolu jen pro čtení (a otevřenou transakci),
+    # dokud klient nestáhne poslední dávku - souběžných exportů je nejvýš tolik
+    max_exports = int(os.getenv('EXPORT_MAX_CONCURRENT', '2'))
+    _exports = threading.BoundedSemaphore(max_exports)
+    # Úvodní stránka pro každý režim agenta - vykreslí a zkomprimuje se jednou
+    _pages = {}
+    
+    def handle(self):
+        # Jen jeden požadavek - na další čeká spojení v AgentHTTPServer mimo pracovní vlákno
+        self.close_connection = True
+        self.handle_one_request()
+    
+    def finish(self):
+        # Keep-alive spojení si rfile/wfile nechá pro další požadavek
+        if self.close_connection:
+            super().finish()
+        else:
+            self.wfile.flush()
+    
+    @classmethod
+    def index_page(cls) -> StaticPage:
+        page = cls._pages.get(agent.mode)
+        if page is None:
+            page = cls._pages[agent.mode] = StaticPage(render_index(agent.mode).encode())
+        return page
+    
+    def _send(self, status: int, content_type: str, body: bytes, headers: Dict = None):
+        """Odešle kompletní odpověď s Content-Length"""
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.server.stopping:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+    
+    @classmethod
+    def _ask_options(cls, top_k, threshold) -> tuple:
+        """K a práh nízkých zásob jako celá čísla v povoleném rozsahu (None = výchozí)
+        
+        Hodnota je číslo z JSON nebo řetězec z query stringu; mimo rozsah vyvolá ValueError.
+        """
+        result = []
+        for name, value, low, high in (('k', top_k, 1, ProductQuery.MAX_LIMIT),
+                                       ('threshold', threshold, 0, cls.max_threshold)):
+            if value is None or value == '':
+                result.append(None)
+                continue
+            if isinstance(value, str) and value.isdigit():
+                value = int(value)
+            if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+                raise ValueError(f"{name} musí být celé číslo {low}-{high}")
+            result.append(value)
+        return tuple(result)
+    
+    def _ask_params(self) -> tuple:
+        """Otázka, K a práh nízkých zásob z query stringu /ask; chybné K nebo práh vyvolá ValueError"""
+        query_components = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        question = query_components.get('q', [''])[0]
+        top_k, threshold = self._ask_options(
+            query_components.get('k', [''])[0],
+            query_components.get('threshold', [''])[0]
+        )
+        return question, top_k, threshold
+    
+    def _begin_stream(self, content_type: str, headers: Dict = None) -> bool:
+        """Hlavičky odpovědi bez Content-Length; vrací True, když se posílá po částech
+        
+        Na HTTP/1.1 po částech (Transfer-Encoding: chunked) a spojení zůstává
+        otevřené; HTTP/1.0 klient dostane proud ukončený zavřením spojení.
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        if self.server.stopping or not chunked:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        return chunked
+    
+    def _write_part(self, data: bytes, chunked: bool):
+        # wfile není bufferovaný - každá část odchází hned
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data) if chunked else data)
+    
+    def _send_events(self, events, request_start: float):
+        """Odešle dvojice (událost, obsah) jako Server-Sent Events
+        
+        První událost (příprava dat) se vyzvedne ještě před hlavičkami, takže
+        chyba v ní dostane 503/500 jako /ask. Chyba uprostřed proudu přijde
+        jako událost error, proud se řádně ukončí a spojení zavře.
+        """
+        try:
+            head = next(events)
+        except Exception as e:
+            events.close()
+            self._send_failure(e)
+            return
+        chunked = self._begin_stream('text/event-stream; charset=utf-8', {
+            'Cache-Control': 'no-cache',
+            'Access-Control-Allow-Origin': '*'
+        })
         
+        first = True
+        try:
+            for event, payload in itertools.chain((head,), events):
+                body = json.dumps({'token': payload} if event == 'token' else payload, ensure_ascii=False)
+                frame = f"data: {body}\n\n" if event == 'token' else f"event: {event}\ndata: {body}\n\n"
+                self._write_part(frame.encode(), chunked)
+                if first:
+                    METRICS.observe('ttfb', time.perf_counter() - request_start)
+                    first = False
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # Klient se odpojil - zavřený generátor zruší i volání LLM
+            self.close_connection = True
+        except Exception as e:
+            print(f"⚠️  Streamovaná odpověď selhala: {e!r}")
+            self.close_connection = True
+            body = json.dumps({'error': f'Odpověď selhala: {e}'}, ensure_ascii=False)
+            try:
+                self._write_part(f"event: error\ndata: {body}\n\n".encode(), chunked)
+                if chunked:
+                    self.wfile.write(b'0\r\n\r\n')
+            except OSError:
+                pass
+        finally:
+            events.close()
+    
+    # Formáty exportu GET /products
+    EXPORT_FORMATS = {
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+        'csv': 'text/csv; charset=utf-8'
+    }
+    
+    @staticmethod
+    def _encode_rows(fmt: str, columns: List[str], batches):
+        """Dávky řádků jako části NDJSON nebo CSV (s hlavičkou) - jedna dávka = jedna část"""
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode()
+            for rows in batches:
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(rows)
+                yield buffer.getvalue().encode()
         else:
-            self.send_response(404)
+            for rows in batches:
+                yield ''.join(
+                    json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows
+                ).encode()
+    
+    def _send_products(self, request_start: float):
+        """GET /products - stránka JSON s kurzorem další stránky (next), nebo
+        export NDJSON/CSV (format=ndjson|csv) po dávkách přímo z kurzoru;
+        export bez limit vrátí celý výsledek filtru"""
+        params = {k: v[0] for k, v in urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).items()}
+        fmt = params.pop('format', 'json')
+        if fmt != 'json' and fmt not in self.EXPORT_FORMATS:
+            self._send_json(400, {'error': f"format musí být json, {', '.join(self.EXPORT_FORMATS)}"})
+            return
+        try:
+            query = ProductQuery.from_params(params, unbounded=fmt != 'json')
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        
+        if fmt == 'json':
+            try:
+                products = agent.db_tool.find_products(query)
+            except TimeoutError as e:
+                self._send_json(503, {'error': str(e)}, {'Retry-After': '1'})
+                return
+            METRICS.observe('products', time.perf_counter() - request_start)
+            full_page = products and len(products) == query.limit
+            self._send_json(200, {
+                'query': query.to_dict(),
+                'count': len(products),
+                'next': query.cursor(products[-1]) if full_page else None,
+                'products': [p.to_dict() for p in products]
+            })
+            return
+        
+        if not self._exports.acquire(blocking=False):
+            self._send_json(503, {'error': 'Příliš mnoho souběžných exportů, zkuste to znovu'},
+                            {'Retry-After': '1'})
+            return
+        with ExitStack() as stack:
+            stack.callback(self._exports.release)
+            try:
+                columns, batches = stack.enter_context(agent.db_tool.stream_products(query))
+            except TimeoutError as e:
+                # Pool spojení je vyčerpaný - ještě před hlavičkami odpovědi
+                self._send_json(503, {'error': str(e)}, {'Retry-After': '1'})
+                return
+            chunked = self._begin_stream(self.EXPORT_FORMATS[fmt], {
+                'Content-Disposition': f'inline; filename="products.{fmt}"',
+                'Access-Control-Allow-Origin': '*'
+            })
+            try:
+                for part in self._encode_rows(fmt, columns, batches):
+                    self._write_part(part, chunked)
+                if chunked:
+                    self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+        METRICS.observe('products_export', time.perf_counter() - request_start)
+    
+    def _send_page(self, page: StaticPage):
+        """Předpřipravená stránka - 304 podle ETag, jinak varianta podle Accept-Encoding"""
+        encoding = page.negotiate(self.headers.get('Accept-Encoding'))
+        headers = {
+            'ETag': page.etags[encoding],
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding'
+        }
+        if page.not_modified(self.headers.get('If-None-Match')):
+            # 304 nemá tělo ani Content-Length - jen hlavičky pro revalidaci
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if self.server.stopping:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
             self.end_headers()
+            return
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        self._send(200, page.content_type, page.variants[encoding], headers)
+    
+    def do_GET(self):
+        request_start = time.perf_counter()
+        if self.path == '/' or self.path == '/index.html':
+            self._send_page(self.index_page())
+        
+        elif urllib.parse.urlparse(self.path).path == '/ask/stream':
+            try:
+                question, top_k, threshold = self._ask_params()
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            self._send_events(
+                agent.process_query_stream(question, top_k=top_k, low_stock_threshold=threshold),
+                request_start
+            )
+        
+        elif urllib.parse.urlparse(self.path).path == '/ask':
+            try:
+                question, top_k, threshold = self._ask_params()
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            try:
+                result = agent.process_query(question, top_k=top_k, low_stock_threshold=threshold)
+            except Exception as e:
+                self._send_failure(e)
+                return
+            
+            self._send(
+                200,
+                'application/json; charset=utf-8',
+                json.dumps(result, ensure_ascii=False).encode(),
+                {'Access-Control-Allow-Origin': '*'}
+            )
+        
+        elif urllib.parse.urlparse(self.path).path == '/products':
+            self._send_products(request_start)
+        
+        elif self.path == '/stats':
+            self._send(
+                200,
+                'application/json; charset=utf-8',
+                json.dumps(agent.runtime_stats(self.server), ensure_ascii=False).encode()
+            )
+        
+        elif self.path == '/metrics':
+            self._send(
+                200,
+                'text/plain; version=0.0.4; charset=utf-8',
+                METRICS.render(agent.runtime_stats(self.server)).encode()
+            )
+        
+        elif self.path.startswith('/log'):
+            query_components = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            n = query_components.get('n', ['50'])[0]
+            entries = agent.query_log.tail(int(n) if n.isdigit() else 50)
+            if query_components.get('format', [''])[0] == 'jsonl':
+                body = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entries)
+                self._send(200, 'application/x-ndjson; charset=utf-8', body.encode())
+            else:
+                self._send(200, 'application/json; charset=utf-8', json.dumps(entries, ensure_ascii=False).encode())
+        
+        else:
+            self._send(404, 'text/plain; charset=utf-8', b'Not Found')
+    
+    def _send_json(self, status: int, payload: Dict, headers: Dict = None):
+        self._send(
+            status,
+            'application/json; charset=utf-8',
+            json.dumps(payload, ensure_ascii=False).encode(),
+            {'Access-Control-Allow-Origin': '*', **(headers or {})}
+        )
+    
+    def _send_failure(self, e: Exception):
+        """Výjimka agenta jako odpověď - vyčerpaný pool spojení 503 (jako /products), jinak 500"""
+        if isinstance(e, TimeoutError):
+            self._send_json(503, {'error': str(e)}, {'Retry-After': '1'})
+            return
+        print(f"⚠️  Dotaz selhal: {e!r}")
+        self._send_json(500, {'error': f'Dotaz selhal: {e}'})
+    
+    def _read_json(self):
+        """Tělo požadavku jako JSON; při chybě odešle 4xx a vrátí None"""
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self._send_json(411, {'error': 'Chybí Content-Length'})
+            self.close_connection = True
+            return None
+        if int(length) > self.max_body:
+            # Tělo se nečte - spojení se po odpovědi zavře
+            self._send_json(413, {'error': f'Tělo požadavku je větší než {self.max_body} B'})
+            self.close_connection = True
+            return None
+        try:
+            return json.loads(self.rfile.read(int(length)) or b'null')
+        except ValueError:
+            self._send_json(400, {'error': 'Neplatný JSON'})
+            return None
+    
+    def do_POST(self):
+        if urllib.parse.urlparse(self.path).path != '/ask/batch':
+            self._send(404, 'text/plain; charset=utf-8', b'Not Found')
+            return
+        
+        payload = self._read_json()
+        if payload is None:
+            return
+        # Pole otázek, nebo objekt {"questions": [...], "k": 5, "threshold": 10}
+        options = payload if isinstance(payload, dict) else {'questions': payload}
+        questions = options.get('questions')
+        if not isinstance(questions, list) or not questions or \
+                not all(isinstance(q, str) for q in questions):
+            self._send_json(400, {'error': 'Očekávám neprázdné pole otázek (řetězců)'})
+            return
+        if len(questions) > self.max_batch:
+            self._send_json(400, {'error': f'Nejvýš {self.max_batch} otázek v jedné dávce'})
+            return
+        try:
+            top_k, threshold = self._ask_options(options.get('k'), options.get('threshold'))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        
+        try:
+            result = agent.process_batch(questions, top_k=top_k, low_stock_threshold=threshold)
+        except Exception as e:
+            self._send_failure(e)
+            return
+        self._send_json(200, result)
     
     def log_message(self, format, *args):
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {format % args}")
 
 
-def run_server(port=8000):
-    """Spustí HTTP server"""
-    server = HTTPServer(('0.0.0.0', port), AgentHTTPHandler)
+class AgentHTTPServer(HTTPServer):
+    """HTTP server s omezeným počtem pracovních vláken a frontou požadavků
+    
+    Místo ve frontě i pracovní vlákno drží jen rozpracovaný požadavek, ne
+    otevřené spojení. Spojení, které na požadavek teprve čeká (nové nebo
+    nečinné keep-alive), hlídá selektor ve vlákně nečinných spojení a do
+    fronty ho pošle, až klient něco pošle; po keep_alive s nečinnosti ho
+    zavře. Když jsou všechna vlákna obsazená a fronta plná, požadavek
+    dostane hned 503 místo čekání - pomalý dotaz ani nečinný klient tak
+    neblokují ostatní klienty.
+    """
+    
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, workers: int = 8, max_queue: int = 32,
+                 reuse_port: bool = False, keep_alive: float = 5.0):
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.keep_alive = keep_alive
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='agent-http')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.idle_connections = 0
+        self.stopping = False
+        # Spojení k zaparkování - do selektoru je registruje jen vlákno nečinných spojení
+        self._parking = deque()
+        self._idle = selectors.DefaultSelector()
+        self._wakeup, self._wakeup_signal = socket.socketpair()
+        self._idle.register(self._wakeup, selectors.EVENT_READ)
+        self._idle_closed = False
+        self._idle_thread = threading.Thread(target=self._watch_idle, name='agent-http-idle', daemon=True)
+        self._idle_thread.start()
+    
+    def server_bind(self):
+        if self.reuse_port:
+            # Víc procesů naslouchá na stejném portu, jádro mezi ně rozděluje spojení
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+    
+    def process_request(self, request, client_address):
+        # Nové spojení čeká na první požadavek mimo pracovní vlákna
+        self._park(request, client_address, None)
+    
+    def _park(self, request, client_address, handler):
+        if self._idle_closed:
+            self._close(request, handler)
+            return
+        self._parking.append((request, client_address, handler))
+        self._wake()
+    
+    def _wake(self):
+        try:
+            self._wakeup_signal.send(b'\0')
+        except OSError:
+            pass  # Buffer je plný - vlákno už je probuzené
+    
+    def _watch_idle(self):
+        """Vlákno nečinných spojení - připravený požadavek pošle do fronty, staré spojení zavře"""
+        while not self._idle_closed:
+            while self._parking:
+                request, client_address, handler = self._parking.popleft()
+                try:
+                    self._idle.register(request, selectors.EVENT_READ,
+                                        (client_address, handler, time.monotonic() + self.keep_alive))
+                except (ValueError, OSError):
+                    self._close(request, handler)
+            for key, _ in self._idle.select(timeout=0.5):
+                if key.fileobj is self._wakeup:
+                    try:
+                        self._wakeup.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                self._idle.unregister(key.fileobj)
+                client_address, handler, _ = key.data
+                self._dispatch(key.fileobj, client_address, handler)
+            now = time.monotonic()
+            for key in list(self._idle.get_map().values()):
+                if key.data is not None and (self.stopping or key.data[2] <= now):
+                    self._idle.unregister(key.fileobj)
+                    self._close(key.fileobj, key.data[1])
+            self.idle_connections = len(self._idle.get_map()) - 1
+        for key in list(self._idle.get_map().values()):
+            if key.data is not None:
+                self._close(key.fileobj, key.data[1])
+        self.idle_connections = 0
+    
+    def _dispatch(self, request, client_address, handler):
+        """Požadavek do fronty pracovních vláken, nebo 503 když je plná"""
+        if self.stopping or not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            self._reject(request)
+            self._close(request, handler)
+            return
+        try:
+            self.executor.submit(self._process_in_worker, request, client_address, handler)
+        except RuntimeError:
+            # Server se zavírá a executor už nebere práci
+            self._slots.release()
+            self._close(request, handler)
+    
+    def _process_in_worker(self, request, client_address, handler):
+        """Jeden požadavek - na novém spojení, nebo další na keep-alive spojení"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            if handler is None:
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                handler.handle()
+                handler.finish()
+        except Exception:
+            self.handle_error(request, client_address)
+            handler = None
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+        if handler is None or handler.close_connection or self.stopping:
+            self._close(request, handler)
+        elif self._pipelined(handler):
+            # Další požadavek už je v bufferu - selektor by o něm nevěděl
+            self._dispatch(request, client_address, handler)
+        else:
+            self._park(request, client_address, handler)
+    
+    @staticmethod
+    def _pipelined(handler) -> bool:
+        """Je v bufferu rfile už další požadavek? Neblokuje."""
+        try:
+            handler.connection.settimeout(0)
+            try:
+                return bool(handler.rfile.peek(1))
+            finally:
+                handler.connection.settimeout(handler.timeout)
+        except OSError:
+            return False
+    
+    def _close(self, request, handler):
+        if handler is not None and not handler.close_connection:
+            handler.close_connection = True
+            try:
+                handler.finish()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+    
+    def _reject(self, request):
+        body = json.dumps({'error': 'Server je přetížený, zkuste to znovu'}, ensure_ascii=False).encode()
+        head = (
+            'HTTP/1.1 503 Service Unavailable\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Retry-After: 1\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode()
+        try:
+            request.sendall(head + body)
+        except OSError:
+            pass
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'idle_connections': self.idle_connections,
+                'rejected': self.rejected
+            }
+    
+    def graceful_shutdown(self):
+        """Přestane přijímat spojení a nechá doběhnout rozpracované požadavky"""
+        self.stopping = True
+        self._wake()
+        self.shutdown()
+    
+    def server_close(self):
+        super().server_close()
+        self._idle_closed = True
+        self._wake()
+        self._idle_thread.join()
+        self.executor.shutdown(wait=True)
+        # Co dokončilo až po zastavení vlákna nečinných spojení
+        while self._parking:
+            request, _, handler = self._parking.popleft()
+            self._close(request, handler)
+        self._idle.close()
+        self._wakeup.close()
+        self._wakeup_signal.close()
+
+
+class Supervisor:
+    """Režim více procesů - N pracovních procesů na jednom portu
+    
+    Každý proces má vlastní naslouchací socket se SO_REUSEPORT a jádro mezi
+    ně rozděluje nová spojení, takže GIL jednoho procesu neomezuje celý
+    server. Katalog procesy jen čtou; stránky SQLite souboru (mmap) sdílí
+    přes page cache. Spadlý proces supervisor spustí znovu.
+    """
+    
+    # Proces, který spadne dřív než za QUICK_EXIT s, se spouští s rostoucí pauzou
+    QUICK_EXIT = 5.0
+    MAX_RESTART_DELAY = 30.0
+    
+    def __init__(self, port: int, processes: int, workers: int, max_queue: int):
+        self.port = port
+        self.processes = processes
+        self.workers = workers
+        self.max_queue = max_queue
+        self.children = {}  # pid -> (pořadí procesu, čas spuštění)
+        self.quick_exits = {}  # pořadí procesu -> počet pádů hned po startu za sebou
+        self.restarts = 0
+        self.stopping = False
+    
+    def _spawn(self, worker: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                _serve_worker(self.port, worker, self.workers, self.max_queue)
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                # Bez úklidu rodiče (atexit, buffery) - ten patří supervisoru
+                sys.stdout.flush()
+                os._exit(code)
+        self.children[pid] = (worker, time.monotonic())
+    
+    def stop(self, signum=None, frame=None):
+        """Pošle procesům SIGTERM - dokončí rozpracované požadavky a skončí"""
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for worker in range(self.processes):
+            self._spawn(worker)
+        
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker, started = self.children.pop(pid, (None, 0))
+            if worker is None or self.stopping:
+                continue
+            
+            code = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - started < self.QUICK_EXIT:
+                self.quick_exits[worker] = self.quick_exits.get(worker, 0) + 1
+            else:
+                self.quick_exits[worker] = 0
+            delay = min(self.MAX_RESTART_DELAY, 0.5 * 2 ** self.quick_exits[worker]) if self.quick_exits[worker] else 0
+            print(f"⚠️  Proces {worker} (pid {pid}) skončil s kódem {code}, "
+                  f"spouštím znovu{f' za {delay:.0f} s' if delay else ''}")
+            restart_at = time.monotonic() + delay
+            while not self.stopping and time.monotonic() < restart_at:
+                time.sleep(0.1)
+            if not self.stopping:
+                self.restarts += 1
+                self._spawn(worker)
+
+
+def _serve(server: AgentHTTPServer):
+    """Obslouží požadavky do Ctrl+C / SIGTERM, pak počká na rozpracované a uklidí"""
+    AgentHTTPHandler.index_page()  # stránka připravená před prvním požadavkem
+    # Fork ještě před vlákny serveru - vlákna agenta (log dotazů) jsou zatím nečinná
+    agent.analytics.start()
+    
+    # Docker při zastavení posílá SIGTERM - ukončit stejně jako Ctrl+C
+    def handle_sigterm(signum, frame):
+        threading.Thread(target=server.graceful_shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stopping = True
+    finally:
+        # Počká na rozpracované požadavky a zavře spojení do databáze
+        server.server_close()
+        agent.close()
+
+
+def _serve_worker(port: int, worker: int, workers: int, max_queue: int):
+    """Pracovní proces: vlastní agent (katalog jen pro čtení) a socket se SO_REUSEPORT"""
+    global agent
+    agent = AIAgent(mode=mode, worker=worker)
+    server = AgentHTTPServer(('0.0.0.0', port), AgentHTTPHandler, workers=workers,
+                             max_queue=max_queue, reuse_port=True)
+    print(f"🧩 Proces {worker} (pid {os.getpid()}) přijímá spojení")
+    _serve(server)
+
+
+def run_server(port=8000, workers: int = None, max_queue: int = None, processes: int = None):
+    """Spustí HTTP server (souběžné zpracování s omezenou frontou)
+    
+    processes > 1 (SERVER_PROCESSES) - víc procesů na stejném portu pod supervisorem.
+    """
+    workers = workers or int(os.getenv('SERVER_WORKERS', '8'))
+    max_queue = max_queue if max_queue is not None else int(os.getenv('SERVER_MAX_QUEUE', '32'))
+    processes = processes or int(os.getenv('SERVER_PROCESSES', '1'))
+    if processes > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        print("⚠️  Více procesů vyžaduje fork a SO_REUSEPORT (Linux), běží jeden proces")
+        processes = 1
+    
+    if processes > 1:
+        # Obsazený port se pozná hned, ne až na opakovaně padajících procesech
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Jako HTTPServer (allow_reuse_address) - spojení v TIME_WAIT port neblokují
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        try:
+            probe.bind(('0.0.0.0', port))
+        finally:
+            probe.close()
+        server = None
+    else:
+        server = AgentHTTPServer(('0.0.0.0', port), AgentHTTPHandler, workers=workers, max_queue=max_queue)
+    
     print(f"\n{'='*60}")
     print(f"🤖 AI Agent běží!")
     print(f"{'='*60}")
     print(f"\n🌐 Web rozhraní: http://localhost:{port}")
-    print(f"📡 API endpoint: http://localhost:{port}/ask?q=<otázka>")
+    print(f"📡 API endpoint: http://localhost:{port}/ask?q=<otázka>[&k=5][&threshold=10]")
+    print(f"📶 Streamování (SSE): http://localhost:{port}/ask/stream?q=<otázka>")
+    print(f"📦 Dávka otázek: POST http://localhost:{port}/ask/batch  [\"otázka\", ...]")
+    print(f"🔎 Produkty: http://localhost:{port}/products?category=<kategorie>&order=price&direction=desc")
+    print(f"📈 Statistiky: http://localhost:{port}/stats, Prometheus: http://localhost:{port}/metrics")
     print(f"🔧 Režim: {agent.mode.upper()}")
+    print(f"⚙️  Vlákna: {workers}, fronta: {max_queue}" +
+          (f", procesy: {processes} (statistiky jsou za proces)" if processes > 1 else ''))
     print(f"\nStiskněte Ctrl+C pro zastavení\n")
     
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        print("\n\n👋 Agent ukončen")
+    if server is not None:
+        _serve(server)
+    else:
+        # Databázi připravil agent tohoto procesu při importu; jeho spojení
+        # se před fork zavřou a každý pracovní proces si otevře vlastní
+        agent.close()
+        supervisor = Supervisor(port, processes, workers, max_queue)
+        supervisor.run()
+        print(f"🔁 Restartů procesů: {supervisor.restarts}")
+    print("\n\n👋 Agent ukončen")
 
 
 if __name__ == "__main__":
-    run_server(8000)
+    run_server(int(os.getenv('SERVER_PORT', '8000')))
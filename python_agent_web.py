@@ -4,93 +4,376 @@ AI Agent s Databází a LLM - Verze pro Docker s Web API
 
 import sqlite3
 import json
+import heapq
+import operator
+import bisect
+import hashlib
+import gzip
 from datetime import datetime
 from typing import Dict, List, Any
+from contextlib import contextmanager
+import threading
+import queue
+import time
+import itertools
+from collections import deque, namedtuple
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+import selectors
+import signal
+import socket
 import urllib.parse
 import os
 
+try:
+    import brotli
+except ImportError:
+    brotli = None  # stránka se pak předkomprimuje jen gzipem
+
+
+class Metrics:
+    """Histogramy časů fází dotazu a čítače - export v textovém formátu Prometheus
+    
+    Měření je jen perf_counter + bisect pod zámkem; METRICS_ENABLED=0 ho vypne úplně.
+    """
+    
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+               0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}  # fáze -> [počty v koších..., +Inf, součet]
+        self._counters = {}    # (název, štítky) -> hodnota
+    
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        idx = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = [0] * (len(self.BUCKETS) + 1) + [0.0]
+            hist[idx] += 1
+            hist[-1] += seconds
+    
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        if not self.enabled:
+            return
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    @staticmethod
+    def _labels(pairs) -> str:
+        return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+    
+    def render(self, gauges: Dict = None) -> str:
+        """Text pro /metrics; gauges - vnořený slovník provozních čítačů"""
+        lines = []
+        with self._lock:
+            histograms = {stage: list(hist) for stage, hist in self._histograms.items()}
+            counters = dict(self._counters)
+        
+        if histograms:
+            lines.append('# HELP agent_stage_duration_seconds Doba fází zpracování dotazu')
+            lines.append('# TYPE agent_stage_duration_seconds histogram')
+            for stage, hist in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS + ('+Inf',), hist[:-1]):
+                    cumulative += count
+                    lines.append(f'agent_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'agent_stage_duration_seconds_sum{{stage="{stage}"}} {hist[-1]:.6f}')
+                lines.append(f'agent_stage_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+        
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{self._labels(labels)} {value}')
+        
+        def walk(prefix: str, node: Dict):
+            for key, value in node.items():
+                name = f'{prefix}_{key}'
+                if isinstance(value, dict):
+                    walk(name, value)
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'# TYPE {name} gauge')
+                    lines.append(f'{name} {value}')
+        walk('agent', gauges or {})
+        
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics(enabled=os.getenv('METRICS_ENABLED', '1') != '0')
+
+
+class ConnectionPool:
+    """Omezený pool SQLite spojení sdílený mezi vlákny"""
+    
+    def __init__(self, db_path: str, max_size: int = 4, timeout: float = 5.0,
+                 cached_statements: int = 128):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._created = 0
+        
+        # Čítače pro diagnostiku poolu
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Otevře nové spojení s vyladěnými pragmami"""
+        # check_same_thread=False - spojení putuje mezi vlákny, ale vždy ho drží jen jedno
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA mmap_size=268435456')
+        conn.execute('PRAGMA cache_size=-16000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Vypůjčí spojení z poolu (případně založí nové nebo počká)"""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+                self.misses += 1
+        
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        # Pool je vyčerpaný - čekáme na vrácení spojení
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Pool SQLite spojení je vyčerpaný (max {self.max_size})")
+        finally:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+        with self._lock:
+            self.hits += 1
+        return conn
+    
+    def release(self, conn: sqlite3.Connection):
+        """Vrátí spojení do poolu"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Context manager: with pool.connection() as conn: ..."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def close(self):
+        """Zavře všechna nevypůjčená spojení"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def stats(self) -> Dict:
+        """Čítače poolu - hit/miss a čekání na volné spojení"""
+        with self._lock:
+            return {
+                'size': self._created,
+                'max_size': self.max_size,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 3)
+            }
+
+
+class Product(tuple):
+    """Řádek tabulky products - n-tice s pojmenovanými sloupci místo slovníku
+    
+    Klíče nejsou v každém řádku znovu, sloupce se čtou atributem (p.price).
+    Kvůli kompatibilitě funguje i p['price'] a to_dict() vrací stejný
+    slovník, jaký dřív vracel DatabaseTool.query().
+    """
+    
+    __slots__ = ()
+    _types = {}  # sloupce -> podtřída s atributy (jedna pro každé schéma)
+    
+    @classmethod
+    def for_columns(cls, columns) -> type:
+        columns = tuple(columns)
+        product_type = cls._types.get(columns)
+        if product_type is None:
+            product_type = type('Product', (namedtuple('Product', columns), cls), {'__slots__': ()})
+            cls._types[columns] = product_type
+        return product_type
+    
+    @classmethod
+    def row_factory(cls, description):
+        """row_factory pro sqlite3 kurzor s daným popisem sloupců"""
+        make = cls.for_columns(desc[0] for desc in description)._make
+        return lambda cursor, row: make(row)
+    
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self._fields else default
+    
+    def to_dict(self) -> Dict:
+        return dict(zip(self._fields, self))
+
 
 class DatabaseTool:
     """Nástroj pro práci s databází"""
     
-    def __init__(self, db_path: str = "./data/products.db"):
+    def __init__(self, db_path: str = "./data/products.db", pool_size: int = 4):
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.pool = ConnectionPool(db_path, max_size=pool_size)
         self._init_database()
     
     def _init_database(self):
         """Inicializace databáze s ukázkovými daty"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    stock INTEGER NOT NULL,
+                    description TEXT
+                )
+            ''')
         
+            cursor.execute('SELECT COUNT(*) FROM products')
+            if cursor.fetchone()[0] == 0:
+                products = [
+                    ('Notebook Dell XPS', 'Elektronika', 29990, 5, 'Výkonný ultrabook'),
+                    ('iPhone 15 Pro', 'Elektronika', 34990, 8, 'Nejnovější iPhone'),
+                    ('Samsung Galaxy S24', 'Elektronika', 24990, 12, 'Android smartphone'),
+                    ('Sony Sluchátka', 'Elektronika', 9990, 15, 'Bezdrátová sluchátka'),
+                    ('iPad Pro', 'Elektronika', 35990, 6, 'Tablet s M2 chipem'),
+                    ('Zimní bunda', 'Oblečení', 5990, 20, 'Zateplená bunda'),
+                    ('Běžecké boty Nike', 'Oblečení', 3490, 25, 'Sportovní obuv'),
+                    ('Mikina Adidas', 'Oblečení', 1490, 30, 'Bavlněná mikina'),
+                    ('Bio káva', 'Potraviny', 249, 50, 'Zrnková káva 250g'),
+                    ('Organický med', 'Potraviny', 189, 40, 'Lesní med 500g'),
+                    ('Čokoláda Lindt', 'Potraviny', 59, 100, 'Hořká čokoláda'),
+                    ('Dyson vysavač', 'Domácnost', 18990, 7, 'Bezdrátový vysavač'),
+                ]
+                cursor.executemany(
+                    'INSERT INTO products (name, category, price, stock, description) VALUES (?, ?, ?, ?, ?)',
+                    products
+                )
+            
+            self._create_indexes(cursor)
+            self._install_change_tracking(cursor)
+            conn.commit()
+    
+    def _create_indexes(self, cursor: sqlite3.Cursor):
+        """Indexy pro top-K a prahové dotazy (cena, zásoby, kategorie + cena)"""
+        # price DESC - shody v ceně pak vycházejí podle id jako u stabilního řazení
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_price ON products(price DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_stock ON products(stock)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_category_price ON products(category, price DESC)')
+    
+    def _install_change_tracking(self, cursor: sqlite3.Cursor):
+        """Počítadlo změn katalogu udržované triggery (pro invalidaci cache)"""
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                price REAL NOT NULL,
-                stock INTEGER NOT NULL,
-                description TEXT
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
             )
         ''')
-        
-        cursor.execute('SELECT COUNT(*) FROM products')
-        if cursor.fetchone()[0] == 0:
-            products = [
-                ('Notebook Dell XPS', 'Elektronika', 29990, 5, 'Výkonný ultrabook'),
-                ('iPhone 15 Pro', 'Elektronika', 34990, 8, 'Nejnovější iPhone'),
-                ('Samsung Galaxy S24', 'Elektronika', 24990, 12, 'Android smartphone'),
-                ('Sony Sluchátka', 'Elektronika', 9990, 15, 'Bezdrátová sluchátka'),
-                ('iPad Pro', 'Elektronika', 35990, 6, 'Tablet s M2 chipem'),
-                ('Zimní bunda', 'Oblečení', 5990, 20, 'Zateplená bunda'),
-                ('Běžecké boty Nike', 'Oblečení', 3490, 25, 'Sportovní obuv'),
-                ('Mikina Adidas', 'Oblečení', 1490, 30, 'Bavlněná mikina'),
-                ('Bio káva', 'Potraviny', 249, 50, 'Zrnková káva 250g'),
-                ('Organický med', 'Potraviny', 189, 40, 'Lesní med 500g'),
-                ('Čokoláda Lindt', 'Potraviny', 59, 100, 'Hořká čokoláda'),
-                ('Dyson vysavač', 'Domácnost', 18990, 7, 'Bezdrátový vysavač'),
-            ]
-            cursor.executemany(
-                'INSERT INTO products (name, category, price, stock, description) VALUES (?, ?, ?, ?, ?)',
-                products
-            )
-        
-        conn.commit()
-        conn.close()
+        cursor.execute('INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)')
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS products_version_{event.lower()}
+                AFTER {event} ON products
+                BEGIN
+                    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                END
+            ''')
     
-    def query(self, sql: str = None) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if sql is None:
-            cursor.execute('SELECT * FROM products')
-        else:
+    def data_version(self) -> int:
+        """Aktuální verze dat katalogu - mění se s každou změnou tabulky products"""
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()[0]
+    
+    def query(self, sql: str = None) -> List[Product]:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            if sql is None:
+                # Katalog jako Product n-tice; vlastní SQL dál jako slovníky
+                cursor.execute('SELECT * FROM products')
+                cursor.row_factory = Product.row_factory(cursor.description)
+                return cursor.fetchall()
+            
             cursor.execute(sql)
+            columns = [desc[0] for desc in cursor.description]
+            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
         
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
         return results
     
     def get_statistics(self) -> Dict:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as count,
-                AVG(price) as avg_price,
-                MIN(price) as min_price,
-                MAX(price) as max_price,
-                SUM(stock) as total_stock,
-                SUM(price * stock) as total_value
-            FROM products
-        ''')
-        
-        stats = cursor.fetchone()
-        conn.close()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT 
+                    COUNT(*) as count,
+                    AVG(price) as avg_price,
+                    MIN(price) as min_price,
+                    MAX(price) as max_price,
+                    SUM(stock) as total_stock,
+                    SUM(price * stock) as total_value
+                FROM products
+            ''')
+            
+            stats = cursor.fetchone()
         
         return {
             'total_products': stats[0],
@@ -100,42 +383,111 @@ class DatabaseTool:
             'total_stock': stats[4],
             'total_value': round(stats[5], 2) if stats[5] else 0
         }
+    
+    def get_category_statistics(self) -> Dict:
+        """Statistiky podle kategorií spočítané v SQL (GROUP BY)
+        
+        Vrací stejný tvar jako StatisticsTool.calculate_by_category.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT category, COUNT(*), SUM(price * stock), AVG(price), MIN(id) AS first_id
+                FROM products
+                GROUP BY category
+                ORDER BY first_id
+            ''')
+            categories = {
+                cat: {
+                    'count': count,
+                    'total_value': total_value,
+                    'avg_price': round(avg_price, 2),
+                    'products': []
+                }
+                for cat, count, total_value, avg_price, _ in cursor.fetchall()
+            }
+            
+            # Názvy produktů v pořadí podle id - bez stavby slovníků pro řádky
+            cursor.execute('SELECT category, name FROM products ORDER BY id')
+            for cat, name in cursor:
+                categories[cat]['products'].append(name)
+        
+        return categories
+    
+    def _fetch_products(self, sql: str, params: tuple = ()) -> List[Product]:
+        with self.pool.connection() as conn:
+            cursor = conn.execute(sql, params)
+            cursor.row_factory = Product.row_factory(cursor.description)
+            return cursor.fetchall()
+    
+    def find_low_stock(self, threshold: int = 10) -> List[Product]:
+        """Produkty se zásobou pod prahem - přes index na stock"""
+        # Bez ORDER BY id v SQL, jinak planner zvolí průchod celou tabulkou
+        rows = self._fetch_products('SELECT * FROM products WHERE stock < ?', (threshold,))
+        rows.sort(key=operator.attrgetter('id'))
+        return rows
+    
+    def find_expensive(self, limit: int = 5, category: str = None) -> List[Product]:
+        """Top-K nejdražších produktů - přes index na price (category, price)"""
+        if category is None:
+            return self._fetch_products(
+                'SELECT * FROM products ORDER BY price DESC, id LIMIT ?',
+                (limit,)
+            )
+        return self._fetch_products(
+            'SELECT * FROM products WHERE category = ? ORDER BY price DESC, id LIMIT ?',
+            (category, limit)
+        )
+    
+    def pool_stats(self) -> Dict:
+        """Vrátí čítače poolu spojení"""
+        return self.pool.stats()
+    
+    def close(self):
+        """Uzavře spojení v poolu"""
+        self.pool.close()
 
 
 class StatisticsTool:
     """Nástroj pro výpočty"""
     
     @staticmethod
-    def calculate_by_category(products: List[Dict]) -> Dict:
+    def calculate_by_category(products: List[Product]) -> Dict:
+        # Jeden průchod - průměry z průběžných součtů, ne přefiltrováním seznamu
         categories = {}
+        price_sums = {}
+        
         for p in products:
-            cat = p['category']
-            if cat not in categories:
-                categories[cat] = {
+            cat = p.category
+            info = categories.get(cat)
+            if info is None:
+                info = categories[cat] = {
                     'count': 0,
                     'total_value': 0,
                     'avg_price': 0,
                     'products': []
                 }
-            categories[cat]['count'] += 1
-            categories[cat]['total_value'] += p['price'] * p['stock']
-            categories[cat]['products'].append(p['name'])
-        
-        for cat in categories:
-            cat_products = [p for p in products if p['category'] == cat]
-            categories[cat]['avg_price'] = round(
-                sum(p['price'] for p in cat_products) / len(cat_products), 2
-            )
+                price_sums[cat] = 0
+            
+            info['count'] += 1
+            info['total_value'] += p.price * p.stock
+            info['products'].append(p.name)
+            price_sums[cat] += p.price
+        
+        for cat, info in categories.items():
+            info['avg_price'] = round(price_sums[cat] / info['count'], 2)
         
         return categories
     
     @staticmethod
-    def find_low_stock(products: List[Dict], threshold: int = 10) -> List[Dict]:
-        return [p for p in products if p['stock'] < threshold]
+    def find_low_stock(products: List[Product], threshold: int = 10) -> List[Product]:
+        return [p for p in products if p.stock < threshold]
     
     @staticmethod
-    def find_expensive(products: List[Dict], limit: int = 5) -> List[Dict]:
-        return sorted(products, key=lambda x: x['price'], reverse=True)[:limit]
+    def find_expensive(products: List[Product], limit: int = 5) -> List[Product]:
+        # Částečné řazení haldou - O(n log k) místo řazení celého seznamu
+        return heapq.nlargest(limit, products, key=operator.attrgetter('price'))
 
 
 class LLMSimulator:
@@ -165,18 +517,19 @@ class LLMSimulator:
         elif 'nízk' in question_lower and 'zásob' in question_lower:
             low_stock = data.get('low_stock', [])
             if not low_stock:
-                return "Všechny produkty mají dostatek zásob (10+ kusů)."
+                threshold = data.get('low_stock_threshold', 10)
+                return f"Všechny produkty mají dostatek zásob ({threshold}+ kusů)."
             response = f"Produkty s nízkými zásobami ({len(low_stock)} ks):\n"
             for p in low_stock[:5]:
-                response += f"- {p['name']}: {p['stock']} ks\n"
+                response += f"- {p.name}: {p.stock} ks\n"
             return response
         
         elif 'nejdražší' in question_lower:
             expensive = data.get('expensive', [])
             if expensive:
                 top = expensive[0]
-                return f"Nejdražším produktem je {top['name']} za {top['price']:,.0f} Kč. "\
-                       f"Máme ho {top['stock']} kusů na skladě."
+                return f"Nejdražším produktem je {top.name} za {top.price:,.0f} Kč. "\
+                       f"Máme ho {top.stock} kusů na skladě."
             return "Nenalezeny žádné produkty."
         
         else:
@@ -186,32 +539,225 @@ class LLMSimulator:
                    f"Můžete se zeptat na kategorie, ceny, zásoby nebo konkrétní produkty."
 
 
+class SnapshotCache:
+    """Materializovaný snímek agregací katalogu, invalidovaný verzí dat"""
+    
+    def __init__(self, db_tool: DatabaseTool, stats_tool: StatisticsTool):
+        self.db_tool = db_tool
+        self.stats_tool = stats_tool
+        self._lock = threading.Lock()
+        self._entry = None  # (verze, snímek) - měněno atomicky
+        self.hits = 0
+        self.rebuilds = 0
+    
+    def _build(self, version: int) -> Dict:
+        snapshot = {'version': version}
+        stages = [
+            ('products', 'db_fetch', self.db_tool.query),
+            ('stats', 'statistics', self.db_tool.get_statistics),
+            ('category_stats', 'category_aggregation',
+             lambda: self.stats_tool.calculate_by_category(snapshot['products'])),
+            ('low_stock', 'low_stock', lambda: self.stats_tool.find_low_stock(snapshot['products'])),
+            ('expensive', 'top_k', lambda: self.stats_tool.find_expensive(snapshot['products']))
+        ]
+        for key, stage, compute in stages:
+            start = time.perf_counter()
+            snapshot[key] = compute()
+            METRICS.observe(stage, time.perf_counter() - start)
+        return snapshot
+    
+    def get(self) -> Dict:
+        """Vrátí snímek pro aktuální verzi dat, při změně ho přepočítá"""
+        version = self.db_tool.data_version()
+        entry = self._entry
+        if entry is not None and entry[0] == version:
+            with self._lock:
+                self.hits += 1
+            return entry[1]
+        
+        with self._lock:
+            # Jiné vlákno mohlo snímek mezitím přepočítat
+            entry = self._entry
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            snapshot = self._build(version)
+            self._entry = (version, snapshot)
+            self.rebuilds += 1
+            return snapshot
+    
+    def invalidate(self):
+        """Zahodí snímek - další dotaz ho přepočítá"""
+        self._entry = None
+    
+    def stats(self) -> Dict:
+        entry = self._entry
+        return {
+            'version': entry[0] if entry else None,
+            'hits': self.hits,
+            'rebuilds': self.rebuilds
+        }
+
+
+class QueryLog:
+    """Ohraničený log dotazů - kruhový buffer v paměti + JSONL soubor
+    
+    Zápis na disk dělá vlákno na pozadí po dávkách, požadavek jen vloží
+    záznam do fronty. Když je fronta plná, záznam se na disk nezapíše
+    (započítá se do dropped), v paměti ale zůstane.
+    """
+    
+    def __init__(self, path: str = None, capacity: int = 1000, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_bytes: int = 10 * 1024 * 1024,
+                 rotate_interval: float = 24 * 3600, backups: int = 5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        
+        self._recent = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=capacity * 10)
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        
+        self._thread = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._writer, name='query-log-writer', daemon=True)
+            self._thread.start()
+    
+    def append(self, entry: Dict):
+        with self._lock:
+            self._recent.append(entry)
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+    
+    def tail(self, n: int = 50) -> List[Dict]:
+        """Posledních n záznamů (nejnovější na konci)"""
+        with self._lock:
+            if n >= len(self._recent):
+                return list(self._recent)
+            return list(itertools.islice(self._recent, len(self._recent) - n, None))
+    
+    def __len__(self) -> int:
+        return len(self._recent)
+    
+    def _open(self):
+        f = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+        return f
+    
+    def _rotate(self, f):
+        """Přejmenuje log na .1 (starší posune na .2 ...) a otevře nový"""
+        f.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        return self._open()
+    
+    def _writer(self):
+        f = self._open()
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            if None in batch:
+                running = False
+                batch = [entry for entry in batch if entry is not None]
+            if batch:
+                f.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in batch))
+                f.flush()
+                self.written += len(batch)
+            
+            if f.tell() >= self.max_bytes or time.time() - self._opened_at >= self.rotate_interval:
+                if f.tell() > 0:
+                    f = self._rotate(f)
+        f.close()
+    
+    def close(self):
+        """Zapíše zbytek fronty a ukončí zapisovací vlákno"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_memory': len(self._recent),
+                'capacity': self._recent.maxlen,
+                'pending': self._queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'rotations': self.rotations,
+                'path': self.path
+            }
+
+
 class AIAgent:
     """Hlavní AI Agent"""
     
     def __init__(self):
         self.db_tool = DatabaseTool()
         self.stats_tool = StatisticsTool()
+        self.snapshot_cache = SnapshotCache(self.db_tool, self.stats_tool)
         self.llm = LLMSimulator()
-        self.query_log = []
+        self.query_log = QueryLog(
+            path=os.getenv('QUERY_LOG_PATH', './data/query_log.jsonl') or None,
+            capacity=int(os.getenv('QUERY_LOG_CAPACITY', '1000'))
+        )
     
-    def process_query(self, question: str) -> Dict:
-        products = self.db_tool.query()
-        stats = self.db_tool.get_statistics()
+    def process_query(self, question: str, top_k: int = None,
+                      low_stock_threshold: int = None) -> Dict:
+        request_start = time.perf_counter()
         
-        category_stats = self.stats_tool.calculate_by_category(products)
-        low_stock = self.stats_tool.find_low_stock(products)
-        expensive = self.stats_tool.find_expensive(products)
+        # Agregace se přepočítávají jen při změně katalogu
+        snapshot = self.snapshot_cache.get()
+        stats = snapshot['stats']
         
         data = {
-            'products': products,
-            'category_stats': category_stats,
-            'low_stock': low_stock,
-            'expensive': expensive
+            'products': snapshot['products'],
+            'category_stats': snapshot['category_stats'],
+            'low_stock': snapshot['low_stock'],
+            'expensive': snapshot['expensive']
         }
         
+        # Nestandardní K / práh - indexovaný dotaz místo výchozího snímku
+        if top_k is not None:
+            data['expensive'] = self.db_tool.find_expensive(top_k)
+        if low_stock_threshold is not None:
+            data['low_stock'] = self.db_tool.find_low_stock(low_stock_threshold)
+            data['low_stock_threshold'] = low_stock_threshold
+        
+        start = time.perf_counter()
         response = self.llm.generate_response(question, data, stats)
+        METRICS.observe('llm', time.perf_counter() - start)
         
+        start = time.perf_counter()
         log_entry = {
             'timestamp': datetime.now().isoformat(),
             'question': question,
@@ -219,137 +765,511 @@ class AIAgent:
         }
         self.query_log.append(log_entry)
         
+        end = time.perf_counter()
+        METRICS.observe('logging', end - start)
+        METRICS.observe('total', end - request_start)
+        METRICS.inc('agent_requests_total')
+        
         return {
             'question': question,
             'answer': response,
             'timestamp': log_entry['timestamp'],
-            'stats': stats
+            'stats': stats,
+            'data_version': snapshot['version']
         }
+    
+    def runtime_stats(self, server=None) -> Dict:
+        """Provozní čítače - snímky, pool spojení, log, server"""
+        result = {
+            'snapshot_cache': self.snapshot_cache.stats(),
+            'db_pool': self.db_tool.pool_stats(),
+            'query_log': self.query_log.stats()
+        }
+        if server is not None:
+            result['server'] = server.stats()
+        return result
 
 
 # Globální instance agenta
 agent = AIAgent()
 
 
+INDEX_HTML = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>AI Agent s Databází</title>
+        <meta charset="utf-8">
+        <style>
+            body { font-family: Arial; max-width: 800px; margin: 50px auto; padding: 20px; }
+            h1 { color: #2c3e50; }
+            .container { background: #f8f9fa; padding: 20px; border-radius: 10px; }
+            input[type="text"] { width: 70%; padding: 10px; font-size: 16px; }
+            button { padding: 10px 20px; font-size: 16px; background: #3498db; color: white; border: none; cursor: pointer; }
+            button:hover { background: #2980b9; }
+            .response { margin-top: 20px; padding: 15px; background: white; border-left: 4px solid #3498db; }
+            .examples { margin: 20px 0; }
+            .examples button { margin: 5px; background: #95a5a6; padding: 8px 15px; font-size: 14px; }
+            .stats { display: grid; grid-template-columns: 1fr 1fr; gap: 10px; margin: 20px 0; }
+            .stat-box { background: white; padding: 15px; border-radius: 5px; }
+        </style>
+    </head>
+    <body>
+        <h1>🤖 AI Agent s Databází a LLM</h1>
+        <div class="container">
+            <h3>Položte otázku agentovi:</h3>
+            <input type="text" id="question" placeholder="Např: Kolik máme celkem produktů?">
+            <button onclick="askAgent()">Zeptat se</button>
+            
+            <div class="examples">
+                <h4>Příklady otázek:</h4>
+                <button onclick="askExample('Kolik máme celkem produktů?')">Počet produktů</button>
+                <button onclick="askExample('Jaká je průměrná cena?')">Průměrná cena</button>
+                <button onclick="askExample('Které produkty mají nízké zásoby?')">Nízké zásoby</button>
+                <button onclick="askExample('Který produkt je nejdražší?')">Nejdražší</button>
+                <button onclick="askExample('Ukaž kategorie')">Kategorie</button>
+            </div>
+            
+            <div id="response" class="response" style="display: none;">
+                <h4>Odpověď:</h4>
+                <p id="answer"></p>
+                <div class="stats" id="stats"></div>
+            </div>
+        </div>
+        
+        <script>
+            function askAgent() {
+                const question = document.getElementById('question').value;
+                if (!question) return;
+                
+                fetch('/ask?q=' + encodeURIComponent(question))
+                    .then(r => r.json())
+                    .then(data => {
+                        document.getElementById('answer').innerText = data.answer;
+                        document.getElementById('response').style.display = 'block';
+                        
+                        const stats = data.stats;
+                        document.getElementById('stats').innerHTML = `
+                            <div class="stat-box">📦 Produktů: ${stats.total_products}</div>
+                            <div class="stat-box">💰 Průměr: ${stats.avg_price} Kč</div>
+                            <div class="stat-box">📊 Celkem na skladě: ${stats.total_stock}</div>
+                            <div class="stat-box">💎 Hodnota: ${stats.total_value} Kč</div>
+                        `;
+                    });
+            }
+            
+            function askExample(q) {
+                document.getElementById('question').value = q;
+                askAgent();
+            }
+            
+            document.getElementById('question').addEventListener('keypress', function(e) {
+                if (e.key === 'Enter') askAgent();
+            });
+        </script>
+    </body>
+    </html>
+    """
+
+
+class StaticPage:
+    """Předem připravená odpověď - zakódované tělo, ETag a komprimované varianty
+    
+    Vše se spočítá jednou při vytvoření; požadavek jen vybere variantu podle
+    Accept-Encoding, případně vrátí 304, když má klient aktuální verzi.
+    """
+    
+    def __init__(self, body: bytes, content_type: str = 'text/html; charset=utf-8'):
+        self.content_type = content_type
+        tag = hashlib.sha256(body).hexdigest()[:20]
+        self.variants = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = data
+        # Každá varianta má vlastní silný ETag - jiné bajty, jiná reprezentace
+        self.etags = {
+            encoding: f'"{tag}"' if encoding == 'identity' else f'"{tag}-{encoding}"'
+            for encoding in self.variants
+        }
+    
+    def negotiate(self, accept_encoding: str) -> str:
+        """Nejlepší dostupné kódování podle Accept-Encoding (br > gzip > identity)"""
+        accepted = {}
+        for item in (accept_encoding or '').split(','):
+            name, _, params = item.partition(';')
+            name, params = name.strip().lower(), params.strip()
+            if not name:
+                continue
+            try:
+                accepted[name] = float(params[2:]) if params.startswith('q=') else 1.0
+            except ValueError:
+                accepted[name] = 0.0
+        wildcard = accepted.get('*', 0.0)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return 'identity'
+    
+    def not_modified(self, if_none_match: str) -> bool:
+        """Klient má některou z variant stránky (If-None-Match)"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or not tags.isdisjoint(self.etags.values())
+
+
+# Úvodní stránka je statická - vykreslí a zkomprimuje se jednou při startu
+INDEX_PAGE = StaticPage(INDEX_HTML.encode())
+
+
 class AgentHTTPHandler(BaseHTTPRequestHandler):
     """HTTP handler pro web API"""
     
+    # HTTP/1.1 - spojení zůstává otevřené pro další požadavky (keep-alive)
+    protocol_version = 'HTTP/1.1'
+    # Pomalý klient - čtení začatého požadavku a zápis odpovědi
+    # (nečinné keep-alive spojení hlídá AgentHTTPServer mimo pracovní vlákna)
+    timeout = 5
+    # Hlavička a tělo jdou dvěma zápisy - bez TCP_NODELAY by keep-alive
+    # spojení čekalo ~40 ms na zpožděné ACK (Nagle)
+    disable_nagle_algorithm = True
+    # Horní meze K a prahu nízkých zásob - větší číslo by nešlo navázat do SQLite
+    max_top_k = 1000
+    max_threshold = 1000000
+    
+    def handle(self):
+        # Jen jeden požadavek - na další čeká spojení v AgentHTTPServer mimo pracovní vlákno
+        self.close_connection = True
+        self.handle_one_request()
+    
+    def finish(self):
+        # Keep-alive spojení si rfile/wfile nechá pro další požadavek
+        if self.close_connection:
+            super().finish()
+        else:
+            self.wfile.flush()
+    
+    def _send(self, status: int, content_type: str, body: bytes, headers: Dict = None):
+        """Odešle kompletní odpověď s Content-Length"""
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.server.stopping:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_failure(self, e: Exception):
+        """Výjimka agenta jako odpověď - vyčerpaný pool spojení 503, jinak 500"""
+        if isinstance(e, TimeoutError):
+            status, headers, message = 503, {'Retry-After': '1'}, str(e)
+        else:
+            print(f"⚠️  Dotaz selhal: {e!r}")
+            status, headers, message = 500, {}, f'Dotaz selhal: {e}'
+        self._send(status, 'application/json; charset=utf-8',
+                   json.dumps({'error': message}, ensure_ascii=False).encode(), headers)
+    
+    def _send_page(self, page: StaticPage):
+        """Předpřipravená stránka - 304 podle ETag, jinak varianta podle Accept-Encoding"""
+        encoding = page.negotiate(self.headers.get('Accept-Encoding'))
+        headers = {
+            'ETag': page.etags[encoding],
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding'
+        }
+        if page.not_modified(self.headers.get('If-None-Match')):
+            # 304 nemá tělo ani Content-Length - jen hlavičky pro revalidaci
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if self.server.stopping:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
+            return
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        self._send(200, page.content_type, page.variants[encoding], headers)
+    
     def do_GET(self):
         if self.path == '/' or self.path == '/index.html':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            
-            html = """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>AI Agent s Databází</title>
-                <meta charset="utf-8">
-                <style>
-                    body { font-family: Arial; max-width: 800px; margin: 50px auto; padding: 20px; }
-                    h1 { color: #2c3e50; }
-                    .container { background: #f8f9fa; padding: 20px; border-radius: 10px; }
-                    input[type="text"] { width: 70%; padding: 10px; font-size: 16px; }
-                    button { padding: 10px 20px; font-size: 16px; background: #3498db; color: white; border: none; cursor: pointer; }
-                    button:hover { background: #2980b9; }
-                    .response { margin-top: 20px; padding: 15px; background: white; border-left: 4px solid #3498db; }
-                    .examples { margin: 20px 0; }
-                    .examples button { margin: 5px; background: #95a5a6; padding: 8px 15px; font-size: 14px; }
-                    .stats { display: grid; grid-template-columns: 1fr 1fr; gap: 10px; margin: 20px 0; }
-                    .stat-box { background: white; padding: 15px; border-radius: 5px; }
-                </style>
-            </head>
-            <body>
-                <h1>🤖 AI Agent s Databází a LLM</h1>
-                <div class="container">
-                    <h3>Položte otázku agentovi:</h3>
-                    <input type="text" id="question" placeholder="Např: Kolik máme celkem produktů?">
-                    <button onclick="askAgent()">Zeptat se</button>
-                    
-                    <div class="examples">
-                        <h4>Příklady otázek:</h4>
-                        <button onclick="askExample('Kolik máme celkem produktů?')">Počet produktů</button>
-                        <button onclick="askExample('Jaká je průměrná cena?')">Průměrná cena</button>
-                        <button onclick="askExample('Které produkty mají nízké zásoby?')">Nízké zásoby</button>
-                        <button onclick="askExample('Který produkt je nejdražší?')">Nejdražší</button>
-                        <button onclick="askExample('Ukaž kategorie')">Kategorie</button>
-                    </div>
-                    
-                    <div id="response" class="response" style="display: none;">
-                        <h4>Odpověď:</h4>
-                        <p id="answer"></p>
-                        <div class="stats" id="stats"></div>
-                    </div>
-                </div>
-                
-                <script>
-                    function askAgent() {
-                        const question = document.getElementById('question').value;
-                        if (!question) return;
-                        
-                        fetch('/ask?q=' + encodeURIComponent(question))
-                            .then(r => r.json())
-                            .then(data => {
-                                document.getElementById('answer').innerText = data.answer;
-                                document.getElementById('response').style.display = 'block';
-                                
-                                const stats = data.stats;
-                                document.getElementById('stats').innerHTML = `
-                                    <div class="stat-box">📦 Produktů: ${stats.total_products}</div>
-                                    <div class="stat-box">💰 Průměr: ${stats.avg_price} Kč</div>
-                                    <div class="stat-box">📊 Celkem na skladě: ${stats.total_stock}</div>
-                                    <div class="stat-box">💎 Hodnota: ${stats.total_value} Kč</div>
-                                `;
-                            });
-                    }
-                    
-                    function askExample(q) {
-                        document.getElementById('question').value = q;
-                        askAgent();
-                    }
-                    
-                    document.getElementById('question').addEventListener('keypress', function(e) {
-                        if (e.key === 'Enter') askAgent();
-                    });
-                </script>
-            </body>
-            </html>
-            """
-            self.wfile.write(html.encode())
+            self._send_page(INDEX_PAGE)
         
-        elif self.path.startswith('/ask'):
+        elif urllib.parse.urlparse(self.path).path == '/ask':
             query_components = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
             question = query_components.get('q', [''])[0]
+            options = {}
+            for name, low, high in (('k', 1, self.max_top_k), ('threshold', 0, self.max_threshold)):
+                value = query_components.get(name, [''])[0]
+                if not value:
+                    options[name] = None
+                elif value.isdigit() and low <= int(value) <= high:
+                    options[name] = int(value)
+                else:
+                    self._send(400, 'application/json; charset=utf-8', json.dumps(
+                        {'error': f"{name} musí být celé číslo {low}-{high}"}, ensure_ascii=False).encode())
+                    return
             
-            result = agent.process_query(question)
+            try:
+                result = agent.process_query(
+                    question,
+                    top_k=options['k'],
+                    low_stock_threshold=options['threshold']
+                )
+            except Exception as e:
+                self._send_failure(e)
+                return
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(json.dumps(result, ensure_ascii=False).encode())
+            self._send(200, 'application/json; charset=utf-8', json.dumps(result, ensure_ascii=False).encode())
+        
+        elif self.path == '/metrics':
+            self._send(
+                200,
+                'text/plain; version=0.0.4; charset=utf-8',
+                METRICS.render(agent.runtime_stats(self.server)).encode()
+            )
+        
+        elif self.path.startswith('/log'):
+            query_components = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            n = query_components.get('n', ['50'])[0]
+            entries = agent.query_log.tail(int(n) if n.isdigit() else 50)
+            if query_components.get('format', [''])[0] == 'jsonl':
+                body = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entries)
+                self._send(200, 'application/x-ndjson; charset=utf-8', body.encode())
+            else:
+                self._send(200, 'application/json; charset=utf-8', json.dumps(entries, ensure_ascii=False).encode())
         
         else:
-            self.send_response(404)
-            self.end_headers()
+            self._send(404, 'text/plain; charset=utf-8', b'Not Found')
     
     def log_message(self, format, *args):
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {format % args}")
 
 
-def run_server(port=8000):
-    """Spustí HTTP server"""
-    server = HTTPServer(('0.0.0.0', port), AgentHTTPHandler)
+class AgentHTTPServer(HTTPServer):
+    """HTTP server s omezeným počtem pracovních vláken a frontou požadavků
+    
+    Místo ve frontě i pracovní vlákno drží jen rozpracovaný požadavek, ne
+    otevřené spojení. Spojení, které na požadavek teprve čeká (nové nebo
+    nečinné keep-alive), hlídá selektor ve vlákně nečinných spojení a do
+    fronty ho pošle, až klient něco pošle; po keep_alive s nečinnosti ho
+    zavře. Když jsou všechna vlákna obsazená a fronta plná, požadavek
+    dostane hned 503 místo čekání - pomalý dotaz ani nečinný klient tak
+    neblokují ostatní klienty.
+    """
+    
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, workers: int = 8, max_queue: int = 32,
+                 keep_alive: float = 5.0):
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.keep_alive = keep_alive
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='agent-http')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.idle_connections = 0
+        self.stopping = False
+        # Spojení k zaparkování - do selektoru je registruje jen vlákno nečinných spojení
+        self._parking = deque()
+        self._idle = selectors.DefaultSelector()
+        self._wakeup, self._wakeup_signal = socket.socketpair()
+        self._idle.register(self._wakeup, selectors.EVENT_READ)
+        self._idle_closed = False
+        self._idle_thread = threading.Thread(target=self._watch_idle, name='agent-http-idle', daemon=True)
+        self._idle_thread.start()
+    
+    def process_request(self, request, client_address):
+        # Nové spojení čeká na první požadavek mimo pracovní vlákna
+        self._park(request, client_address, None)
+    
+    def _park(self, request, client_address, handler):
+        if self._idle_closed:
+            self._close(request, handler)
+            return
+        self._parking.append((request, client_address, handler))
+        self._wake()
+    
+    def _wake(self):
+        try:
+            self._wakeup_signal.send(b'\0')
+        except OSError:
+            pass  # Buffer je plný - vlákno už je probuzené
+    
+    def _watch_idle(self):
+        """Vlákno nečinných spojení - připravený požadavek pošle do fronty, staré spojení zavře"""
+        while not self._idle_closed:
+            while self._parking:
+                request, client_address, handler = self._parking.popleft()
+                try:
+                    self._idle.register(request, selectors.EVENT_READ,
+                                        (client_address, handler, time.monotonic() + self.keep_alive))
+                except (ValueError, OSError):
+                    self._close(request, handler)
+            for key, _ in self._idle.select(timeout=0.5):
+                if key.fileobj is self._wakeup:
+                    try:
+                        self._wakeup.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                self._idle.unregister(key.fileobj)
+                client_address, handler, _ = key.data
+                self._dispatch(key.fileobj, client_address, handler)
+            now = time.monotonic()
+            for key in list(self._idle.get_map().values()):
+                if key.data is not None and (self.stopping or key.data[2] <= now):
+                    self._idle.unregister(key.fileobj)
+                    self._close(key.fileobj, key.data[1])
+            self.idle_connections = len(self._idle.get_map()) - 1
+        for key in list(self._idle.get_map().values()):
+            if key.data is not None:
+                self._close(key.fileobj, key.data[1])
+        self.idle_connections = 0
+    
+    def _dispatch(self, request, client_address, handler):
+        """Požadavek do fronty pracovních vláken, nebo 503 když je plná"""
+        if self.stopping or not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            self._reject(request)
+            self._close(request, handler)
+            return
+        try:
+            self.executor.submit(self._process_in_worker, request, client_address, handler)
+        except RuntimeError:
+            # Server se zavírá a executor už nebere práci
+            self._slots.release()
+            self._close(request, handler)
+    
+    def _process_in_worker(self, request, client_address, handler):
+        """Jeden požadavek - na novém spojení, nebo další na keep-alive spojení"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            if handler is None:
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                handler.handle()
+                handler.finish()
+        except Exception:
+            self.handle_error(request, client_address)
+            handler = None
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+        if handler is None or handler.close_connection or self.stopping:
+            self._close(request, handler)
+        elif self._pipelined(handler):
+            # Další požadavek už je v bufferu - selektor by o něm nevěděl
+            self._dispatch(request, client_address, handler)
+        else:
+            self._park(request, client_address, handler)
+    
+    @staticmethod
+    def _pipelined(handler) -> bool:
+        """Je v bufferu rfile už další požadavek? Neblokuje."""
+        try:
+            handler.connection.settimeout(0)
+            try:
+                return bool(handler.rfile.peek(1))
+            finally:
+                handler.connection.settimeout(handler.timeout)
+        except OSError:
+            return False
+    
+    def _close(self, request, handler):
+        if handler is not None and not handler.close_connection:
+            handler.close_connection = True
+            try:
+                handler.finish()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+    
+    def _reject(self, request):
+        body = json.dumps({'error': 'Server je přetížený, zkuste to znovu'}, ensure_ascii=False).encode()
+        head = (
+            'HTTP/1.1 503 Service Unavailable\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Retry-After: 1\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode()
+        try:
+            request.sendall(head + body)
+        except OSError:
+            pass
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'idle_connections': self.idle_connections,
+                'rejected': self.rejected
+            }
+    
+    def graceful_shutdown(self):
+        """Přestane přijímat spojení a nechá doběhnout rozpracované požadavky"""
+        self.stopping = True
+        self._wake()
+        self.shutdown()
+    
+    def server_close(self):
+        super().server_close()
+        self._idle_closed = True
+        self._wake()
+        self._idle_thread.join()
+        self.executor.shutdown(wait=True)
+        # Co dokončilo až po zastavení vlákna nečinných spojení
+        while self._parking:
+            request, _, handler = self._parking.popleft()
+            self._close(request, handler)
+        self._idle.close()
+        self._wakeup.close()
+        self._wakeup_signal.close()
+
+
+def run_server(port=8000, workers: int = None, max_queue: int = None):
+    """Spustí HTTP server (souběžné zpracování s omezenou frontou)"""
+    workers = workers or int(os.getenv('SERVER_WORKERS', '8'))
+    max_queue = max_queue if max_queue is not None else int(os.getenv('SERVER_MAX_QUEUE', '32'))
+    server = AgentHTTPServer(('0.0.0.0', port), AgentHTTPHandler, workers=workers, max_queue=max_queue)
+    
+    # Docker při zastavení posílá SIGTERM - ukončit stejně jako Ctrl+C
+    def handle_sigterm(signum, frame):
+        threading.Thread(target=server.graceful_shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
     print(f"\n{'='*60}")
     print(f"🤖 AI Agent běží!")
     print(f"{'='*60}")
     print(f"\n🌐 Web rozhraní: http://localhost:{port}")
-    print(f"📡 API endpoint: http://localhost:{port}/ask?q=<otázka>")
+    print(f"📡 API endpoint: http://localhost:{port}/ask?q=<otázka>[&k=5][&threshold=10]")
+    print(f"⚙️  Vlákna: {workers}, fronta: {max_queue}")
     print(f"\nStiskněte Ctrl+C pro zastavení\n")
     
     try:
         server.serve_forever()
     except KeyboardInterrupt:
+        server.stopping = True
+    finally:
+        # Počká na rozpracované požadavky a zavře spojení do databáze
+        server.server_close()
+        agent.db_tool.close()
+        agent.query_log.close()
         print("\n\n👋 Agent ukončen")
 
 
@@ -0,0 +1,833 @@
+"""
+Automatické testy python_agent_extended.py - API, cache a stránkování
+Spuštění (z kořene repozitáře):
+    python -m unittest discover -s tests -v
+
+Agent běží v simulátoru nad dočasnou kopií init_database.sql, server
+na náhodném portu v témže procesu. Síť ani OpenAI nejsou potřeba.
+"""
+
+import gzip
+import http.client
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='agent_tests_')
+
+# Prostředí musí být nastavené před importem - modul při importu zakládá agenta
+os.environ.update({
+    'DATABASE_PATH': os.path.join(WORKDIR, 'data', 'products.db'),
+    'INIT_DATA_PATH': os.path.join(ROOT, 'init_database.sql'),
+    'LLM_MODE': 'simulator',
+    'QUERY_LOG_PATH': '',
+    'ANSWER_CACHE_DB': '',
+    'ANALYTICS_PROCESSES': '0'
+})
+sys.path.insert(0, ROOT)
+
+import python_agent_extended as ext  # noqa: E402
+
+
+def tearDownModule():
+    ext.agent.close()
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+class QuietHandler(ext.AgentHTTPHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ServerTestCase(unittest.TestCase):
+    """Server agenta na náhodném portu pro všechny testy třídy"""
+    
+    workers = 4
+    max_queue = 8
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ext.AgentHTTPServer(('127.0.0.1', 0), QuietHandler,
+                                         workers=cls.workers, max_queue=cls.max_queue)
+        cls.port = cls.server.server_address[1]
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+    
+    def request(self, method: str, path: str, body=None, headers: dict = None) -> tuple:
+        """(status, hlavičky, tělo) jednoho požadavku na vlastním spojení"""
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            if body is not None and not isinstance(body, bytes):
+                body = json.dumps(body).encode()
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            conn.close()
+    
+    def get_json(self, path: str) -> tuple:
+        status, _, body = self.request('GET', path)
+        return status, json.loads(body)
+
+
+class ParameterValidationTest(ServerTestCase):
+    """K, práh a offset mimo rozsah - 400 místo výjimky v handleru"""
+    
+    def test_ask_rejects_out_of_range_k_and_threshold(self):
+        for query in ('k=99999999999999999999', 'k=0', 'k=abc', f'k={ext.ProductQuery.MAX_LIMIT + 1}',
+                      'threshold=-1', 'threshold=99999999999999999999'):
+            with self.subTest(query=query):
+                status, body = self.get_json(f'/ask?q=nejdra%C5%BE%C5%A1%C3%AD&{query}')
+                self.assertEqual(status, 400)
+                self.assertIn('error', body)
+    
+    def test_ask_accepts_k_in_range(self):
+        status, body = self.get_json('/ask?q=nejdra%C5%BE%C5%A1%C3%AD&k=3&threshold=5')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['intent'], 'expensive')
+    
+    def test_low_stock_answer_names_threshold(self):
+        question = urllib.parse.quote('které produkty mají nízké zásoby')
+        status, body = self.get_json(f'/ask?q={question}&threshold=0')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['intent'], 'low_stock')
+        self.assertEqual(body['answer'], 'Všechny produkty mají dostatek zásob (0+ kusů).')
+        status, _, raw = self.request('POST', '/ask/batch',
+                                      {'questions': ['které produkty mají nízké zásoby'], 'threshold': 0})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(raw)['results'][0]['answer'], body['answer'])
+        # Bez prahu platí výchozí práh nástrojů
+        self.assertEqual(ext.LLMSimulator.generate_response('nízké zásoby', {}, {}, intent='low_stock'),
+                         'Všechny produkty mají dostatek zásob (10+ kusů).')
+
+    def test_stream_rejects_out_of_range_k(self):
+        status, body = self.get_json('/ask/stream?q=test&k=99999999999999999999')
+        self.assertEqual(status, 400)
+    
+    def test_batch_rejects_out_of_range_k(self):
+        for options in ({'k': 10 ** 20}, {'k': 0}, {'threshold': -1}, {'k': 'pět'}):
+            with self.subTest(options=options):
+                status, _, _ = self.request('POST', '/ask/batch', {'questions': ['nejdražší'], **options})
+                self.assertEqual(status, 400)
+    
+    def test_ask_path_matches_exactly(self):
+        for path in ('/ask/batch?q=test', '/askfoo?q=test', '/ask/streamx?q=test'):
+            with self.subTest(path=path):
+                self.assertEqual(self.request('GET', path)[0], 404)
+    
+    def test_ask_failures_answer_503_or_500(self):
+        for error, status in ((TimeoutError('Pool SQLite spojení je vyčerpaný (max 4)'), 503),
+                              (RuntimeError('chyba'), 500)):
+            with self.subTest(error=error), \
+                    mock.patch.object(ext.agent, 'process_query', side_effect=error):
+                code, headers, body = self.request('GET', '/ask?q=test')
+                self.assertEqual(code, status)
+                self.assertIn('error', json.loads(body))
+                self.assertEqual(headers.get('Retry-After'), '1' if status == 503 else None)
+        # Spojení po chybě dál slouží
+        self.assertEqual(self.request('GET', '/ask?q=test')[0], 200)
+    
+    def test_products_rejects_integers_sqlite_cannot_bind(self):
+        for query in ('offset=99999999999999999999', 'max_stock=99999999999999999999',
+                      'after=99999999999999999999'):
+            with self.subTest(query=query):
+                status, body = self.get_json(f'/products?{query}')
+                self.assertEqual(status, 400)
+
+
+class ProductsTest(ServerTestCase):
+    """GET /products - kurzorové stránkování a souběžné exporty"""
+    
+    def pages(self, query: str) -> list:
+        ids, after = [], None
+        while True:
+            path = f'/products?{query}' + (f'&after={after}' if after else '')
+            status, body = self.get_json(path)
+            self.assertEqual(status, 200)
+            ids.extend(p['id'] for p in body['products'])
+            after = body['next']
+            if after is None:
+                return ids
+    
+    def test_keyset_pages_across_price_ties(self):
+        for direction in ('asc', 'desc'):
+            with self.subTest(direction=direction):
+                _, full = self.get_json(f'/products?order=price&direction={direction}&limit=1000')
+                expected = [p['id'] for p in full['products']]
+                # Cena 2499 je u sedmi produktů - po třech se shoda láme přes stránky
+                self.assertEqual(self.pages(f'order=price&direction={direction}&limit=3'), expected)
+                prices = [(p['price'], p['id']) for p in full['products']]
+                ties = [pid for price, pid in prices if price == 2499.0]
+                self.assertGreater(len(ties), 3)
+                self.assertEqual(ties, sorted(ties))
+    
+    def test_keyset_pages_by_id_with_filter(self):
+        _, full = self.get_json('/products?category=Elektronika&limit=1000')
+        self.assertEqual(self.pages('category=Elektronika&limit=4'), [p['id'] for p in full['products']])
+    
+    def test_bad_params_answer_400(self):
+        for query in ('order=password', 'direction=up', 'limit=0', 'limit=1001', 'limit=sto',
+                      'offset=-1', 'min_price=levne', 'max_stock=1.5', 'color=red', 'format=xml',
+                      'order=name&after=5', 'order=price&after=5', 'after=5&offset=10'):
+            with self.subTest(query=query):
+                status, body = self.get_json(f'/products?{query}')
+                self.assertEqual(status, 400)
+                self.assertIn('error', body)
+    
+    def test_next_pages_reach_every_product_of_category(self):
+        # Jako n8n node "Filtrovaný dotaz" - stránky po 1000 až do next = null
+        with ext.agent.db_tool.pool.connection() as conn:
+            expected = [row[0] for row in conn.execute(
+                "SELECT id FROM products WHERE category = 'Elektronika' ORDER BY price, id")]
+        self.assertEqual(self.pages('category=Elektronika&order=price&limit=1000'), expected)
+        self.assertEqual(self.pages('category=Elektronika&order=price&limit=2'), expected)
+    
+    def test_export_limit_answers_503(self):
+        exports = ext.AgentHTTPHandler._exports
+        taken = 0
+        try:
+            while exports.acquire(blocking=False):
+                taken += 1
+            status, headers, _ = self.request('GET', '/products?format=ndjson')
+            self.assertEqual(status, 503)
+            self.assertEqual(headers['Retry-After'], '1')
+        finally:
+            for _ in range(taken):
+                exports.release()
+        status, _, body = self.request('GET', '/products?format=ndjson&category=Elektronika')
+        self.assertEqual(status, 200)
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertTrue(rows and all(row['category'] == 'Elektronika' for row in rows))
+
+
+class AnswerCacheTest(unittest.TestCase):
+    """Cache odpovědí - klíč s verzí dat a zápis souboru na pozadí"""
+    
+    def test_data_version_change_invalidates_answer(self):
+        question = 'Jaké jsou nejdražší produkty?'
+        first = ext.agent.process_query(question)
+        self.assertTrue(ext.agent.process_query(question)['cached'])
+        
+        with ext.agent.db_tool.pool.connection() as conn:
+            product_id, price = conn.execute(
+                'SELECT id, price FROM products ORDER BY price DESC, id LIMIT 1').fetchone()
+            conn.execute('UPDATE products SET price = ? WHERE id = ?', (price + 12345, product_id))
+            conn.commit()
+        try:
+            changed = ext.agent.process_query(question)
+            self.assertFalse(changed['cached'])
+            self.assertNotEqual(changed['data_version'], first['data_version'])
+            self.assertTrue(ext.agent.process_query(question)['cached'])
+        finally:
+            with ext.agent.db_tool.pool.connection() as conn:
+                conn.execute('UPDATE products SET price = ? WHERE id = ?', (price, product_id))
+                conn.commit()
+    
+    def test_persistent_answers_survive_reopen(self):
+        path = os.path.join(WORKDIR, 'answer_cache.db')
+        cache = ext.AnswerCache(db_path=path, flush_interval=0.05)
+        key = cache.make_key('Kolik stojí Káva?', 7, 'simulator', None, None)
+        cache.put(key, 'odpověď')
+        self.assertEqual(cache.get(key), 'odpověď')
+        cache.close()
+        
+        reopened = ext.AnswerCache(db_path=path)
+        try:
+            self.assertEqual(reopened.get(cache.make_key('kolik  stoji kava?', 7, 'simulator', None, None)),
+                             'odpověď')
+            self.assertIsNone(reopened.get(cache.make_key('Kolik stojí Káva?', 8, 'simulator', None, None)))
+        finally:
+            reopened.close()
+
+
+class StreamTest(ServerTestCase):
+    """GET /ask/stream - události meta, token ... token, done v tomto pořadí"""
+    
+    def events(self, question: str) -> list:
+        # http.client u chunked odpovědi bez koncového bloku vyhodí IncompleteRead
+        status, headers, body = self.request('GET', '/ask/stream?q=' + urllib.parse.quote(question))
+        self.assertEqual(status, 200)
+        self.assertTrue(headers['Content-type'].startswith('text/event-stream'))
+        result = []
+        for frame in body.decode().split('\n\n'):
+            if not frame:
+                continue
+            lines = dict(line.split(': ', 1) for line in frame.split('\n'))
+            result.append((lines.get('event', 'token'), json.loads(lines['data'])))
+        return result
+    
+    def test_event_order(self):
+        question = 'Kolik produktů máme na skladě celkem?'
+        for cached in (False, True):
+            with self.subTest(cached=cached):
+                events = self.events(question)
+                names = [name for name, _ in events]
+                self.assertEqual(names[0], 'meta')
+                self.assertEqual(names[-1], 'done')
+                self.assertGreater(len(names), 2)
+                self.assertEqual(set(names[1:-1]), {'token'})
+                meta, done = events[0][1], events[-1][1]
+                self.assertEqual(meta['cached'], cached)
+                self.assertEqual(meta['data_version'], done['data_version'])
+                self.assertEqual(''.join(payload['token'] for _, payload in events[1:-1]), done['answer'])
+    
+    def test_failure_mid_stream_ends_with_error_event(self):
+        def failing(question, top_k=None, low_stock_threshold=None):
+            yield 'meta', {'question': question}
+            yield 'token', 'Začátek'
+            raise TimeoutError('Pool SQLite spojení je vyčerpaný (max 4)')
+        
+        with mock.patch.object(ext.agent, 'process_query_stream', failing):
+            events = self.events('test')
+        self.assertEqual([name for name, _ in events], ['meta', 'token', 'error'])
+        self.assertIn('vyčerpaný', events[-1][1]['error'])
+    
+    def test_failure_before_first_event_answers_503(self):
+        def failing(question, top_k=None, low_stock_threshold=None):
+            raise TimeoutError('Pool SQLite spojení je vyčerpaný (max 4)')
+            yield
+        
+        with mock.patch.object(ext.agent, 'process_query_stream', failing):
+            status, headers, body = self.request('GET', '/ask/stream?q=test')
+        self.assertEqual(status, 503)
+        self.assertEqual(headers['Retry-After'], '1')
+        self.assertIn('error', json.loads(body))
+
+
+class IndexPageTest(ServerTestCase):
+    """Úvodní stránka - ETag pro každou variantu a 304 při shodě If-None-Match"""
+    
+    def test_etag_revalidation(self):
+        status, headers, body = self.request('GET', '/')
+        self.assertEqual(status, 200)
+        etag = headers['ETag']
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(len(body), int(headers['Content-Length']))
+        
+        for value in (etag, 'W/' + etag, f'"jiny", {etag}', '*'):
+            with self.subTest(if_none_match=value):
+                status, headers, body = self.request('GET', '/', headers={'If-None-Match': value})
+                self.assertEqual(status, 304)
+                self.assertEqual(body, b'')
+                self.assertEqual(headers['ETag'], etag)
+        
+        status, _, _ = self.request('GET', '/', headers={'If-None-Match': '"jiny"'})
+        self.assertEqual(status, 200)
+    
+    def test_gzip_variant_has_own_etag(self):
+        status, headers, body = self.request('GET', '/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), ext.AgentHTTPHandler.index_page().variants['identity'])
+        _, plain, _ = self.request('GET', '/')
+        self.assertNotEqual(headers['ETag'], plain['ETag'])
+        status, _, _ = self.request('GET', '/', headers={'Accept-Encoding': 'gzip',
+                                                         'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 304)
+
+
+class BatchTest(ServerTestCase):
+    """POST /ask/batch - výsledky v pořadí otázek, odpovědi z cache i z LLM"""
+    
+    def test_results_keep_question_order(self):
+        cached_question = 'Které produkty dochází na skladě?'
+        self.assertEqual(self.request('GET', '/ask?k=3&q=' + urllib.parse.quote(cached_question))[0], 200)
+        questions = ['Jaké jsou nejdražší produkty?', cached_question, 'Jaká je průměrná cena?',
+                     'Udělej statistiku podle kategorií', 'Jaké jsou nejdražší produkty?']
+        
+        status, _, body = self.request('POST', '/ask/batch', {'questions': questions, 'k': 3})
+        self.assertEqual(status, 200)
+        results = json.loads(body)['results']
+        self.assertEqual([item['question'] for item in results], questions)
+        self.assertTrue(all(item['answer'] for item in results))
+        self.assertTrue(results[1]['cached'])
+        
+        # Stejná otázka se stejnými parametry má stejnou odpověď jako /ask
+        for item in results:
+            with self.subTest(question=item['question']):
+                single = self.get_json('/ask?k=3&q=' + urllib.parse.quote(item['question']))[1]
+                self.assertEqual(item['answer'], single['answer'])
+                self.assertEqual(item['intent'], single['intent'])
+    
+    def test_array_payload(self):
+        questions = ['Jaká je průměrná cena?', 'Které produkty dochází na skladě?']
+        status, _, body = self.request('POST', '/ask/batch', questions)
+        self.assertEqual(status, 200)
+        self.assertEqual([item['question'] for item in json.loads(body)['results']], questions)
+
+
+def keyword_chain(question: str) -> str:
+    """Původní if/elif řetězec klíčových slov (v pořadí INTENTS) - reference pro IntentMatcher"""
+    text = ext.IntentMatcher.normalize(question)
+    if 'kolik' in text and ('produkt' in text or 'celkem' in text):
+        return 'count'
+    elif 'prumer' in text:
+        return 'average'
+    elif 'kategorie' in text:
+        return 'categories'
+    elif 'nizk' in text and 'zasob' in text:
+        return 'low_stock'
+    elif 'nejdrazsi' in text:
+        return 'expensive'
+    elif 'analyz' in text or 'portfolio' in text:
+        return 'portfolio'
+    elif any(word in text for word in ('najdi', 'najit', 'hledam', 'hledej', 'vyhledej',
+                                        'neco s', 'neco na', 'znacky')):
+        return 'search'
+    return 'general'
+
+
+class IntentTest(unittest.TestCase):
+    """QueryPlanner / IntentMatcher - stejné záměry jako řetězec klíčových slov"""
+    
+    # (otázka, záměr) - otázky z test_agent.py a úvodní stránky, překryvy a varianty zápisu
+    CASES = [
+        ('Kolik máme celkem produktů?', 'count'),
+        ('Jaká je průměrná cena všech produktů?', 'average'),
+        ('Jaká je průměrná cena?', 'average'),
+        # "kategorii" neobsahuje "kategorie" - stejně jako v původním řetězci
+        ('Které produkty máme v kategorii Elektronika?', 'general'),
+        ('Ukaž kategorie', 'categories'),
+        ('Který produkt je nejdražší?', 'expensive'),
+        ('Které produkty mají nízké zásoby?', 'low_stock'),
+        ('Které produkty mají zásoby menší než 10 kusů?', 'general'),
+        ('Jaká je celková hodnota skladových zásob?', 'general'),
+        ('Udělej analýzu produktového portfolia', 'portfolio'),
+        ('Najdi sluchátka Sony', 'search'),
+        ('Máte něco na běhání?', 'search'),
+        ('Jaké máme Apple?', 'general'),
+        ('', 'general'),
+        # Překryvy - vyhrává dřív registrovaný záměr
+        ('Kolik produktů je v kategorii Potraviny?', 'count'),
+        ('Průměrná cena v kategorii Sport', 'average'),
+        ('Nejdražší produkty s nízkými zásobami', 'low_stock'),
+        ('Kategorie nejdražších produktů', 'categories'),
+        ('Hledám nejdražší notebook', 'expensive'),
+        ('Analýza kategorie Elektronika', 'categories'),
+        # Jedna skupina nestačí - "kolik" bez "produkt"/"celkem", "nízk" bez "zásob"
+        ('Kolik stojí káva?', 'general'),
+        ('Nízká cena', 'general'),
+        # Velikost písmen a diakritika
+        ('KOLIK MÁME CELKEM PRODUKTŮ?', 'count'),
+        ('prumerna cena', 'average'),
+        ('NEJDRAZSI produkt', 'expensive'),
+        ('nizke zasoby', 'low_stock'),
+        ('Jaké značky máte?', 'search'),
+    ]
+    
+    def test_cases(self):
+        planner = ext.QueryPlanner()
+        for question, intent in self.CASES:
+            with self.subTest(question=question):
+                self.assertEqual(planner.plan(question)['intent'], intent)
+                self.assertEqual(keyword_chain(question), intent)
+    
+    def test_every_intent_is_covered(self):
+        covered = {intent for _, intent in self.CASES}
+        self.assertEqual(covered, {name for name, _ in ext.INTENTS} | {'general'})
+    
+    def test_plan_data_follows_intent(self):
+        simulator, openai = ext.QueryPlanner('simulator'), ext.QueryPlanner('openai')
+        for question, intent in self.CASES:
+            with self.subTest(question=question):
+                self.assertEqual(simulator.plan(question)['data'], ext.QueryPlanner.INTENT_DATA[intent])
+                data = openai.plan(question)['data']
+                self.assertEqual(data[:len(ext.QueryPlanner.PROMPT_DATA)], ext.QueryPlanner.PROMPT_DATA)
+                self.assertTrue(set(ext.QueryPlanner.INTENT_DATA[intent]) <= set(data))
+    
+    def test_registration_order_decides(self):
+        matcher = ext.IntentMatcher([('first', [['cena']]), ('second', [['průměrná cena']])])
+        self.assertEqual(matcher.match('Průměrná cena'), 'first')
+        matcher = ext.IntentMatcher([('second', [['průměrná cena']]), ('first', [['cena']])])
+        self.assertEqual(matcher.match('Průměrná cena'), 'second')
+        # Klíčové slovo uvnitř jiného (failure odkazy automatu)
+        matcher = ext.IntentMatcher([('a', [['abcd']]), ('b', [['bc']])], default='none')
+        self.assertEqual(matcher.match('xabcx'), 'b')
+        self.assertEqual(matcher.match('xabdx'), 'none')
+    
+    def test_register_after_match_recompiles(self):
+        matcher = ext.IntentMatcher([('count', [['kolik']])])
+        self.assertEqual(matcher.match('hledej kolik'), 'count')
+        matcher.register('search', [['hledej']])
+        self.assertEqual(matcher.match('hledej'), 'search')
+
+
+SQL_FIXTURE = """
+-- Katalog pro test importu; středník v komentáři; nevadí
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    price REAL NOT NULL,
+    stock INTEGER NOT NULL,
+    description TEXT,
+    brand TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+/* blokový komentář; s (závorkou */
+INSERT INTO products (id, name, category, price, stock, description, brand) VALUES
+    (1, 'Káva, zrnková', 'Potraviny', 349.9, 12, 'Arabica; 1 kg', 'Lavazza'),
+    (2, 'Rock''n''roll (LP)', 'Hudba', 599, 3, 'Vinyl (180 g), ''remaster'' ', NULL),
+    (3, 'Bez popisu', 'Ostatní', 0.5, 0, NULL, NULL);
+insert into "products" (name, category, price, stock, brand)
+values ('Čaj
+zelený', 'Potraviny', 89, 40, 'Teekanne'),(  'Hrnek (2 ks)','Domácnost',149.0,7,'IKEA' ) ;
+INSERT OR REPLACE INTO products (id, name, category, price, stock, description, brand) VALUES
+    (3, 'Nahrazený', 'Ostatní', 1, 1, '', 'X');
+"""
+
+CSV_FIXTURE = """id,name,category,price,stock,description,brand
+1,"Káva, zrnková",Potraviny,349.9,12,Arabica; 1 kg,Lavazza
+2,Rock'n'roll (LP),Hudba,599,3,"Vinyl (180 g), 'remaster' ",
+3,Bez popisu,Ostatní,0.5,0,,
+4,"Čaj
+zelený",Potraviny,89,40,,Teekanne
+5,Hrnek (2 ks),Domácnost,149.0,7,,IKEA
+"""
+
+JSONL_FIXTURE = """{"id": 1, "name": "Káva, zrnková", "category": "Potraviny", "price": 349.9, "stock": 12, "description": "Arabica; 1 kg", "brand": "Lavazza"}
+{"id": 2, "name": "Rock'n'roll (LP)", "category": "Hudba", "price": 599, "stock": 3, "description": "Vinyl (180 g), 'remaster' ", "brand": null}
+
+{"id": 3, "name": "Bez popisu", "category": "Ostatní", "price": 0.5, "stock": 0}
+{"name": "Čaj\\nzelený", "category": "Potraviny", "price": "89", "stock": "40", "brand": "Teekanne"}
+{"name": "Hrnek (2 ks)", "category": "Domácnost", "price": 149.0, "stock": 7, "brand": "IKEA"}
+"""
+
+
+class BulkImportTest(unittest.TestCase):
+    """BulkImporter - stejné řádky jako sqlite3.executescript, chybný vstup zastaví import"""
+
+    COLUMNS = 'id, name, category, price, stock, description, brand'
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=WORKDIR)
+        # Prázdný katalog - jen schéma, indexy a triggery
+        with mock.patch.dict(os.environ, {'INIT_DATA_PATH': os.path.join(self.dir, 'chybi.sql')}):
+            self.db = ext.DatabaseTool(os.path.join(self.dir, 'products.db'))
+
+    def tearDown(self):
+        self.db.close()
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def rows(self) -> list:
+        with self.db.pool.connection() as conn:
+            return conn.execute(f'SELECT {self.COLUMNS} FROM products ORDER BY id').fetchall()
+
+    def clear(self):
+        with self.db.pool.connection() as conn:
+            conn.execute('DELETE FROM products')
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'products'")
+            conn.commit()
+
+    @classmethod
+    def expected(cls, script: str = SQL_FIXTURE) -> list:
+        conn = sqlite3.connect(':memory:')
+        try:
+            conn.executescript(script)
+            return conn.execute(f'SELECT {cls.COLUMNS} FROM products ORDER BY id').fetchall()
+        finally:
+            conn.close()
+
+    def import_file(self, path: str, **options) -> dict:
+        with self.db.pool.connection() as conn:
+            return ext.BulkImporter(self.db, **options).import_file(conn, path)
+
+    def test_sql_matches_executescript(self):
+        path = self.write('katalog.sql', SQL_FIXTURE)
+        # Malé bloky - hlavičky, n-tice i příkazy přes hranici bloku
+        for block_size in (1 << 20, 64, 16, 5):
+            with self.subTest(block_size=block_size):
+                self.clear()
+                result = self.import_file(path, block_size=block_size)
+                self.assertEqual(result['rows'], 6)
+                self.assertEqual(self.rows(), self.expected())
+
+    def test_init_database_matches_executescript(self):
+        path = os.path.join(ROOT, 'init_database.sql')
+        with open(path, encoding='utf-8') as f:
+            script = f.read()
+        self.import_file(path)
+        self.assertEqual(self.rows(), self.expected(script))
+
+    def test_csv_and_jsonl_match_sql(self):
+        # Stejné produkty jako SQL_FIXTURE před přepsáním řádku 3
+        expected = self.expected(SQL_FIXTURE.split('INSERT OR REPLACE')[0])
+        for name, content in (('katalog.csv', CSV_FIXTURE), ('katalog.jsonl', JSONL_FIXTURE)):
+            with self.subTest(name=name):
+                self.clear()
+                result = self.import_file(self.write(name, content), chunk_size=2)
+                self.assertEqual(result['rows'], 5)
+                self.assertEqual(self.rows(), expected)
+
+    def test_import_updates_search_and_version(self):
+        version = self.db.data_version()
+        self.import_file(self.write('katalog.sql', SQL_FIXTURE))
+        self.assertNotEqual(self.db.data_version(), version)
+        self.assertEqual([p.id for p in self.db.search_products('zrnková')], [1])
+
+    def test_malformed_input_raises_and_rolls_back(self):
+        self.import_file(self.write('zaklad.csv', CSV_FIXTURE))
+        before = self.rows()
+        header = 'id,name,category,price,stock,description,brand\n'
+        cases = [
+            ('neukoncena.sql', "INSERT INTO products (id, name, category, price, stock) VALUES "
+                               "(10, 'A', 'B', 1, 1), (11, 'neukončený, 'B', 1, 1);", 'nepodporovaný zápis'),
+            ('bez_stredniku.sql', 'CREATE TABLE x (a INTEGER)', 'neukončený příkaz'),
+            ('sloupec.sql', "INSERT INTO products (id, heslo) VALUES (10, 'x');", 'Neznámé sloupce'),
+            ('cena.csv', header + '10,A,B,levná,1,,\n', 'záznam 1: price'),
+            ('kratky.csv', header + '10,A,B,1,1,,\n11,A,B\n', 'záznam 2 má 3 hodnot'),
+            ('sloupec.csv', 'id,name,heslo\n10,A,x\n', 'Neznámé sloupce'),
+            ('json.jsonl', '{"id": 10, "name": "A", "category": "B", "price": 1, "stock": 1}\n{oops\n',
+             'řádek 2: neplatný JSON'),
+            ('pole.jsonl', '[10, "A"]\n', 'očekáván JSON objekt'),
+            ('format.txt', 'x', 'Neznámý formát'),
+        ]
+        for name, content, message in cases:
+            with self.subTest(name=name):
+                with self.assertRaisesRegex(ValueError, message):
+                    self.import_file(self.write(name, content))
+                self.assertEqual(self.rows(), before)
+        # Hodnotu, kterou nelze uložit, odmítne SQLite - ani tady se nic nepřeskočí
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.import_file(self.write('null.csv', header + '10,,B,1,1,,\n'))
+        self.assertEqual(self.rows(), before)
+
+
+SEARCH_FIXTURE = """id,name,category,price,stock,description,brand
+1,Sluchátka Sony WH-1000XM5,Elektronika,8990,5,Bezdrátová sluchátka s ANC,Sony
+2,Reproduktor Bose SoundLink,Elektronika,3490,8,Hodí se ke sluchátkům Sony i k televizi,Bose
+3,Hořká čokoláda 85 %,Potraviny,69,40,Čokoláda z Ekvádoru,Lindt
+4,Notebook Lenovo ThinkPad,Elektronika,32990,3,"14"" notebook pro práci",Lenovo
+5,Televize Sony Bravia 4K,Elektronika,24990,2,4K televize s HDR,Sony
+6,Mléčná čokoláda,Potraviny,39,120,Alpské mléko,Milka
+"""
+
+
+class SearchTest(unittest.TestCase):
+    """Fulltext - FTS5 index přes triggery, pořadí BM25 a náhradní průchod tabulkou"""
+
+    QUERIES = ['sony sluchátka', 'cokolada', 'notebooky', '4K', 'najdi prosím sluchátka',
+               'televize sony', 'lenovo sony']
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=WORKDIR)
+        with mock.patch.dict(os.environ, {'INIT_DATA_PATH': os.path.join(self.dir, 'chybi.sql')}):
+            self.db = ext.DatabaseTool(os.path.join(self.dir, 'products.db'))
+        path = os.path.join(self.dir, 'katalog.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(SEARCH_FIXTURE)
+        self.db.bulk_import(path)
+        if not self.db.fts:
+            self.skipTest('SQLite bez FTS5')
+
+    def tearDown(self):
+        self.db.close()
+
+    def ids(self, text: str, **options) -> list:
+        return [p.id for p in self.db.search_products(text, **options)]
+
+    def execute(self, sql: str, params: tuple = ()):
+        with self.db.pool.connection() as conn:
+            conn.execute(sql, params)
+            conn.commit()
+
+    def test_terms(self):
+        self.assertEqual(ext.DatabaseTool.search_terms('Najdi prosím Sluchátka Sony 4K'),
+                         ['sluchat*', 'sony*', '4k'])
+        self.assertEqual(ext.DatabaseTool.search_terms('najdi nějaké levné produkty'), ['levn*'])
+        self.assertEqual(ext.DatabaseTool.search_terms('co je a ze'), [])
+
+    def test_rank_order(self):
+        # Obě slova v názvu (váha 10) před shodou jen v popisu
+        self.assertEqual(self.ids('sony sluchátka'), [1, 2])
+        self.assertEqual(self.ids('televize sony'), [5, 2])
+        self.assertEqual(sorted(self.ids('cokolada')), [3, 6])
+        self.assertEqual(self.ids('notebooky'), [4])
+        self.assertEqual(self.ids('4K'), [5])
+        self.assertEqual(self.ids('najdi prosím sluchátka'), self.ids('sluchátka'))
+        self.assertEqual(self.ids('sony sluchátka', limit=1), [1])
+
+    def test_any_term(self):
+        self.assertEqual(self.ids('lenovo sony'), [])
+        self.assertEqual(sorted(self.ids('lenovo sony', any_term=True)), [1, 2, 4, 5])
+
+    def test_triggers_follow_changes(self):
+        self.execute("INSERT INTO products (id, name, category, price, stock, description, brand) "
+                     "VALUES (7, 'Sluchátka Sony WF-1000XM4', 'Elektronika', 5990, 9, NULL, 'Sony')")
+        self.assertIn(7, self.ids('sony sluchátka'))
+
+        self.execute("UPDATE products SET name = 'Špunty Sony WF-1000XM4' WHERE id = 7")
+        self.assertNotIn(7, self.ids('sluchátka'))
+        self.assertEqual(self.ids('špunty'), [7])
+        # Změna ceny a zásob index nemění, produkt se dál najde
+        self.execute('UPDATE products SET price = 4990, stock = 0 WHERE id = 7')
+        self.assertEqual(self.ids('špunty'), [7])
+
+        self.execute('DELETE FROM products WHERE id = 7')
+        self.assertEqual(self.ids('špunty'), [])
+        self.assertEqual(self.ids('sony sluchátka'), [1, 2])
+        with self.db.pool.connection() as conn:
+            conn.execute("INSERT INTO products_fts (products_fts) VALUES ('integrity-check')")
+
+    def test_scan_fallback_returns_same_set(self):
+        expected = {text: set(self.ids(text, any_term=True)) for text in self.QUERIES}
+        self.db.fts = False
+        for text in self.QUERIES:
+            with self.subTest(text=text):
+                self.assertEqual(set(self.ids(text, any_term=True)), expected[text])
+
+    def test_read_only_pool(self):
+        reader = ext.DatabaseTool(self.db.db_path, read_only=True)
+        try:
+            self.assertTrue(reader.fts)
+            self.assertEqual(reader.search_products('sony sluchátka'), self.db.search_products('sony sluchátka'))
+            reader.fts = False
+            self.assertEqual(set(p.id for p in reader.search_products('cokolada')), {3, 6})
+        finally:
+            reader.close()
+
+    def test_frequent_term_falls_back_to_id_order(self):
+        with mock.patch.object(ext.DatabaseTool, 'SEARCH_RANK_LIMIT', 2):
+            self.assertEqual(self.ids('sony'), [1, 2, 5])
+            self.assertEqual(self.ids('sony', limit=2), [1, 2])
+
+
+class ColumnarCatalogTest(unittest.TestCase):
+    """ColumnarCatalog - stejné výsledky jako StatisticsTool a SQL, s NumPy i bez ní"""
+
+    @classmethod
+    def setUpClass(cls):
+        import generate_catalog
+        path = os.path.join(WORKDIR, 'generated', 'catalog.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        generate_catalog.create_catalog(path, 20000, seed=7, progress=False)
+        cls.generated = ext.DatabaseTool(path)
+        cls.catalogs = {'init_database.sql': ext.agent.db_tool, 'generated': cls.generated}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.generated.close()
+
+    def check(self, use_numpy: bool):
+        for name, db in self.catalogs.items():
+            with self.subTest(catalog=name):
+                products = db.query()
+                catalog = ext.ColumnarCatalog.load(db, use_numpy=use_numpy, chunk_size=997)
+                self.assertEqual(catalog.use_numpy, use_numpy)
+                self.assertEqual(len(catalog), len(products))
+                self.assertEqual(catalog.get_statistics(), db.get_statistics())
+                self.assertEqual(catalog.calculate_by_category(),
+                                 ext.StatisticsTool.calculate_by_category(products))
+                for threshold in (0, 10, 50):
+                    self.assertEqual(catalog.find_low_stock(threshold),
+                                     ext.StatisticsTool.find_low_stock(products, threshold))
+                for limit in (1, 5, 100):
+                    self.assertEqual(catalog.find_expensive(limit),
+                                     ext.StatisticsTool.find_expensive(products, limit))
+
+    def test_array_backend(self):
+        self.check(use_numpy=False)
+
+    @unittest.skipIf(ext.np is None, 'NumPy není nainstalovaná')
+    def test_numpy_backend(self):
+        self.check(use_numpy=True)
+
+
+class KeepAliveTest(ServerTestCase):
+    """Nečinné keep-alive spojení nedrží pracovní vlákno ani místo ve frontě"""
+    
+    workers = 2
+    max_queue = 2
+    
+    def test_idle_connections_do_not_block_requests(self):
+        idle = []
+        try:
+            for _ in range(self.workers):
+                conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+                conn.request('GET', '/stats')
+                response = conn.getresponse()
+                response.read()
+                self.assertEqual(response.status, 200)
+                idle.append(conn)
+            started = time.monotonic()
+            status, body = self.get_json('/ask?q=nejdra%C5%BE%C5%A1%C3%AD')
+            self.assertEqual(status, 200)
+            self.assertLess(time.monotonic() - started, 2.0)
+            # Zaparkované spojení dál obslouží další požadavek
+            idle[0].request('GET', '/stats')
+            response = idle[0].getresponse()
+            response.read()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(self.server.stats()['rejected'], 0)
+        finally:
+            for conn in idle:
+                conn.close()
+    
+    def test_pipelined_requests_are_answered(self):
+        with socket.create_connection(('127.0.0.1', self.port), timeout=5) as sock:
+            sock.sendall(b'GET /stats HTTP/1.1\r\nHost: x\r\n\r\n' * 2)
+            data = b''
+            deadline = time.monotonic() + 5
+            while data.count(b'HTTP/1.1 200') < 2 and time.monotonic() < deadline:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+            self.assertEqual(data.count(b'HTTP/1.1 200'), 2)
+
+
+def _crash(deadline):
+    os._exit(1)
+
+
+def _pid(deadline):
+    return os.getpid()
+
+
+class AnalyticsExecutorTest(unittest.TestCase):
+    """Procesy analýz - žádný fork při vytvoření, po pádu výpočet ve vlákně"""
+    
+    def test_import_does_not_start_processes(self):
+        self.assertFalse(ext.agent.analytics.stats()['running'])
+    
+    @unittest.skipUnless('fork' in ext.multiprocessing.get_all_start_methods(), 'vyžaduje fork')
+    def test_broken_pool_falls_back_to_inline(self):
+        analytics = ext.AnalyticsExecutor(processes=1, timeout=10)
+        try:
+            self.assertFalse(analytics.stats()['running'])
+            analytics.start()
+            self.assertNotEqual(analytics.run(_pid), os.getpid())
+            with self.assertRaises(ext.AnalyticsUnavailable):
+                analytics.run(_crash)
+            # Bez nového forku - další analýza běží v tomto procesu
+            self.assertEqual(analytics.run(_pid), os.getpid())
+            self.assertTrue(analytics.stats()['broken'])
+            analytics.start()
+            self.assertFalse(analytics.stats()['running'])
+        finally:
+            analytics.close()
+
+
+if __name__ == '__main__':
+    unittest.main()